@@ -0,0 +1,82 @@
+"""Assisted (speculative) vs plain greedy decoding on a fixed sample (the first
+--num-samples clips of a test manifest), both through the evaluation engine
+(BatchedInference, one clip at a time so only the decoding differs). Reports
+wall-clock speedup and the draft acceptance rate, and checks that assisted
+decoding gives exactly the greedy transcripts (exits with status 1 otherwise)."""
+import argparse
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules import load_and_prepare_testset, load_model
+from modules.assisted import AssistedDecodingStats, load_assistant_model
+from modules.inference import BatchedInference
+
+
+def run(model, processor, dataset, max_new_tokens, **generate_kwargs):
+    engine = BatchedInference(model, processor, batch_size=1, max_new_tokens=max_new_tokens, **generate_kwargs)
+    predictions = {r["utt_id"]: r["asr_pred"] for r in engine(dataset)}
+    return predictions, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", required=True)
+    parser.add_argument("--assistant", required=True, help="draft model (same tokenizer)")
+    parser.add_argument("--manifest", required=True, help="test manifest (HF format)")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--torch-dtype", default=None, help="float16 / bfloat16 (default: float32)")
+    parser.add_argument("--num-samples", type=int, default=100)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--num-assistant-tokens", type=int, default=None)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    model, processor, _ = load_model(args.model_dir, base_processor_name=args.base_processor,
+                                     torch_dtype=args.torch_dtype, use_cache=False)
+    assistant = load_assistant_model(args.assistant, model, num_assistant_tokens=args.num_assistant_tokens,
+                                     base_processor_name=args.base_processor)
+    dataset = load_and_prepare_testset(args.manifest, processor)
+    dataset = dataset.select(range(min(args.num_samples, len(dataset))))
+
+    # warm-up, so neither run pays for one-off initialisation
+    run(model, processor, dataset.select([0]), args.max_new_tokens)
+    run(model, processor, dataset.select([0]), args.max_new_tokens, assistant_model=assistant)
+
+    greedy, greedy_engine = run(model, processor, dataset, args.max_new_tokens)
+    with AssistedDecodingStats(model, assistant) as stats:
+        assisted, assisted_engine = run(model, processor, dataset, args.max_new_tokens,
+                                        assistant_model=assistant, num_beams=1, do_sample=False)
+
+    mismatches = [u for u in greedy if greedy[u] != assisted.get(u)]
+    results = {
+        "num_samples": len(dataset),
+        "greedy_seconds": greedy_engine.generate_seconds,
+        "assisted_seconds": assisted_engine.generate_seconds,
+        "speedup": greedy_engine.generate_seconds / assisted_engine.generate_seconds,
+        "generated_tokens": assisted_engine.generated_tokens,
+        **stats.summary(assisted_engine.generated_tokens),
+        "mismatches": len(mismatches),
+    }
+
+    print(f"{len(dataset)} clips, {results['generated_tokens']} tokens ({model.dtype})")
+    print(f"greedy {results['greedy_seconds']:.2f}s, assisted {results['assisted_seconds']:.2f}s "
+          f"({results['speedup']:.2f}x)")
+    print(f"acceptance rate {results['acceptance_rate']:.1%}, "
+          f"{results['decoder_pass_speedup']:.2f} tokens per model decoder pass")
+    print(f"transcripts differing from greedy: {len(mismatches)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if mismatches:
+        sys.exit(f"Assisted decoding changed {len(mismatches)} transcripts, e.g. {mismatches[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Decoder-only fine-tuning (decoder_only in the config): a frozen encoder
+recomputed at every step vs the decoder trained from the encoder cache
+(modules/encoder_cache.py) on the clips of --manifest. Each mode trains in its
+own process, so peak memory (GPU if available, else RSS) is per mode. Reports
+the one-off cache build time, seconds per epoch, peak memory and the largest
+per-step loss difference between the two modes (fp16 rounding of the cached
+states). Uses a tiny randomly initialised Whisper (tiny_whisper.py) unless
+--model-dir is given."""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import torch
+from transformers import Seq2SeqTrainingArguments, TrainerCallback
+
+from modules import BucketedSeq2SeqTrainer, DataCollatorSpeechSeq2SeqWithPadding, load_and_prepare_datasets, load_model
+from modules.encoder_cache import load_encoder_cache_dataset
+from modules.model_loader import peak_rss_mb
+from tiny_whisper import build_tiny_whisper
+
+
+class EpochTimer(TrainerCallback):
+    def __init__(self):
+        self.seconds = []
+        self._start = None
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        self.seconds.append(time.perf_counter() - self._start)
+
+
+def train(mode, model_dir, manifest, cache_dir, epochs, batch_size, base_processor):
+    """One training run in this process: mode "frozen" (encoder run every step) or "cached"."""
+    model, processor, device = load_model(model_dir, base_processor_name=base_processor, use_cache=False)
+    model.freeze_encoder()
+    train_ds, _ = load_and_prepare_datasets(manifest, manifest, processor)
+
+    build_seconds = None
+    if mode == "cached":
+        start = time.perf_counter()
+        train_ds = load_encoder_cache_dataset(train_ds, manifest, model, processor, cache_dir, batch_size=batch_size)
+        build_seconds = time.perf_counter() - start
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+
+    timer = EpochTimer()
+    with tempfile.TemporaryDirectory() as tmp:
+        args = Seq2SeqTrainingArguments(output_dir=tmp, num_train_epochs=epochs, per_device_train_batch_size=batch_size,
+                                        logging_steps=1, save_strategy="no", report_to=[], seed=0,
+                                        fp16=torch.cuda.is_available())
+        trainer = BucketedSeq2SeqTrainer(model=model, args=args, train_dataset=train_ds,
+                                         data_collator=DataCollatorSpeechSeq2SeqWithPadding(processor=processor),
+                                         callbacks=[timer])
+        trainer.train()
+
+    return {
+        "mode": mode,
+        "build_seconds": build_seconds,
+        "epoch_seconds": timer.seconds,
+        "peak_memory_mb": torch.cuda.max_memory_allocated() / 2**20 if torch.cuda.is_available() else peak_rss_mb(),
+        "losses": [log["loss"] for log in trainer.state.log_history if "loss" in log],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--manifest", required=True, help="training manifest (HF format)")
+    parser.add_argument("--model-dir", help="default: a tiny random Whisper")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model_dir or build_tiny_whisper(os.path.join(tmp, "tiny_whisper"))
+        runs = {}
+        for mode in ("frozen", "cached"):
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                runs[mode] = pool.submit(train, mode, model_dir, args.manifest, os.path.join(tmp, "cache"),
+                                         args.epochs, args.batch_size, args.base_processor).result()
+
+    frozen, cached = runs["frozen"], runs["cached"]
+    results = {
+        "runs": runs,
+        "epoch_speedup": sum(frozen["epoch_seconds"]) / sum(cached["epoch_seconds"]),
+        "memory_ratio": cached["peak_memory_mb"] / frozen["peak_memory_mb"],
+        "max_loss_diff": max(abs(a - b) for a, b in zip(frozen["losses"], cached["losses"])),
+    }
+    memory = "GPU" if torch.cuda.is_available() else "RSS"
+    print(f"{'mode':>7s} {'build s':>8s} {'s/epoch':>8s} {f'peak {memory} MB':>14s}")
+    for r in (frozen, cached):
+        build = f"{r['build_seconds']:8.2f}" if r["build_seconds"] is not None else f"{'-':>8s}"
+        epoch = sum(r["epoch_seconds"]) / len(r["epoch_seconds"])
+        print(f"{r['mode']:>7s} {build} {epoch:8.2f} {r['peak_memory_mb']:14.0f}")
+    print(f"epochs {results['epoch_speedup']:.2f}x faster, {results['memory_ratio']:.0%} of the memory, "
+          f"max loss difference {results['max_loss_diff']:.4f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
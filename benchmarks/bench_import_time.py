@@ -0,0 +1,77 @@
+"""Import-time budget: cumulative `python -X importtime` time of `import modules`
+and of the light submodules used by small utilities, each in a fresh interpreter.
+Exits with status 1 if an import goes over its budget or pulls in a heavy
+dependency (torch / transformers / datasets / evaluate), so it can gate CI."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+
+HEAVY = ("torch", "transformers", "datasets", "evaluate")
+
+# module -> (budget in seconds, heavy dependencies it must not import)
+BUDGETS = {
+    "modules": (0.1, HEAVY),
+    "modules.manifest": (1.0, HEAVY),
+    "modules.wer": (0.5, HEAVY),
+    "modules.parallel": (0.1, HEAVY),
+    "modules.metrics": (0.5, HEAVY),
+}
+
+
+def import_time(module, repeats=3):
+    """(best cumulative import time in seconds, top-level packages imported) of a fresh `import module`."""
+    best, imported = None, set()
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=parent_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        cumulative = None
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, total, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            imported.add(name.split(".")[0])
+            if name == module:
+                cumulative = int(total) / 1e6
+        best = cumulative if best is None else min(best, cumulative)
+    return best, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets (slow machines)")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results, failed = {}, []
+    for module, (budget, forbidden) in BUDGETS.items():
+        seconds, imported = import_time(module)
+        heavy = sorted(set(forbidden) & imported)
+        ok = seconds <= budget * args.scale and not heavy
+        results[module] = {"seconds": seconds, "budget": budget * args.scale, "heavy_imports": heavy, "ok": ok}
+        print(f"{module:20s} {seconds * 1000:8.1f} ms (budget {budget * args.scale * 1000:.0f} ms)"
+              f"{'  heavy: ' + ', '.join(heavy) if heavy else ''}  {'ok' if ok else 'FAIL'}")
+        if not ok:
+            failed.append(module)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if failed:
+        sys.exit(f"Import-time budget exceeded: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
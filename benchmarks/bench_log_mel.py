@@ -0,0 +1,79 @@
+"""Log-mel extraction throughput: per-example WhisperFeatureExtractor
+(what prepare_dataset used to do) vs BatchedLogMel at several batch sizes.
+Runs on synthetic SpokenWOZ-like clips (0.5s - 15s), fully offline."""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from transformers import WhisperFeatureExtractor
+
+from modules.log_mel import BatchedLogMel
+
+
+def synthetic_clips(n, sampling_rate=16000, seed=0):
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(0.5, 15.0, size=n)
+    return [
+        (0.1 * rng.standard_normal(int(d * sampling_rate))).astype(np.float32)
+        for d in durations
+    ]
+
+
+def clips_per_sec(fn, clips, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(clips), batch_size):
+        fn(clips[i:i + batch_size])
+    return len(clips) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-clips", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    feature_extractor = WhisperFeatureExtractor()
+    clips = synthetic_clips(args.num_clips, feature_extractor.sampling_rate)
+    log_mel = BatchedLogMel(feature_extractor, device=args.device)
+
+    def per_example(batch):
+        return [
+            feature_extractor(c, sampling_rate=feature_extractor.sampling_rate, return_tensors="np").input_features[0]
+            for c in batch
+        ]
+
+    # same numbers as the feature extractor
+    reference = per_example(clips[:8])
+    max_abs_diff = max(float(np.abs(r - b).max()) for r, b in zip(reference, log_mel(clips[:8])))
+
+    results = {
+        "num_clips": args.num_clips,
+        "max_abs_diff": max_abs_diff,
+        "per_example_clips_per_sec": clips_per_sec(per_example, clips, 1),
+        "batched_clips_per_sec": {
+            bs: clips_per_sec(log_mel, clips, bs) for bs in args.batch_sizes
+        },
+    }
+
+    print(f"max |batched - WhisperFeatureExtractor|: {max_abs_diff:.2e}")
+    print(f"per-example:        {results['per_example_clips_per_sec']:8.1f} clips/s")
+    for bs, rate in results["batched_clips_per_sec"].items():
+        print(f"batched (bs={bs:4d}): {rate:8.1f} clips/s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Long-form transcription (modules/longform.LongFormTranscriber) of whole
+dialogue WAVs: all overlapping 30s windows of a dialogue batched through
+generate vs the same windows one at a time, and vs transcribing the
+dialogue's turns one at a time (the segment-per-turn path, which needs the
+turn timestamps). Runs offline on CPU with a tiny randomly initialised
+Whisper (tiny_whisper.py) on synthetic SpokenWOZ-like dialogues
+(synthetic_data.py), or with --model-dir / --audio-dir on real data."""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import numpy as np
+import torch
+
+from modules import load_model
+from modules.audio import read_segment
+from modules.log_mel import BatchedLogMel
+from modules.longform import LongFormTranscriber
+from modules.segmentation import turn_spans
+from synthetic_data import build_spokenwoz
+from tiny_whisper import build_tiny_whisper
+
+
+def transcribe_dialogues(transcriber, dialogues):
+    start = time.perf_counter()
+    segments = sum(len(transcriber.transcribe(audio)) for audio, _ in dialogues)
+    return time.perf_counter() - start, segments
+
+
+def transcribe_turns(model, processor, dialogues, max_new_tokens):
+    """One generate call per turn, cut from the dialogue by its word timestamps."""
+    log_mel = BatchedLogMel(processor.feature_extractor)
+    sr = processor.feature_extractor.sampling_rate
+    turns = 0
+    start = time.perf_counter()
+    for audio, spans in dialogues:
+        for _, begin_ms, end_ms, _ in spans:
+            clip = audio[int(begin_ms / 1000 * sr):int(end_ms / 1000 * sr)]
+            features = torch.from_numpy(np.stack(log_mel([clip]))).to(model.device, dtype=model.dtype)
+            with torch.inference_mode():
+                model.generate(input_features=features, max_new_tokens=max_new_tokens)
+            turns += 1
+    return time.perf_counter() - start, turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", help="default: a tiny random Whisper")
+    parser.add_argument("--audio-dir", help="dialogue WAVs (default: synthetic); turns need --text-json")
+    parser.add_argument("--text-json", help="SpokenWOZ-style data.json with word timestamps")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--num-dialogues", type=int, default=4)
+    parser.add_argument("--turns-per-dialogue", type=int, default=24)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model_dir or build_tiny_whisper(os.path.join(tmp, "tiny_whisper"))
+        if args.audio_dir:
+            audio_dir, text_json = args.audio_dir, args.text_json
+        else:
+            audio_dir, text_json = build_spokenwoz(os.path.join(tmp, "raw"), args.num_dialogues,
+                                                   args.turns_per_dialogue, prefix="SNG")
+        model, processor, _ = load_model(model_dir, base_processor_name=args.base_processor, use_cache=False)
+        sr = processor.feature_extractor.sampling_rate
+
+        data = {}
+        if text_json:
+            with open(text_json, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        dialogues = []
+        for path in sorted(Path(audio_dir).glob("*.wav"))[:args.num_dialogues]:
+            audio, _ = read_segment(str(path), target_sr=sr)
+            dialogues.append((audio, turn_spans(data.get(path.stem, {}))))
+        audio_seconds = sum(len(audio) for audio, _ in dialogues) / sr
+
+        def transcriber(batch_size):
+            return LongFormTranscriber(model, processor, batch_size=batch_size, language="english",
+                                       task="transcribe", max_new_tokens=args.max_new_tokens)
+
+        transcribe_dialogues(transcriber(args.batch_size), dialogues[:1])  # warm-up
+        batched = transcriber(args.batch_size)
+        results = {"dialogues": len(dialogues), "audio_seconds": audio_seconds}
+        seconds, segments = transcribe_dialogues(batched, dialogues)
+        results["windows_batched"] = {"seconds": seconds, "windows": batched.windows, "segments": segments}
+        sequential = transcriber(1)
+        seconds, segments = transcribe_dialogues(sequential, dialogues)
+        results["windows_one_at_a_time"] = {"seconds": seconds, "windows": sequential.windows, "segments": segments}
+        if any(spans for _, spans in dialogues):
+            seconds, turns = transcribe_turns(model, processor, dialogues, args.max_new_tokens)
+            results["turns_one_at_a_time"] = {"seconds": seconds, "turns": turns}
+
+    print(f"{len(dialogues)} dialogues, {audio_seconds:.1f}s of audio, {batched.windows} windows")
+    for name in ("windows_batched", "windows_one_at_a_time", "turns_one_at_a_time"):
+        if name in results:
+            r = results[name]
+            r["rtf"] = r["seconds"] / audio_seconds
+            r["slowdown_vs_batched"] = r["seconds"] / results["windows_batched"]["seconds"]
+            print(f"{name:24s} {r['seconds']:8.2f}s  RTF {r['rtf']:.4f}  {r['slowdown_vs_batched']:6.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Throughput of every pipeline stage on a synthetic SpokenWOZ-like corpus
+(synthetic_data.py): both 01_make_manifest.py scripts, both
+02_filter_and_convert.py scripts, 03_data_split.py, prepare_dataset, the
+data collator, compute_metrics and generation with a tiny randomly
+initialised Whisper (tiny_whisper.py). Runs offline on CPU; results (with
+the git commit) go to a JSON file, by default benchmarks/results/pipeline_<commit>.json,
+so runs of different commits can be compared."""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+
+# offline and CPU-only, before torch / transformers / datasets are imported
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("HF_DATASETS_OFFLINE", "1")
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+from synthetic_data import build_spokenwoz
+from tiny_whisper import build_tiny_whisper
+
+
+def load_script(path):
+    """Import a pipeline script (file names like 01_make_manifest.py are not importable by name)."""
+    spec = importlib.util.spec_from_file_location(f"bench_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # workers unpickle its functions by module name
+    spec.loader.exec_module(module)
+    return module
+
+
+def count_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=parent_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=parent_dir,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Stages:
+    """Timed stages: seconds, items processed and items per second."""
+
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, unit, fn, count):
+        start = time.perf_counter()
+        out = fn()
+        seconds = time.perf_counter() - start
+        n = count(out)
+        self.results[name] = {"seconds": seconds, unit: n, f"{unit}_per_second": n / seconds}
+        print(f"{name:28s} {seconds:8.2f}s  {n:7d} {unit:11s} {n / seconds:10.1f} {unit}/s")
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-dialogues", type=int, default=40)
+    parser.add_argument("--num-test-dialogues", type=int, default=10)
+    parser.add_argument("--turns-per-dialogue", type=int, default=8)
+    parser.add_argument("--num-workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--metric-utterances", type=int, default=5000)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--output", help="JSON results (default: benchmarks/results/pipeline_<commit>.json)")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    stages = Stages()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # datasets caches (json loading, map) inside the run directory, so nothing is reused between runs
+        os.environ["HF_DATASETS_CACHE"] = os.path.join(tmp, "hf_cache")
+
+        import torch
+        import transformers
+
+        from modules import DataCollatorSpeechSeq2SeqWithPadding, compute_metrics, load_and_prepare_datasets
+        from modules import load_and_prepare_testset, load_model
+        from modules.inference import BatchedInference
+
+        raw = os.path.join(tmp, "raw")
+        audio_dir, text_json = build_spokenwoz(raw, args.num_dialogues, args.turns_per_dialogue)
+        test_audio_dir, test_text_json = build_spokenwoz(
+            os.path.join(tmp, "raw_test"), args.num_test_dialogues, args.turns_per_dialogue, prefix="SNG", seed=1
+        )
+        processed = os.path.join(tmp, "processed")
+
+        # 01_make_manifest.py (train / dev): segment the dialogues at their source rate
+        make_manifest = load_script(os.path.join(parent_dir, "scripts", "01_make_manifest.py"))
+        make_manifest.AUDIO_DIR, make_manifest.TEXT_JSON = audio_dir, text_json
+        make_manifest.OUTPUT_MANIFEST = os.path.join(processed, "root_manifest.json")
+        make_manifest.SEGMENTS_DIR = os.path.join(processed, "audio_segments")
+        make_manifest.NUM_WORKERS = args.num_workers
+        stages.run("01_make_manifest", "turns", make_manifest.main,
+                   lambda _: count_lines(make_manifest.OUTPUT_MANIFEST))
+
+        # test_set_prep/01_make_manifest.py: segment and resample to 16kHz
+        make_test_manifest = load_script(os.path.join(parent_dir, "test_set_prep", "01_make_manifest.py"))
+        make_test_manifest.AUDIO_DIR, make_test_manifest.TEXT_JSON = test_audio_dir, test_text_json
+        make_test_manifest.OUTPUT_MANIFEST = os.path.join(processed, "test_root_manifest.json")
+        make_test_manifest.SEGMENTS_DIR = os.path.join(processed, "audio_segments_test_16kHz")
+        make_test_manifest.NUM_WORKERS = args.num_workers
+        stages.run("test_01_make_manifest", "turns", make_test_manifest.main,
+                   lambda _: count_lines(make_test_manifest.OUTPUT_MANIFEST))
+
+        # 02_filter_and_convert.py: NeMo -> HF manifest, resample 8kHz -> 16kHz
+        convert = load_script(os.path.join(parent_dir, "scripts", "02_filter_and_convert.py"))
+        convert.INPUT_MANIFEST = make_manifest.OUTPUT_MANIFEST
+        convert.OUTPUT_MANIFEST = os.path.join(processed, "root_manifest_hf.json")
+        convert.OUTPUT_AUDIO_DIR = convert.Path(processed) / "audio_16k"
+        convert.NUM_WORKERS = args.num_workers
+        stages.run("02_filter_and_convert", "turns", convert.main,
+                   lambda _: len(json.load(open(convert.OUTPUT_MANIFEST, encoding="utf-8"))["data"]))
+
+        convert_test = load_script(os.path.join(parent_dir, "test_set_prep", "02_filter_and_convert.py"))
+        convert_test.INPUT_MANIFEST = make_test_manifest.OUTPUT_MANIFEST
+        convert_test.OUTPUT_MANIFEST = os.path.join(processed, "test_root_manifest_hf.json")
+        stages.run("test_02_filter_and_convert", "turns", convert_test.main,
+                   lambda _: len(json.load(open(convert_test.OUTPUT_MANIFEST, encoding="utf-8"))["data"]))
+
+        # 03_data_split.py
+        data_split = load_script(os.path.join(parent_dir, "scripts", "03_data_split.py"))
+        splits = stages.run("03_data_split", "turns",
+                            lambda: data_split.split_manifest_hf(convert.OUTPUT_MANIFEST, test_size=0.1, seed=42),
+                            lambda s: len(s["train"]) + len(s["test"]))
+        train_manifest = os.path.join(processed, "train_manifest_hf.json")
+        dev_manifest = os.path.join(processed, "dev_manifest_hf.json")
+        del splits
+
+        # prepare_dataset (map mode: decode, log-mel, tokenize)
+        model_dir = build_tiny_whisper(os.path.join(tmp, "tiny_whisper"))
+        model, processor, _ = load_model(model_dir, device="cpu", use_cache=False)
+        train_ds, dev_ds = stages.run("prepare_dataset", "clips",
+                                      lambda: load_and_prepare_datasets(train_manifest, dev_manifest, processor),
+                                      lambda d: len(d[0]) + len(d[1]))
+
+        # data collator (rows read up front, so only padding / batching is timed)
+        collator = DataCollatorSpeechSeq2SeqWithPadding(processor=processor)
+        rows = [train_ds[i] for i in range(len(train_ds))]
+        batches = [rows[i:i + args.batch_size] for i in range(0, len(rows), args.batch_size)]
+        stages.run("data_collator", "examples", lambda: [collator(b) for b in batches], lambda _: len(rows))
+
+        # compute_metrics on token ids, as the trainer passes them (every 7th token replaced)
+        tokenizer = processor.tokenizer
+        texts = [r["text"] for r in json.load(open(train_manifest, encoding="utf-8"))["data"]]
+        texts = (texts * (args.metric_utterances // len(texts) + 1))[:args.metric_utterances]
+        labels = tokenizer(texts, padding=True, return_tensors="np").input_ids
+        labels[labels == tokenizer.pad_token_id] = -100
+        predictions = labels.copy()
+        predictions[:, 5::7] = tokenizer.convert_tokens_to_ids("a")
+        predictions[labels == -100] = tokenizer.pad_token_id
+        # (compute_metrics writes into the arrays, so it gets copies)
+        stages.run("compute_metrics", "utterances",
+                   lambda: compute_metrics(SimpleNamespace(predictions=predictions.copy(), label_ids=labels.copy()),
+                                           processor),
+                   lambda _: len(texts))
+
+        # generation with the evaluation engine on the test set
+        test_ds = load_and_prepare_testset(convert_test.OUTPUT_MANIFEST, processor)
+        engine = BatchedInference(model, processor, device="cpu", batch_size=args.batch_size,
+                                  max_new_tokens=args.max_new_tokens)
+        stages.run("generation", "clips", lambda: list(engine(test_ds)), len)
+        stages.results["generation"]["tokens_per_second"] = engine.generated_tokens / engine.generate_seconds
+
+        results = {
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "stages": stages.results,
+        }
+
+    output = args.output or os.path.join(current_dir, "results", f"pipeline_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved → {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"vs {baseline['commit']} (seconds, + = slower):")
+        for name, stage in results["stages"].items():
+            if name in baseline["stages"]:
+                before = baseline["stages"][name]["seconds"]
+                print(f"{name:28s} {before:8.2f}s -> {stage['seconds']:8.2f}s  {stage['seconds'] / before - 1:+7.1%}")
+
+
+if __name__ == "__main__":
+    main()
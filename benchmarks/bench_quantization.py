@@ -0,0 +1,71 @@
+"""Dynamic int8 vs fp32 CPU inference: real-time factor (processing seconds per
+second of audio) and WER delta on a fixed sample (the first --num-samples clips
+of a test manifest), both through the evaluation engine (BatchedInference)."""
+import argparse
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+import torch
+
+from modules import load_and_prepare_testset, load_model
+from modules.inference import BatchedInference
+from modules.metrics import compute_wer
+from modules.quantization import quantize_dynamic_int8
+
+
+def run(model, processor, dataset, batch_size, max_new_tokens):
+    engine = BatchedInference(model, processor, device="cpu", batch_size=batch_size, max_new_tokens=max_new_tokens)
+    start = time.perf_counter()
+    results = list(engine(dataset))
+    elapsed = time.perf_counter() - start
+    wer = compute_wer([r["asr_pred"] for r in results], [r["asr_ref"] for r in results])
+    return elapsed, wer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", required=True)
+    parser.add_argument("--manifest", required=True, help="test manifest (HF format)")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--num-samples", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model, processor, _ = load_model(args.model_dir, base_processor_name=args.base_processor, device="cpu", use_cache=False)
+    dataset = load_and_prepare_testset(args.manifest, processor)
+    dataset = dataset.select(range(min(args.num_samples, len(dataset))))
+    audio_seconds = float(sum(dataset["input_length"]))
+
+    results = {"num_samples": len(dataset), "audio_seconds": audio_seconds}
+    fp32_sec, fp32_wer = run(model, processor, dataset, args.batch_size, args.max_new_tokens)
+    int8_sec, int8_wer = run(quantize_dynamic_int8(model), processor, dataset, args.batch_size, args.max_new_tokens)
+    results["fp32"] = {"seconds": fp32_sec, "rtf": fp32_sec / audio_seconds, **fp32_wer}
+    results["int8"] = {"seconds": int8_sec, "rtf": int8_sec / audio_seconds, **int8_wer}
+    results["wer_delta"] = int8_wer["wer"] - fp32_wer["wer"]
+    results["speedup"] = fp32_sec / int8_sec
+
+    print(f"{len(dataset)} clips, {audio_seconds:.1f}s of audio")
+    for name in ("fp32", "int8"):
+        r = results[name]
+        print(f"{name}: RTF {r['rtf']:.3f}  WER {r['wer']:.2f}  (WER ortho {r['wer_ortho']:.2f})")
+    print(f"WER delta (int8 - fp32): {results['wer_delta']:+.2f}  speedup: {results['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Load test of the transcription service (modules/serving.py): an in-process
+server on a free local port and a closed-loop load generator (--concurrency
+clients, each sending its next clip as soon as the previous answer arrives,
+WAV bytes over HTTP keep-alive). Reports p50 / p99 latency, throughput and the
+mean micro-batch size per batch window (max_latency_ms). Runs offline on
+CPU with a tiny randomly initialised Whisper (tiny_whisper.py) and synthetic
+clips, or with --model-dir / --manifest on real data."""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import numpy as np
+import soundfile as sf
+
+from modules import load_model
+from modules.audio import load_example_audio
+from modules.inference import BatchedInference
+from modules.manifest import ManifestReader
+from modules.serving import TranscriptionService, serve
+from tiny_whisper import build_tiny_whisper
+
+
+def synthetic_clips(num_clips, sampling_rate=16000, seed=0):
+    """WAV bytes of SpokenWOZ-like turns: 0.5-8s of noise with a tone."""
+    rng = np.random.default_rng(seed)
+    clips = []
+    for _ in range(num_clips):
+        n = int(rng.uniform(0.5, 8.0) * sampling_rate)
+        audio = 0.2 * np.sin(2 * np.pi * rng.uniform(150, 400) * np.arange(n) / sampling_rate)
+        audio += 0.05 * rng.standard_normal(n)
+        clips.append(wav_bytes(audio.astype(np.float32), sampling_rate))
+    return clips
+
+
+def wav_bytes(audio, sampling_rate):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sampling_rate, format="WAV")
+    return buffer.getvalue()
+
+
+async def client(host, port, clips, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for clip in clips:
+            start = time.perf_counter()
+            writer.write(
+                f"POST /transcribe HTTP/1.1\r\nHost: {host}\r\nContent-Type: audio/wav\r\n"
+                f"Content-Length: {len(clip)}\r\n\r\n".encode("latin-1") + clip
+            )
+            await writer.drain()
+            status = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers["content-length"]))
+            if b" 200 " not in status:
+                raise RuntimeError(f"{status.decode().strip()}: {body.decode()}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(engine, clips, concurrency, max_batch_size, max_latency_ms, feature_workers):
+    service = TranscriptionService(engine, max_batch_size=max_batch_size, max_latency_ms=max_latency_ms,
+                                   feature_workers=feature_workers)
+    server = await serve(service, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    latencies = []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(client("127.0.0.1", port, clips[i::concurrency], latencies)
+                               for i in range(concurrency)))
+    finally:
+        elapsed = time.perf_counter() - start
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+    latencies = np.array(latencies) * 1000
+    return {
+        "max_latency_ms": max_latency_ms,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_batch_size": service.stats()["mean_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", help="default: a tiny random Whisper")
+    parser.add_argument("--manifest", help="HF manifest whose clips are sent (default: synthetic clips)")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--num-requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--windows", default="0,5,10,25,50", help="max_latency_ms values, comma-separated")
+    parser.add_argument("--feature-workers", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model_dir or build_tiny_whisper(os.path.join(tmp, "tiny_whisper"))
+        model, processor, device = load_model(model_dir, base_processor_name=args.base_processor, use_cache=False)
+    engine = BatchedInference(model, processor, device=device, max_new_tokens=args.max_new_tokens)
+
+    if args.manifest:
+        reader = ManifestReader(args.manifest)
+        rows = list(reader.rows())[:args.num_requests]
+        clips = [wav_bytes(*load_example_audio(r)) for r in rows]
+    else:
+        clips = synthetic_clips(args.num_requests)
+
+    asyncio.run(run_load(engine, clips[:args.max_batch_size], 1, args.max_batch_size, 0, 1))  # warm-up
+    results = {"requests": len(clips), "concurrency": args.concurrency, "max_batch_size": args.max_batch_size,
+               "windows": []}
+    print(f"{len(clips)} requests, {args.concurrency} concurrent clients, max batch {args.max_batch_size}")
+    print(f"{'window':>8s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'batch':>6s}")
+    for window in [float(w) for w in args.windows.split(",")]:
+        r = asyncio.run(run_load(engine, clips, args.concurrency, args.max_batch_size, window, args.feature_workers))
+        results["windows"].append(r)
+        print(f"{window:6g}ms {r['requests_per_second']:8.1f} {r['p50_ms']:8.1f} {r['p99_ms']:8.1f} "
+              f"{r['mean_batch_size']:6.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
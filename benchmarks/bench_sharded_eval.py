@@ -0,0 +1,72 @@
+"""Scaling of multi-process CPU evaluation (evaluate_model.py with
+eval.num_processes): the first --num-samples clips of a test manifest are
+transcribed with 1, 2, 4, ... worker processes (threads split evenly over
+them), and the wall time, speedup, parallel efficiency and whether the
+merged transcripts match the single-process run are reported. Wall time
+includes starting the workers and loading their model copies."""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(os.path.join(parent_dir, "scripts"))  # workers import evaluate_model by name
+
+import evaluate_model
+from modules import load_and_prepare_testset
+from modules.inference import load_predictions
+from modules.model_loader import load_processor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", required=True)
+    parser.add_argument("--manifest", required=True, help="test manifest (HF format)")
+    parser.add_argument("--processes", default="1,2,4", help="worker counts, comma-separated")
+    parser.add_argument("--num-samples", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="torch threads over all workers")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    cfg = {
+        "model": {"language": "english", "task": "transcribe"},
+        "eval": {"per_device_eval_batch_size": args.batch_size},
+    }
+    processor = load_processor(args.model_dir)
+    dataset = load_and_prepare_testset(args.manifest, processor)
+    dataset = dataset.select(range(min(args.num_samples, len(dataset))))
+
+    results = {"num_samples": len(dataset), "runs": []}
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(p) for p in args.processes.split(",")]:
+            cfg["eval"]["num_threads_per_process"] = max(1, args.threads // n)
+            results_path = Path(tmp) / f"p{n}" / "asr_text_vs_ref_and_intent.jsonl"
+            results_path.parent.mkdir()
+            stats = evaluate_model.run_shards(cfg, args.model_dir, dataset, {}, None, results_path, n)
+            predictions = {u: r["asr_pred"] for u, r in load_predictions(results_path).items()}
+            if reference is None:
+                reference = {"processes": n, "wall_seconds": stats["wall_seconds"], "predictions": predictions}
+            stats["speedup"] = reference["wall_seconds"] / stats["wall_seconds"]
+            stats["efficiency"] = stats["speedup"] * reference["processes"] / n
+            stats["same_transcripts"] = predictions == reference["predictions"]
+            results["runs"].append(stats)
+
+    print(f"{len(dataset)} clips, {args.threads} threads")
+    print(f"{'processes':>9s} {'threads':>7s} {'wall s':>8s} {'speedup':>8s} {'effic.':>7s} {'same':>5s}")
+    for r in results["runs"]:
+        print(f"{r['processes']:9d} {r['threads_per_process']:7d} {r['wall_seconds']:8.1f} {r['speedup']:7.2f}x "
+              f"{r['efficiency']:7.1%} {str(r['same_transcripts']):>5s}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
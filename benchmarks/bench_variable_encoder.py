@@ -0,0 +1,101 @@
+"""Variable-length encoder mode (BatchedInference(encoder_bucket_seconds=...),
+see modules/model_loader.variable_length_encoder) vs the full 30s encoder input:
+latency, real-time factor, encoder frames actually processed and WER per
+bucket size on a fixed sample (the first --num-samples clips of a test
+manifest). A model fine-tuned on padded 30s windows may lose accuracy on
+trimmed inputs; the WER delta tells whether fine-tuning in the same mode is
+worth it."""
+import argparse
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+import numpy as np
+import torch
+
+from modules import load_and_prepare_testset, load_model
+from modules.inference import BatchedInference
+from modules.model_loader import N_FRAMES, encoder_frames
+from modules.metrics import compute_wer
+
+
+def run(model, processor, dataset, batch_size, max_new_tokens, bucket_seconds):
+    engine = BatchedInference(model, processor, batch_size=batch_size, max_new_tokens=max_new_tokens,
+                              encoder_bucket_seconds=bucket_seconds or None)
+    durations = np.asarray(dataset["input_length"], dtype=np.float64)
+    batches = engine.batches(dataset)
+    if bucket_seconds:
+        frames = sum(len(b) * encoder_frames(durations[b].max(), bucket_seconds) for b in batches)
+    else:
+        frames = len(dataset) * N_FRAMES
+    start = time.perf_counter()
+    results = list(engine(dataset))
+    elapsed = time.perf_counter() - start
+    wer = compute_wer([r["asr_pred"] for r in results], [r["asr_ref"] for r in results])
+    return {
+        "seconds": elapsed,
+        "batches": len(batches),
+        "encoder_frame_fraction": frames / (len(dataset) * N_FRAMES),
+        **wer,
+    }, {r["utt_id"]: r["asr_pred"] for r in results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", required=True)
+    parser.add_argument("--manifest", required=True, help="test manifest (HF format)")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--buckets", default="2,5,10", help="bucket sizes in seconds, comma-separated")
+    parser.add_argument("--num-samples", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--torch-dtype", default=None, help="float16 / bfloat16 (default: float32)")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model, processor, _ = load_model(args.model_dir, base_processor_name=args.base_processor,
+                                     torch_dtype=args.torch_dtype, device=args.device, use_cache=False)
+    dataset = load_and_prepare_testset(args.manifest, processor)
+    dataset = dataset.select(range(min(args.num_samples, len(dataset))))
+    audio_seconds = float(sum(dataset["input_length"]))
+
+    settings = [0.0] + [float(b) for b in args.buckets.split(",")]
+    results = {"num_samples": len(dataset), "audio_seconds": audio_seconds, "buckets": {}}
+    # warm-up (allocator, kernels) so the first setting is not penalised
+    list(BatchedInference(model, processor, batch_size=args.batch_size, max_new_tokens=args.max_new_tokens)(
+        dataset.select(range(min(args.batch_size, len(dataset))))))
+    print(f"{len(dataset)} clips, {audio_seconds:.1f}s of audio")
+    print(f"{'bucket':>8s} {'seconds':>8s} {'RTF':>7s} {'frames':>7s} {'WER':>7s} {'dWER':>7s} {'speedup':>8s} {'changed':>8s}")
+
+    reference = None
+    for bucket_seconds in settings:
+        r, transcripts = run(model, processor, dataset, args.batch_size, args.max_new_tokens, bucket_seconds)
+        r["rtf"] = r["seconds"] / audio_seconds
+        if reference is None:
+            reference, full, name = transcripts, r, "full"
+        else:
+            name = f"{bucket_seconds:g}s"
+        r["wer_delta"] = r["wer"] - full["wer"]
+        r["speedup"] = full["seconds"] / r["seconds"]
+        r["changed_transcripts"] = sum(transcripts[u] != reference[u] for u in reference) / max(len(reference), 1)
+        results["buckets"][name] = r
+        print(f"{name:>8s} {r['seconds']:8.2f} {r['rtf']:7.3f} {r['encoder_frame_fraction']:7.1%} {r['wer']:7.2f} "
+              f"{r['wer_delta']:+7.2f} {r['speedup']:7.2f}x {r['changed_transcripts']:8.1%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""WER throughput and parity: modules.metrics.compute_wer (native, batched
+NumPy alignment) vs evaluate.load("wer") / jiwer when installed.
+Runs on synthetic SpokenWOZ-like utterances with random word edits, fully offline."""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules.metrics import compute_wer, normalizer
+
+VOCAB = ("i need a taxi to the hotel at seven please book table for two "
+         "cambridge restaurant cheap north centre Thank you, bye! okay. yes no").split()
+
+
+def synthetic_pairs(n, seed=0):
+    """(predictions, references): references of 0-30 words, predictions with ~15% edits."""
+    rng = np.random.default_rng(seed)
+    predictions, references = [], []
+    for _ in range(n):
+        ref = list(rng.choice(VOCAB, size=rng.integers(0, 31)))
+        hyp = []
+        for word in ref:
+            r = rng.random()
+            if r < 0.05:
+                continue  # deletion
+            hyp.append(rng.choice(VOCAB) if r < 0.10 else word)
+            if r > 0.95:
+                hyp.append(rng.choice(VOCAB))  # insertion
+        references.append(" ".join(ref) or "okay")  # jiwer rejects empty references
+        predictions.append(" ".join(hyp))
+    return predictions, references
+
+
+def reference_wer(pred_str, label_str):
+    """The previous implementation (jiwer through evaluate or directly)."""
+    try:
+        import jiwer
+    except ImportError:
+        return None
+
+    def wer(predictions, references):
+        return jiwer.wer(references, predictions)
+
+    pred_norm = [normalizer(p) for p in pred_str]
+    label_norm = [normalizer(l) for l in label_str]
+    keep = [i for i in range(len(label_norm)) if len(label_norm[i]) > 0]
+    return {
+        "wer_ortho": 100 * wer(pred_str, label_str),
+        "wer": 100 * wer([pred_norm[i] for i in keep], [label_norm[i] for i in keep]),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num-utterances", type=int, default=16000)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    predictions, references = synthetic_pairs(args.num_utterances)
+
+    native, native_sec = timed(compute_wer, predictions, references)
+    reference, reference_sec = timed(reference_wer, predictions, references)
+
+    results = {
+        "num_utterances": args.num_utterances,
+        "native": native,
+        "native_sec": native_sec,
+        "reference": reference,
+        "reference_sec": reference_sec if reference is not None else None,
+    }
+
+    print(f"native:    {native} in {native_sec:.2f}s")
+    if reference is None:
+        print("jiwer is not installed, no reference numbers")
+    else:
+        print(f"reference: {reference} in {reference_sec:.2f}s")
+        diff = max(abs(native[k] - reference[k]) for k in native)
+        results["max_abs_diff"] = diff
+        print(f"max |native - reference|: {diff:.2e}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""ONNX Runtime backend parity and throughput. Exports a checkpoint (by default a
+tiny, randomly initialised Whisper built offline with tiny_whisper.py) and
+checks the ORT graphs against PyTorch: encoder outputs, prompt logits and the
+greedy tokens (PyTorch teacher-forced on the ORT output must pick the same
+tokens). Then times PyTorch generate vs ORT greedy on the same batch.
+Exits with status 1 on a parity failure."""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(current_dir)
+
+import torch
+
+from modules import load_model
+from modules.onnx_backend import export_onnx, OnnxWhisper
+from tiny_whisper import build_tiny_whisper
+
+
+def suppressed(logits, generation_config, step):
+    suppress = list(generation_config.suppress_tokens or [])
+    if step == 0:
+        suppress += list(generation_config.begin_suppress_tokens or [])
+    suppress = [t for t in suppress if t < logits.shape[-1]]
+    logits = logits.clone()
+    logits[..., suppress] = -float("inf")
+    return logits
+
+
+def check_parity(model, onnx_model, input_features, atol):
+    """Max abs diffs of encoder output / prompt logits and number of mismatching greedy tokens."""
+    prompt = torch.tensor([onnx_model.prompt_ids] * len(input_features))
+    with torch.no_grad():
+        encoder_out = model.get_encoder()(input_features=input_features).last_hidden_state
+        prompt_logits = model(encoder_outputs=(encoder_out,), decoder_input_ids=prompt).logits
+
+    ort_encoder_out = onnx_model.encoder.run(None, {"input_features": input_features.numpy()})[0]
+    ort_prompt_logits = onnx_model.decoder.run(
+        None, {"input_ids": prompt.numpy(), "encoder_hidden_states": ort_encoder_out}
+    )[0]
+
+    # greedy tokens from ORT; PyTorch, teacher-forced on them, must agree at every step
+    sequences = onnx_model.generate(input_features, max_new_tokens=20)
+    with torch.no_grad():
+        logits = model(encoder_outputs=(encoder_out,), decoder_input_ids=sequences[:, :-1]).logits
+    start = len(onnx_model.prompt_ids)
+    eos = onnx_model.generation_config.eos_token_id
+    mismatches = 0
+    for step in range(sequences.shape[1] - start):
+        expected = suppressed(logits[:, start - 1 + step], model.generation_config, step).argmax(-1)
+        produced = sequences[:, start + step]
+        live = (sequences[:, start:start + step] != eos).all(dim=1)  # rows not finished before this step
+        mismatches += int(((expected != produced) & live).sum())
+
+    return {
+        "encoder_max_abs_diff": float(np.abs(ort_encoder_out - encoder_out.numpy()).max()),
+        "prompt_logits_max_abs_diff": float(np.abs(ort_prompt_logits - prompt_logits.numpy()).max()),
+        "greedy_token_mismatches": mismatches,
+        "ok": bool(np.allclose(ort_encoder_out, encoder_out.numpy(), atol=atol)
+                   and np.allclose(ort_prompt_logits, prompt_logits.numpy(), atol=atol)
+                   and mismatches == 0),
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", help="checkpoint to export (default: a tiny random Whisper)")
+    parser.add_argument("--base-processor", default="openai/whisper-large-v2")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model_dir or build_tiny_whisper(os.path.join(tmp, "tiny"))
+        base_processor = model_dir if args.model_dir is None else args.base_processor
+        onnx_dir = export_onnx(model_dir, os.path.join(tmp, "onnx"), base_processor_name=base_processor)
+
+        model, processor, _ = load_model(model_dir, base_processor_name=base_processor, device="cpu", use_cache=False)
+        model.eval()
+        onnx_model, _ = OnnxWhisper.from_pretrained(onnx_dir)
+
+        torch.manual_seed(0)
+        input_features = torch.randn(args.batch_size, model.config.num_mel_bins, 2 * model.config.max_source_positions)
+        results = check_parity(model, onnx_model, input_features, args.atol)
+
+        with torch.inference_mode():
+            pytorch_sec = timed(lambda: model.generate(input_features=input_features, max_new_tokens=args.max_new_tokens))
+        ort_sec = timed(lambda: onnx_model.generate(input_features, max_new_tokens=args.max_new_tokens))
+        results.update({"pytorch_sec": pytorch_sec, "ort_sec": ort_sec, "speedup": pytorch_sec / ort_sec})
+
+    print(f"encoder max |ort - torch|:       {results['encoder_max_abs_diff']:.2e}")
+    print(f"prompt logits max |ort - torch|: {results['prompt_logits_max_abs_diff']:.2e}")
+    print(f"greedy token mismatches:         {results['greedy_token_mismatches']}")
+    print(f"generate: PyTorch {pytorch_sec:.2f}s, ORT {ort_sec:.2f}s ({results['speedup']:.2f}x)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not results["ok"]:
+        sys.exit("ONNX Runtime backend does not match PyTorch")
+    print("parity ok")
+
+
+if __name__ == "__main__":
+    main()
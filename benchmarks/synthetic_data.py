@@ -0,0 +1,73 @@
+"""Synthetic SpokenWOZ-like corpus for offline benchmarks: one stereo 8kHz WAV
+per dialogue (noise with a tone per turn) and a data.json with the same layout
+as SpokenWOZ (log -> turns with text and word-level BeginTime / EndTime in ms)."""
+import argparse
+import json
+import os
+
+import numpy as np
+import soundfile as sf
+
+WORDS = (
+    "i need a taxi to the hotel please book a table for two at seven "
+    "what time does the train leave from cambridge on saturday thank you"
+).split()
+
+
+def build_spokenwoz(root, num_dialogues=20, turns_per_dialogue=8, sampling_rate=8000,
+                    min_turn_seconds=0.5, max_turn_seconds=12.0, prefix="MUL", seed=0):
+    """
+    Write <root>/audio/<id>.wav and <root>/text/data.json.
+    Returns (audio_dir, text_json).
+    """
+    rng = np.random.default_rng(seed)
+    audio_dir = os.path.join(root, "audio")
+    text_dir = os.path.join(root, "text")
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(text_dir, exist_ok=True)
+
+    data = {}
+    for d in range(num_dialogues):
+        utt_id = f"{prefix}{d:04d}"
+        log, chunks, t_ms = [], [], 0
+        for _ in range(turns_per_dialogue):
+            turn_ms = int(rng.uniform(min_turn_seconds, max_turn_seconds) * 1000)
+            gap_ms = int(rng.uniform(100, 600))
+            # ~2.5 words per second, like conversational speech
+            n_words = max(1, int(turn_ms / 1000 * rng.uniform(1.5, 3.5)))
+            bounds = np.linspace(t_ms, t_ms + turn_ms, n_words + 1).astype(int)
+            words = [
+                {"Word": str(w), "BeginTime": int(bounds[j]), "EndTime": int(bounds[j + 1])}
+                for j, w in enumerate(rng.choice(WORDS, n_words))
+            ]
+            log.append({"text": " ".join(w["Word"] for w in words), "words": words})
+
+            n = int(turn_ms * sampling_rate / 1000)
+            tone = 0.2 * np.sin(2 * np.pi * rng.uniform(150, 400) * np.arange(n) / sampling_rate)
+            chunks.append(tone + 0.05 * rng.standard_normal(n))
+            chunks.append(0.01 * rng.standard_normal(int(gap_ms * sampling_rate / 1000)))
+            t_ms += turn_ms + gap_ms
+
+        log.append({"text": "", "words": []})  # turns without timestamps are skipped
+        data[utt_id] = {"log": log}
+        mono = np.concatenate(chunks).astype(np.float32)
+        sf.write(os.path.join(audio_dir, f"{utt_id}.wav"), np.stack([mono, mono], axis=1), sampling_rate)
+
+    text_json = os.path.join(text_dir, "data.json")
+    with open(text_json, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return audio_dir, text_json
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("root")
+    parser.add_argument("--num-dialogues", type=int, default=20)
+    parser.add_argument("--turns-per-dialogue", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(build_spokenwoz(args.root, args.num_dialogues, args.turns_per_dialogue, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Build a tiny, randomly initialised Whisper checkpoint (model + processor with
+the full multilingual special-token layout) for offline parity checks and
+benchmarks. Nothing is downloaded; the output directory looks like a
+finetuning.py checkpoint (save_model + processor.save_pretrained)."""
+import argparse
+import json
+import os
+
+import torch
+from transformers import (
+    WhisperConfig,
+    WhisperFeatureExtractor,
+    WhisperForConditionalGeneration,
+    WhisperProcessor,
+    WhisperTokenizer,
+)
+from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+from transformers.models.whisper.tokenization_whisper import LANGUAGES
+
+
+def build_tiny_whisper(out_dir, d_model=64, layers=2, heads=4, max_target_positions=448, seed=0):
+    """Write a tiny Whisper model + processor to out_dir and return out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+
+    # byte-level vocab without merges, then the same special tokens as the real models
+    vocab = {c: i for i, c in enumerate(bytes_to_unicode().values())}
+    specials = (
+        ["<|endoftext|>", "<|startoftranscript|>"]
+        + [f"<|{lang}|>" for lang in LANGUAGES]
+        + ["<|translate|>", "<|transcribe|>", "<|startoflm|>", "<|startofprev|>", "<|nospeech|>", "<|notimestamps|>"]
+    )
+    timestamps = [f"<|{i * 0.02:.2f}|>" for i in range(1501)]
+    for token in specials + timestamps:
+        vocab[token] = len(vocab)
+
+    with open(os.path.join(out_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(out_dir, "merges.txt"), "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+
+    eos = "<|endoftext|>"
+    tokenizer = WhisperTokenizer(
+        os.path.join(out_dir, "vocab.json"),
+        os.path.join(out_dir, "merges.txt"),
+        unk_token=eos, bos_token=eos, eos_token=eos, pad_token=eos,
+        additional_special_tokens=specials,
+    )
+    tokenizer.add_tokens(timestamps)
+    WhisperProcessor(WhisperFeatureExtractor(), tokenizer).save_pretrained(out_dir)
+
+    config = WhisperConfig(
+        vocab_size=len(vocab),
+        d_model=d_model,
+        encoder_layers=layers,
+        decoder_layers=layers,
+        encoder_attention_heads=heads,
+        decoder_attention_heads=heads,
+        encoder_ffn_dim=4 * d_model,
+        decoder_ffn_dim=4 * d_model,
+        max_target_positions=max_target_positions,
+        decoder_start_token_id=vocab["<|startoftranscript|>"],
+        eos_token_id=vocab[eos],
+        pad_token_id=vocab[eos],
+        bos_token_id=vocab[eos],
+    )
+    torch.manual_seed(seed)
+    model = WhisperForConditionalGeneration(config)
+
+    generation_config = model.generation_config
+    generation_config.decoder_start_token_id = config.decoder_start_token_id
+    generation_config.no_timestamps_token_id = vocab["<|notimestamps|>"]
+    generation_config.lang_to_id = {f"<|{lang}|>": vocab[f"<|{lang}|>"] for lang in LANGUAGES}
+    generation_config.task_to_id = {"transcribe": vocab["<|transcribe|>"], "translate": vocab["<|translate|>"]}
+    generation_config.is_multilingual = True
+    generation_config._from_model_config = False  # keep the Whisper fields when reloaded
+    model.save_pretrained(out_dir)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("out_dir")
+    parser.add_argument("--d-model", type=int, default=64)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(build_tiny_whisper(args.out_dir, d_model=args.d_model, layers=args.layers, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,40 @@
-from .metrics import compute_metrics
-from .prepare_dataset import prepare_dataset, load_and_prepare_datasets, load_and_prepare_testset
-from .data_collator import DataCollatorSpeechSeq2SeqWithPadding
-from .load_model import load_model
+"""
+Reusable logic of the pipeline.
+
+The public names below are imported from their submodule on first access
+(module-level __getattr__), so `import modules` and light submodules such as
+modules.manifest or modules.wer do not pull in torch / transformers / datasets.
+No export shares its name with a submodule: importing the submodule would
+rebind the package attribute to the module.
+"""
+import importlib
+
+_EXPORTS = {
+    "compute_metrics": "metrics",
+    "prepare_dataset": "dataset_preparation",
+    "load_and_prepare_datasets": "dataset_preparation",
+    "load_and_prepare_testset": "dataset_preparation",
+    "DataCollatorSpeechSeq2SeqWithPadding": "data_collator",
+    "load_model": "model_loader",
+    "DurationBucketBatchSampler": "samplers",
+    "build_batch_sampler": "samplers",
+    "BucketedSeq2SeqTrainer": "trainer",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    submodule = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+    # bind every export of the submodule
+    for export, module_name in _EXPORTS.items():
+        if module_name == _EXPORTS[name]:
+            globals()[export] = getattr(submodule, export)
+    return globals()[name]
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
@@ -0,0 +1,76 @@
+from .model_loader import load_model
+
+
+def load_assistant_model(assistant_name, model, num_assistant_tokens=None,
+                         base_processor_name="openai/whisper-large-v2"):
+    """
+    Draft model for assisted (speculative) generation, on the device and in
+    the dtype of the main model. Draft and main model must share the
+    tokenizer (whisper-small, distil-whisper or a distilled checkpoint of
+    ours for large-v2); generate(assistant_model=...) then returns exactly
+    the main model's greedy output.
+    """
+    assistant, _, _ = load_model(
+        model_name=assistant_name,
+        base_processor_name=base_processor_name,
+        torch_dtype=model.dtype,
+        device=model.device,
+    )
+    if assistant.config.vocab_size != model.config.vocab_size:
+        raise ValueError(
+            f"Assistant {assistant_name} has a different vocabulary "
+            f"({assistant.config.vocab_size} vs {model.config.vocab_size} tokens)"
+        )
+    if num_assistant_tokens:
+        assistant.generation_config.num_assistant_tokens = num_assistant_tokens
+    return assistant.eval()
+
+
+class AssistedDecodingStats:
+    """
+    Draft / verify counters of assisted generation, from forward hooks on the
+    two decoders: every draft decoder call proposes one token and every main
+    decoder call verifies a whole draft, accepting the matching prefix plus
+    one token of its own. So accepted = generated - main decoder calls.
+
+    close() removes the hooks; used as a context manager, the hooks are
+    removed on exit.
+    """
+
+    def __init__(self, model, assistant_model):
+        self.target_passes = 0
+        self.drafted_tokens = 0
+        self._handles = [
+            model.get_decoder().register_forward_hook(self._count_target),
+            assistant_model.get_decoder().register_forward_hook(self._count_draft),
+        ]
+
+    def _count_target(self, module, inputs, output):
+        self.target_passes += 1
+
+    def _count_draft(self, module, inputs, output):
+        self.drafted_tokens += 1
+
+    def close(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def summary(self, generated_tokens):
+        """Acceptance rate and decoder passes saved, given the number of generated tokens."""
+        accepted = max(generated_tokens - self.target_passes, 0)
+        return {
+            "drafted_tokens": self.drafted_tokens,
+            "accepted_tokens": accepted,
+            "acceptance_rate": accepted / self.drafted_tokens if self.drafted_tokens else 0.0,
+            "target_forward_passes": self.target_passes,
+            # greedy decoding needs one main decoder pass per generated token
+            "decoder_pass_speedup": generated_tokens / self.target_passes if self.target_passes else 0.0,
+        }
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+
+
+@lru_cache(maxsize=None)
+def get_resampler(orig_sr, target_sr):
+    """Resample kernels are built once per process and (orig_sr, target_sr) pair."""
+    return torchaudio.transforms.Resample(orig_freq=orig_sr, new_freq=target_sr)
+
+
+def read_segment(path, start_frame=None, end_frame=None, target_sr=None):
+    """
+    Read frames [start_frame, end_frame) of an audio file as float32 mono.
+    Only that slice is read from disk (soundfile seeks to start_frame).
+    Returns (array, sampling_rate); resampled if target_sr is given.
+    """
+    audio, sr = sf.read(
+        path,
+        start=start_frame or 0,
+        stop=end_frame,
+        dtype="float32",
+        always_2d=True,
+    )
+
+    # If stereo → downmix to mono
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+
+    if target_sr and sr != target_sr:
+        waveform = torch.from_numpy(np.ascontiguousarray(audio)).unsqueeze(0)
+        audio = get_resampler(sr, target_sr)(waveform).squeeze(0).numpy()
+        sr = target_sr
+
+    return audio, sr
+
+
+def is_virtual(example):
+    """Virtual segments point into a dialogue WAV instead of a per-turn file."""
+    return example.get("start_frame") is not None
+
+
+def load_example_audio(example, sampling_rate=16000):
+    """
+    Return (array, sampling_rate) for a manifest example, either already
+    decoded by datasets.Audio, read from its (path, start_frame, end_frame),
+    or concatenated from the segments of a packed window.
+    """
+    if example.get("segments"):
+        arrays = [
+            read_segment(s["path"], s.get("start_frame"), s.get("end_frame"), target_sr=sampling_rate)[0]
+            for s in example["segments"]
+        ]
+        return np.concatenate(arrays), sampling_rate
+
+    audio = example["audio"]
+    if audio.get("array") is not None:
+        return audio["array"], audio["sampling_rate"]
+
+    return read_segment(
+        audio["path"],
+        example.get("start_frame"),
+        example.get("end_frame"),
+        target_sr=sampling_rate,
+    )
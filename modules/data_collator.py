@@ -1,22 +1,36 @@
+import numpy as np
 import torch
 
 from dataclasses import dataclass
 from typing import Any, Dict, List, Union
 
+from .log_mel import pad_features
+
 
 @dataclass
 class DataCollatorSpeechSeq2SeqWithPadding:
     processor: Any
+    # also return the clip durations (input_length), for per-utterance generation caps
+    return_input_length: bool = False
 
     def __call__(
         self, features: List[Dict[str, Union[List[int], torch.Tensor]]]
     ) -> Dict[str, torch.Tensor]:
         # split inputs and labels since they have to be of different lengths and need different padding methods
-        # first treat the audio inputs by simply returning torch tensors
-        input_features = [
-            {"input_features": feature["input_features"][0]} for feature in features
-        ]
-        batch = self.processor.feature_extractor.pad(input_features, return_tensors="pt")
+        if "encoder_hidden_states" in features[0]:
+            # cached encoder outputs (decoder-only training): all clips cover the full 30s, kept in fp16
+            batch = {"encoder_hidden_states": torch.from_numpy(
+                np.stack([feature["encoder_hidden_states"] for feature in features])
+            )}
+        else:
+            # first treat the audio inputs by simply returning torch tensors
+            # (features from the feature store are unpadded -> pad them to 30s here)
+            num_frames = self.processor.feature_extractor.nb_max_frames
+            input_features = [
+                {"input_features": pad_features(self._input_features(feature), num_frames)}
+                for feature in features
+            ]
+            batch = self.processor.feature_extractor.pad(input_features, return_tensors="pt")
 
         # get the tokenized label sequences
         label_features = [{"input_ids": feature["labels"]} for feature in features]
@@ -35,7 +49,18 @@ class DataCollatorSpeechSeq2SeqWithPadding:
 
         batch["labels"] = labels
 
+        if self.return_input_length:
+            batch["input_length"] = torch.tensor([float(feature["input_length"]) for feature in features])
+
         return batch
+
+    @staticmethod
+    def _input_features(feature):
+        # processor outputs keep a batch dim of 1, feature store outputs are (n_mels, frames)
+        input_features = np.asarray(feature["input_features"], dtype=np.float32)
+        if input_features.ndim == 3:
+            input_features = input_features[0]
+        return input_features
         
         
 # initialise data collator that was just defined
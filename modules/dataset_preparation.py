@@ -0,0 +1,139 @@
+from pathlib import Path
+
+from datasets import Audio
+from transformers import WhisperProcessor
+
+from .audio import load_example_audio
+from .feature_store import load_feature_store_dataset
+from .log_mel import BatchedLogMel
+from .manifest import load_manifest_dataset
+from .packing import pack_manifest, packed_labels
+from .streaming import StreamingSpeechDataset
+
+def prepare_dataset(dataset, processor, max_input_length=30.0, batch_size=32, timestamps=False, keep_columns=()):
+    """
+    Prepares dataset entries with WhisperProcessor (audio -> tensors).
+    Log-mels are computed batch_size clips at a time (BatchedLogMel),
+    equivalent to calling the processor per example.
+    Filters out clips longer than max_input_length seconds.
+    With timestamps=True, packed windows get labels with Whisper timestamp tokens.
+    keep_columns are carried over from the manifest (e.g. utt_id).
+    """
+    log_mel = BatchedLogMel(processor.feature_extractor)
+
+    def _prepare(batch):
+        examples = [dict(zip(batch, values)) for values in zip(*batch.values())]
+        audios = [load_example_audio(example) for example in examples]
+        for _, sampling_rate in audios:
+            if sampling_rate != processor.feature_extractor.sampling_rate:
+                raise ValueError(f"Expected {processor.feature_extractor.sampling_rate} Hz audio, got {sampling_rate} Hz")
+
+        features = log_mel([array for array, _ in audios])
+        if timestamps:
+            labels = [packed_labels(processor.tokenizer, e["texts"], e["turn_times"]) for e in examples]
+        else:
+            labels = processor.tokenizer(batch["text"]).input_ids
+        return {
+            "input_features": [f[None] for f in features], # keep the processor's batch dim
+            "labels": labels,
+            "input_length": [len(array) / sampling_rate for array, sampling_rate in audios],
+            **{column: batch[column] for column in keep_columns},
+        }
+
+    dataset = dataset.map(
+        _prepare,
+        batched=True,
+        batch_size=batch_size,
+        remove_columns=dataset.column_names,
+        num_proc=4,
+        load_from_cache_file=True
+    )
+    dataset = dataset.filter(
+        lambda length: length < max_input_length,
+        input_columns=["input_length"],
+        num_proc=4
+    )
+    return dataset
+
+
+def cast_audio(dataset, sampling_rate=16000):
+    """
+    Decode + resample audio with datasets.Audio. Virtual segments and packed
+    windows are left as (path, start_frame, end_frame) and only their slices
+    are read in prepare_dataset.
+    """
+    if "start_frame" in dataset.column_names or "segments" in dataset.column_names:
+        return dataset
+    return dataset.cast_column("audio", Audio(sampling_rate=sampling_rate))
+
+
+def load_and_prepare_datasets(train_json, dev_json, processor, mode="map", feature_store_dir=None,
+                              pack_turns=False, pack_timestamps=False, pack_max_duration=30.0):
+    """
+    Load HF-style manifests and process with WhisperProcessor.
+
+    mode="map":   dataset.map through the processor (features cached by datasets)
+    mode="store": unpadded fp16 log-mels from a FeatureStore under feature_store_dir,
+                  built on first use and padded to 30s in the data collator
+    mode="streaming": no preprocessing pass, audio is decoded and featurized
+                  in the DataLoader workers (see StreamingSpeechDataset)
+
+    pack_turns=True first packs consecutive turns of a dialogue into windows
+    shorter than pack_max_duration (see modules/packing.py); pack_timestamps
+    adds Whisper timestamp tokens around every turn of the packed labels.
+    """
+    if pack_timestamps and not pack_turns:
+        raise ValueError("pack_timestamps needs pack_turns")
+    if pack_turns:
+        train_json = pack_manifest(train_json, pack_max_duration, processor.tokenizer)
+        dev_json   = pack_manifest(dev_json, pack_max_duration, processor.tokenizer)
+    if mode == "store":
+        if feature_store_dir is None:
+            raise ValueError("mode='store' needs a feature_store_dir")
+        if pack_timestamps:
+            raise ValueError("pack_timestamps is not supported with mode='store'")
+        train_ds = load_feature_store_dataset(train_json, processor, feature_store_dir)
+        dev_ds   = load_feature_store_dataset(dev_json, processor, feature_store_dir)
+        return train_ds, dev_ds
+    if mode == "streaming":
+        train_ds = StreamingSpeechDataset(train_json, processor, timestamps=pack_timestamps)
+        dev_ds   = StreamingSpeechDataset(dev_json, processor, shuffle=False, timestamps=pack_timestamps)
+        return train_ds, dev_ds
+    if mode != "map":
+        raise ValueError(f"Unknown preprocessing mode: {mode}")
+
+    train_ds = load_manifest_dataset(train_json)
+    dev_ds   = load_manifest_dataset(dev_json)
+
+    train_ds = cast_audio(train_ds)
+    dev_ds   = cast_audio(dev_ds)
+
+    train_ds = prepare_dataset(train_ds, processor, timestamps=pack_timestamps)
+    dev_ds   = prepare_dataset(dev_ds, processor, timestamps=pack_timestamps)
+
+    return train_ds, dev_ds
+
+
+def load_and_prepare_testset(test_json, processor, skip_ids=None):
+    """
+    Load HF-style test manifest and process with WhisperProcessor.
+    Every clip keeps its utt_id (the segment file name if the manifest has none);
+    clips whose utt_id is in skip_ids (e.g. already evaluated) are left out.
+    """
+    test_ds = load_manifest_dataset(test_json)
+    if "utt_id" not in test_ds.column_names:
+        test_ds = test_ds.map(
+            lambda audio: {"utt_id": Path(audio["path"]).stem},
+            input_columns=["audio"],
+        )
+    if skip_ids:
+        skip_ids = set(skip_ids)
+        test_ds = test_ds.filter(lambda utt_id: utt_id not in skip_ids, input_columns=["utt_id"])
+
+    # ensure audio is decoded + resampled to 16kHz
+    test_ds = cast_audio(test_ds)
+
+    # prepare features using same pipeline
+    test_ds = prepare_dataset(test_ds, processor, keep_columns=("utt_id",))
+
+    return test_ds
\ No newline at end of file
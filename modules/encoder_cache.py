@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+SHARD_FILE = "states-{:05d}.f16"  # (clips, positions, d_model) fp16, shard_size clips per shard
+INDEX_FILE = "index.npz"          # input_length and labels (flat + offsets) per clip
+META_FILE = "meta.json"
+
+
+def encoder_hash(model):
+    """Short hash of the encoder weights; cached states are only reused if it matches."""
+    sha = hashlib.sha1()
+    for name, tensor in model.get_encoder().state_dict().items():
+        sha.update(name.encode("utf-8"))
+        sha.update(tensor.detach().to("cpu", torch.float32).numpy().tobytes())
+    return sha.hexdigest()[:16]
+
+
+def file_hash(path):
+    """Short hash of a file's contents (unlike size / mtime, unchanged by a copy or touch)."""
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()[:16]
+
+
+def estimated_size(model, num_rows):
+    """Bytes of the fp16 encoder states of num_rows clips (full 30s inputs)."""
+    return num_rows * model.config.max_source_positions * model.config.d_model * 2
+
+
+class EncoderCache:
+    """
+    Encoder outputs (last_hidden_state over the full 30s input, so the decoder
+    sees exactly what a frozen encoder would give it) of one training
+    manifest, stored in fp16 in memory-mapped shards of shard_size clips,
+    together with the labels and durations of the prepared dataset they were
+    computed from. Stored under <root>/<manifest name>-<encoder hash>/;
+    the source signature holds the manifest's content hash and extra (e.g.
+    packing settings). weights_hash (encoder_hash of the model) can be passed
+    in to hash the weights once for several caches.
+    """
+
+    def __init__(self, root, manifest, model, shard_size=1024, extra=None, weights_hash=None):
+        self.manifest = Path(manifest)
+        self.hash = weights_hash or encoder_hash(model)
+        self.dir = Path(root) / f"{self.manifest.stem}-{self.hash}"
+        self.shard_size = shard_size
+        self.extra = extra or {}
+        self._signature = None
+        self._shards = {}
+        self._index = None
+        self._meta = None
+
+    def _source_signature(self):
+        if self._signature is None:
+            self._signature = {"manifest": str(self.manifest.resolve()), "manifest_hash": file_hash(self.manifest),
+                               "encoder": self.hash, **self.extra}
+        return self._signature
+
+    def exists(self):
+        meta = self.dir / META_FILE
+        if not meta.exists():
+            return False
+        with open(meta, "r", encoding="utf-8") as f:
+            return json.load(f)["source"] == self._source_signature()
+
+    def build(self, model, dataset, collator, batch_size=16, num_workers=0):
+        """
+        Run the encoder once over a prepared dataset (in its iteration order)
+        and store its outputs; collator turns examples into padded
+        input_features (DataCollatorSpeechSeq2SeqWithPadding). Refuses to
+        start when the estimated size does not fit on the cache's disk.
+        """
+        tmp_dir = self.dir.with_name(self.dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        if hasattr(dataset, "__len__"):
+            required = estimated_size(model, len(dataset))
+            free = shutil.disk_usage(tmp_dir).free
+            if required > free:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise OSError(f"Encoder cache of {len(dataset)} clips needs ~{required / 2**30:.1f} GiB, "
+                              f"only {free / 2**30:.1f} GiB free under {self.dir.parent}")
+
+        def collate(examples):
+            return (collator(examples), [list(e["labels"]) for e in examples],
+                    [float(e["input_length"]) for e in examples])
+
+        if hasattr(dataset, "with_format"):  # datasets.Dataset: arrays instead of nested lists
+            dataset = dataset.with_format("numpy")
+        loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False,
+                                             collate_fn=collate, num_workers=num_workers)
+        encoder = model.get_encoder()
+        device = next(encoder.parameters()).device
+        dtype = next(encoder.parameters()).dtype
+
+        labels, input_length, shape = [], [], None
+        shard, num_shards, n = None, 0, 0
+        with torch.inference_mode():
+            for batch, batch_labels, batch_lengths in tqdm(loader, desc="Encoder cache"):
+                input_features = batch["input_features"].to(device, dtype)
+                states = encoder(input_features=input_features).last_hidden_state
+                states = states.to(torch.float16).cpu().numpy()
+                shape = states.shape[1:]
+                for row in states:
+                    if n % self.shard_size == 0:
+                        if shard is not None:
+                            shard.close()
+                        shard = open(tmp_dir / SHARD_FILE.format(num_shards), "wb")
+                        num_shards += 1
+                    shard.write(row.tobytes())
+                    n += 1
+                labels.extend(batch_labels)
+                input_length.extend(batch_lengths)
+        if shard is not None:
+            shard.close()
+
+        label_offsets = np.cumsum([0] + [len(l) for l in labels]).astype(np.int64)
+        np.savez(tmp_dir / INDEX_FILE,
+                 input_length=np.array(input_length, dtype=np.float32),
+                 labels=np.array([t for l in labels for t in l], dtype=np.int32),
+                 label_offsets=label_offsets)
+        with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": self._source_signature(),
+                "num_rows": n,
+                "shard_size": self.shard_size,
+                "num_shards": num_shards,
+                "positions": int(shape[0]) if shape else 0,
+                "d_model": int(shape[1]) if shape else 0,
+            }, f, indent=2)
+
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.replace(tmp_dir, self.dir)
+        self._shards, self._index, self._meta = {}, None, None
+        return self
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with open(self.dir / META_FILE, "r", encoding="utf-8") as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    @property
+    def index(self):
+        if self._index is None:
+            with np.load(self.dir / INDEX_FILE) as index:
+                self._index = {k: index[k] for k in index.files}
+        return self._index
+
+    def _shard(self, k):
+        # opened lazily so every DataLoader worker maps the files itself
+        if k not in self._shards:
+            shape = (self.meta["positions"], self.meta["d_model"])
+            self._shards[k] = np.memmap(self.dir / SHARD_FILE.format(k), dtype=np.float16, mode="r").reshape(-1, *shape)
+        return self._shards[k]
+
+    def __len__(self):
+        return self.meta["num_rows"]
+
+    def __getitem__(self, i):
+        """(positions, d_model) fp16 encoder states of clip i."""
+        shard_size = self.meta["shard_size"]
+        return self._shard(i // shard_size)[i % shard_size]
+
+    def labels(self, i):
+        offsets = self.index["label_offsets"]
+        return self.index["labels"][offsets[i]:offsets[i + 1]].tolist()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+
+class EncoderCacheDataset(torch.utils.data.Dataset):
+    """
+    Map-style training dataset over an EncoderCache: encoder_hidden_states
+    (fp16), labels and input_length, batched by DataCollatorSpeechSeq2SeqWithPadding
+    and fed to the decoder by BucketedSeq2SeqTrainer.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.cache)
+
+    def lengths(self):
+        """(durations, label lengths) of the cached clips, for length-grouped batching."""
+        return self.cache.index["input_length"], np.diff(self.cache.index["label_offsets"])
+
+    def __getitem__(self, i):
+        return {
+            "encoder_hidden_states": np.asarray(self.cache[i]),
+            "labels": self.cache.labels(i),
+            "input_length": float(self.cache.index["input_length"][i]),
+        }
+
+
+def load_encoder_cache_dataset(dataset, manifest, model, processor, cache_root, batch_size=16,
+                               shard_size=1024, num_workers=0, extra=None, weights_hash=None):
+    """
+    Encoder outputs of a prepared dataset as a training dataset, cached
+    under cache_root (built on first use, or when the manifest or the
+    encoder weights change).
+    """
+    from .data_collator import DataCollatorSpeechSeq2SeqWithPadding
+
+    cache = EncoderCache(cache_root, manifest, model, shard_size=shard_size, extra=extra, weights_hash=weights_hash)
+    if not cache.exists():
+        collator = DataCollatorSpeechSeq2SeqWithPadding(processor=processor)
+        cache.build(model, dataset, collator, batch_size=batch_size, num_workers=num_workers)
+    return EncoderCacheDataset(cache)
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import shutil
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from .audio import load_example_audio
+from .log_mel import BatchedLogMel
+from .manifest import ManifestReader
+from .parallel import chunked, ordered_imap
+
+FEATURES_FILE = "features.f16"  # all clips back to back, (total_frames, n_mels) fp16
+INDEX_FILE = "index.npz"        # offset / num_frames / input_length per manifest row
+META_FILE = "meta.json"
+
+
+def feature_config_hash(feature_extractor):
+    """Short hash of the feature-extractor config; features are only reused if it matches."""
+    config = json.dumps(feature_extractor.to_dict(), sort_keys=True, default=str)
+    return hashlib.sha1(config.encode("utf-8")).hexdigest()[:16]
+
+
+def _extract(rows, feature_extractor):
+    """Worker: audio of a chunk of manifest rows -> unpadded (frames, n_mels) fp16 features."""
+    audios = [load_example_audio(row, feature_extractor.sampling_rate) for row in rows]
+    features = BatchedLogMel(feature_extractor)([array for array, _ in audios], padded=False)
+    return [
+        (f.T.astype(np.float16), len(array) / sampling_rate)
+        for f, (array, sampling_rate) in zip(features, audios)
+    ]
+
+
+class FeatureStore:
+    """
+    Precomputed log-mel features of one manifest, stored unpadded in fp16 in a
+    single memory-mapped file plus an offset index.
+    Stored under <root>/<manifest name>-<feature config hash>/.
+    """
+
+    def __init__(self, root, manifest, feature_extractor):
+        self.manifest = Path(manifest)
+        self.feature_extractor = feature_extractor
+        self.dir = Path(root) / f"{self.manifest.stem}-{feature_config_hash(feature_extractor)}"
+        self._features = None
+        self._index = None
+
+    def _manifest_signature(self):
+        stat = os.stat(self.manifest)
+        return {"manifest": str(self.manifest.resolve()), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def exists(self):
+        meta = self.dir / META_FILE
+        if not meta.exists():
+            return False
+        with open(meta, "r", encoding="utf-8") as f:
+            return json.load(f)["source"] == self._manifest_signature()
+
+    def build(self, num_workers=None):
+        """Extract features for every manifest row, in manifest order."""
+        tmp_dir = self.dir.with_name(self.dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        reader = ManifestReader(self.manifest)
+        columns = [c for c in ("audio", "start_frame", "end_frame", "segments") if c in reader.column_names]
+        n_rows = len(reader)
+
+        offsets = np.zeros(n_rows, dtype=np.int64)
+        num_frames = np.zeros(n_rows, dtype=np.int32)
+        input_length = np.zeros(n_rows, dtype=np.float32)
+
+        offset = 0
+        chunks = ordered_imap(
+            partial(_extract, feature_extractor=self.feature_extractor),
+            chunked(reader.rows(columns), 32),
+            num_workers=num_workers,
+        )
+        results = (result for chunk in chunks for result in chunk)
+        with open(tmp_dir / FEATURES_FILE, "wb") as f:
+            for i, (features, length) in enumerate(tqdm(results, total=n_rows, desc="Feature store")):
+                f.write(features.tobytes())
+                offsets[i], num_frames[i], input_length[i] = offset, len(features), length
+                offset += len(features)
+
+        np.savez(tmp_dir / INDEX_FILE, offsets=offsets, num_frames=num_frames, input_length=input_length)
+        with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": self._manifest_signature(),
+                "feature_extractor": self.feature_extractor.to_dict(),
+                "num_rows": n_rows,
+                "total_frames": int(offset),
+            }, f, indent=2, default=str)
+
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.replace(tmp_dir, self.dir)
+        self._features = self._index = None
+        return self
+
+    @property
+    def index(self):
+        if self._index is None:
+            with np.load(self.dir / INDEX_FILE) as index:
+                self._index = {k: index[k] for k in index.files}
+        return self._index
+
+    @property
+    def features(self):
+        # opened lazily so every DataLoader worker maps the file itself
+        if self._features is None:
+            n_mels = self.feature_extractor.feature_size
+            self._features = np.memmap(self.dir / FEATURES_FILE, dtype=np.float16, mode="r").reshape(-1, n_mels)
+        return self._features
+
+    def __len__(self):
+        return len(self.index["offsets"])
+
+    def __getitem__(self, i):
+        """Unpadded (n_mels, frames) float32 features of manifest row i."""
+        offset, n = self.index["offsets"][i], self.index["num_frames"][i]
+        return self.features[offset:offset + n].T.astype(np.float32)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_features"] = None
+        return state
+
+
+class FeatureStoreDataset(torch.utils.data.Dataset):
+    """
+    Map-style training dataset over a FeatureStore. Labels are tokenized on
+    access; clips of max_input_length seconds or more are left out.
+    Features are padded to 30s by DataCollatorSpeechSeq2SeqWithPadding.
+    """
+
+    def __init__(self, store, texts, tokenizer, max_input_length=30.0):
+        self.store = store
+        self.texts = texts
+        self.tokenizer = tokenizer
+        self.input_length = store.index["input_length"]
+        self.rows = np.flatnonzero(self.input_length < max_input_length)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lengths(self):
+        """(durations, label lengths) of the kept clips, for length-grouped batching."""
+        label_ids = self.tokenizer([str(t) for t in self.texts[self.rows]]).input_ids
+        return self.input_length[self.rows], np.array([len(ids) for ids in label_ids])
+
+    def __getitem__(self, i):
+        row = self.rows[i]
+        return {
+            "input_features": self.store[row],
+            "labels": self.tokenizer(self.texts[row]).input_ids,
+            "input_length": float(self.input_length[row]),
+        }
+
+
+def load_feature_store_dataset(manifest, processor, store_root, max_input_length=30.0, num_workers=None):
+    """Open the feature store of a manifest (building it on first use) as a training dataset."""
+    store = FeatureStore(store_root, manifest, processor.feature_extractor)
+    if not store.exists():
+        store.build(num_workers=num_workers)
+    texts = ManifestReader(manifest).column("text")
+    return FeatureStoreDataset(store, texts, processor.tokenizer, max_input_length)
@@ -0,0 +1,176 @@
+import json
+import os
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import torch
+from transformers import LogitsProcessor, LogitsProcessorList
+from transformers.cache_utils import DynamicCache, EncoderDecoderCache
+
+LENGTH_CAP_FILE = "generation_length.json"  # fitted by finetuning.py, next to the checkpoint
+
+
+@dataclass
+class GenerationLengthCap:
+    """
+    Per-utterance max_new_tokens from the clip duration:
+    min_new_tokens + margin * tokens_per_second * duration, at most max_new_tokens.
+    tokens_per_second is a high quantile of the training transcripts' rate, so
+    a hallucinating decode on a short turn stops long before max_new_tokens.
+    """
+    tokens_per_second: float
+    margin: float = 1.25
+    min_new_tokens: int = 10
+    max_new_tokens: int = 225
+
+    def caps(self, durations):
+        """max_new_tokens per clip (int array)."""
+        durations = np.asarray(durations, dtype=np.float64)
+        caps = np.ceil(self.min_new_tokens + self.margin * self.tokens_per_second * durations)
+        return np.minimum(caps, self.max_new_tokens).astype(np.int64)
+
+    @classmethod
+    def fit(cls, durations, num_tokens, quantile=0.999, **kwargs):
+        """Fit tokens_per_second on (duration, generated tokens incl. EOS) pairs of the training set."""
+        durations = np.asarray(durations, dtype=np.float64)
+        num_tokens = np.asarray(num_tokens, dtype=np.float64)
+        keep = durations > 0
+        rates = num_tokens[keep] / durations[keep]
+        return cls(tokens_per_second=float(np.quantile(rates, quantile)), **kwargs)
+
+    def save(self, model_dir):
+        os.makedirs(model_dir, exist_ok=True)
+        with open(os.path.join(model_dir, LENGTH_CAP_FILE), "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, model_dir):
+        with open(os.path.join(model_dir, LENGTH_CAP_FILE), "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def fit_length_cap(manifest, tokenizer, quantile=0.999, **kwargs):
+    """GenerationLengthCap fitted on the durations and transcripts of an HF-style manifest."""
+    from .manifest import ManifestReader
+
+    reader = ManifestReader(manifest)
+    durations = reader.column("duration")
+    texts = [str(t) for t in reader.column("text")]
+    num_tokens = [len(ids) + 1 for ids in tokenizer(texts, add_special_tokens=False).input_ids]  # + EOS
+    return GenerationLengthCap.fit(durations, num_tokens, quantile=quantile, **kwargs)
+
+
+def build_length_cap(generation_cfg, tokenizer=None, model_dir=None, train_manifest=None, max_new_tokens=225):
+    """
+    GenerationLengthCap from the `generation:` config section (None if
+    duration_caps is off). tokens_per_second comes from the config, else
+    from generation_length.json in model_dir, else it is fitted on train_manifest.
+    """
+    if not generation_cfg or not generation_cfg.get("duration_caps", False):
+        return None
+    params = {
+        "margin": generation_cfg.get("margin", 1.25),
+        "min_new_tokens": generation_cfg.get("min_new_tokens", 10),
+        "max_new_tokens": max_new_tokens,
+    }
+    if generation_cfg.get("tokens_per_second"):
+        return GenerationLengthCap(tokens_per_second=generation_cfg["tokens_per_second"], **params)
+    if model_dir and os.path.exists(os.path.join(model_dir, LENGTH_CAP_FILE)):
+        return GenerationLengthCap(tokens_per_second=GenerationLengthCap.load(model_dir).tokens_per_second, **params)
+    if train_manifest and tokenizer is not None:
+        return fit_length_cap(train_manifest, tokenizer, quantile=generation_cfg.get("quantile", 0.999), **params)
+    raise ValueError(
+        "generation.duration_caps needs generation.tokens_per_second, a fitted "
+        f"{LENGTH_CAP_FILE} in the model directory or data.train_manifest to fit on"
+    )
+
+
+class RowMaxNewTokensLogitsProcessor(LogitsProcessor):
+    """
+    Forces EOS once a row has generated its own max_new_tokens - 1 tokens, so
+    every clip of a batch stops at its cap (generate's max_new_tokens is the
+    batch maximum). The prompt length is taken from the first call.
+    """
+
+    def __init__(self, max_new_tokens, eos_token_id):
+        self.max_new_tokens = torch.as_tensor(np.asarray(max_new_tokens), dtype=torch.long)
+        self.eos_token_id = eos_token_id
+        self.prompt_length = None
+
+    def __call__(self, input_ids, scores):
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+        generated = input_ids.shape[1] - self.prompt_length
+        # beams / returned sequences of a clip are consecutive rows
+        caps = self.max_new_tokens.to(scores.device).repeat_interleave(input_ids.shape[0] // len(self.max_new_tokens))
+        stop = generated >= caps - 1
+        if stop.any():
+            scores[stop] = -float("inf")
+            scores[stop, self.eos_token_id] = 0.0
+        return scores
+
+
+def row_caps_generate_kwargs(caps, eos_token_id):
+    """generate() kwargs for per-row caps: the batch maximum plus a RowMaxNewTokensLogitsProcessor."""
+    return {
+        "max_new_tokens": int(np.max(caps)),
+        "logits_processor": LogitsProcessorList([RowMaxNewTokensLogitsProcessor(caps, eos_token_id)]),
+    }
+
+
+def _suppress(logits, generation_config, step):
+    suppress = list(generation_config.suppress_tokens or [])
+    if step == 0:
+        suppress += list(generation_config.begin_suppress_tokens or [])
+    suppress = [t for t in suppress if t < logits.shape[-1]]
+    if suppress:
+        logits[:, suppress] = -float("inf")
+    return logits
+
+
+@torch.inference_mode()
+def pruned_greedy_generate(model, input_features, prompt_ids, max_new_tokens, encoder_hidden_states=None):
+    """
+    Greedy decoding for WhisperForConditionalGeneration that drops finished
+    rows from the batch: once a clip emits EOS or reaches its max_new_tokens
+    (int or one per row; EOS is forced as the last token), its encoder states
+    and KV cache rows are removed, so the remaining steps only run on
+    unfinished clips. Same suppress tokens as model.generate; returns
+    prompt + tokens, padded with pad_token_id. With encoder_hidden_states
+    (e.g. from an encoder cache) input_features are not needed.
+    """
+    generation_config = model.generation_config
+    eos, pad = generation_config.eos_token_id, model.config.pad_token_id
+    if encoder_hidden_states is None:
+        encoder_hidden_states = model.get_encoder()(input_features=input_features).last_hidden_state
+    batch = len(encoder_hidden_states)
+    device = encoder_hidden_states.device
+    caps = torch.as_tensor(np.broadcast_to(np.asarray(max_new_tokens), (batch,)).copy(), device=device)
+
+    prompt = torch.tensor([list(prompt_ids)] * batch, dtype=torch.long, device=device)
+    cache = EncoderDecoderCache(DynamicCache(), DynamicCache())
+    outputs = model(encoder_outputs=(encoder_hidden_states,), decoder_input_ids=prompt,
+                    past_key_values=cache, use_cache=True)
+
+    tokens = torch.full((batch, max(int(caps.max()), 1)), pad, dtype=torch.long, device=device)
+    live = torch.arange(batch, device=device)  # original row of every row still decoding
+    step = 0
+    for step in range(tokens.shape[1]):
+        logits = _suppress(outputs.logits[:, -1].float(), generation_config, step)
+        last = step + 1 >= caps[live]
+        logits[last, eos] = float("inf")  # EOS as the last token, like RowMaxNewTokensLogitsProcessor
+        next_tokens = logits.argmax(-1)
+        tokens[live, step] = next_tokens
+
+        finished = (next_tokens == eos) | last
+        if finished.all():
+            break
+        if finished.any():
+            keep = (~finished).nonzero().squeeze(1)
+            live, next_tokens = live[keep], next_tokens[keep]
+            encoder_hidden_states = encoder_hidden_states[keep]
+            outputs.past_key_values.batch_select_indices(keep)
+        outputs = model(encoder_outputs=(encoder_hidden_states,), decoder_input_ids=next_tokens[:, None],
+                        past_key_values=outputs.past_key_values, use_cache=True)
+
+    return torch.cat([prompt, tokens[:, :step + 1]], dim=1)
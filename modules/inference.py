@@ -0,0 +1,217 @@
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from .data_collator import DataCollatorSpeechSeq2SeqWithPadding
+from .generation import pruned_greedy_generate, row_caps_generate_kwargs
+from .model_loader import encoder_frames, variable_length_encoder
+from .samplers import DurationBucketBatchSampler
+
+
+class BatchedInference:
+    """
+    Batched Whisper transcription of a prepared test set
+    (load_and_prepare_testset, with an utt_id column).
+
+    Clips are sorted by duration (longest first) and transcribed batch_size
+    at a time with model.generate under torch.inference_mode; results are
+    yielded per clip as soon as their batch is decoded, so nothing but the
+    current batch is kept in memory. Results carry the clip's utt_id and are
+    matched back to the manifest by ID, not by position.
+
+    generate_kwargs go to model.generate; with an assistant_model (assisted
+    decoding, see modules/assisted.py) clips are transcribed one at a time,
+    the only batch size transformers supports for it. generated_tokens and
+    generate_seconds add up over calls.
+
+    With a length_cap (generation.GenerationLengthCap) every clip gets its own
+    max_new_tokens from its duration; prune_finished decodes greedily with
+    generation.pruned_greedy_generate, which drops finished clips from the
+    batch instead of padding them until the longest one is done.
+
+    With encoder_bucket_seconds (variable-length encoder mode, PyTorch only)
+    batches never mix length buckets, and each batch's log-mel features are
+    trimmed to its bucket: the longest clip rounded up to a multiple of
+    encoder_bucket_seconds, instead of Whisper's 30s window (see
+    model_loader.variable_length_encoder).
+    """
+
+    def __init__(self, model, processor, device=None, batch_size=16, num_workers=0,
+                 length_cap=None, prune_finished=False, encoder_bucket_seconds=None, **generate_kwargs):
+        # model: WhisperForConditionalGeneration or any object with the same
+        # generate / dtype / device interface (e.g. onnx_backend.OnnxWhisper)
+        self.model = model.eval()
+        self.processor = processor
+        self.device = device or model.device
+        if generate_kwargs.get("assistant_model") is not None:
+            batch_size = 1
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.generate_kwargs = generate_kwargs
+        self.length_cap = length_cap
+        self.prune_finished = prune_finished
+        if prune_finished and (generate_kwargs.get("num_beams", 1) > 1 or "assistant_model" in generate_kwargs
+                               or not hasattr(model, "get_encoder")):
+            raise ValueError("prune_finished is greedy decoding of a PyTorch model without assistant_model")
+        if encoder_bucket_seconds and not hasattr(model, "get_encoder"):
+            raise ValueError("encoder_bucket_seconds needs a PyTorch model")
+        self.encoder_bucket_seconds = encoder_bucket_seconds
+        self.collator = DataCollatorSpeechSeq2SeqWithPadding(processor=processor)
+        self.generated_tokens = 0
+        self.generate_seconds = 0.0
+
+    def _collate(self, rows):
+        batch = self.collator([{"input_features": r["input_features"], "labels": r["labels"]} for r in rows])
+        return [r["utt_id"] for r in rows], np.array([r["input_length"] for r in rows]), batch
+
+    def batches(self, dataset):
+        """Batches of dataset indices, longest clips first."""
+        durations = np.asarray(dataset["input_length"], dtype=np.float64)
+        batches = DurationBucketBatchSampler(durations, batch_size=self.batch_size, shuffle=False).batches()
+        if not self.encoder_bucket_seconds:
+            return batches
+        # split batches that straddle a bucket boundary (clips are sorted, so at most once)
+        split = []
+        for batch in batches:
+            frames = np.array([encoder_frames(durations[i], self.encoder_bucket_seconds) for i in batch])
+            for value in np.unique(frames)[::-1]:
+                split.append([i for i, f in zip(batch, frames) if f == value])
+        return split
+
+    def generate(self, input_features, durations=None):
+        input_features = input_features.to(self.device, dtype=self.model.dtype)
+        generate_kwargs = dict(self.generate_kwargs)
+        caps = None
+        if self.length_cap is not None and durations is not None:
+            caps = self.length_cap.caps(durations)
+            generate_kwargs.update(row_caps_generate_kwargs(caps, self.model.generation_config.eos_token_id))
+
+        if self.encoder_bucket_seconds and durations is not None:
+            num_frames = encoder_frames(max(durations), self.encoder_bucket_seconds, input_features.shape[-1])
+            models = [self.model] + [m for m in [generate_kwargs.get("assistant_model")] if m is not None]
+            with variable_length_encoder(models, num_frames):
+                return self._generate(input_features[..., :num_frames], generate_kwargs, caps)
+        return self._generate(input_features, generate_kwargs, caps)
+
+    def _generate(self, input_features, generate_kwargs, caps):
+        if self.prune_finished:
+            prompt_ids = self.processor.tokenizer.prefix_tokens
+            if caps is None:
+                caps = generate_kwargs.get("max_new_tokens") or self.model.config.max_target_positions - len(prompt_ids)
+            return pruned_greedy_generate(self.model, input_features, prompt_ids, caps)
+
+        with torch.inference_mode():
+            return self.model.generate(input_features=input_features, **generate_kwargs)
+
+    def __call__(self, dataset):
+        """Yield {"utt_id", "asr_pred", "asr_ref"} per clip, in batch order."""
+        if "utt_id" not in dataset.column_names:
+            raise ValueError("The dataset needs an utt_id column (see load_and_prepare_testset)")
+
+        tokenizer = self.processor.tokenizer
+        batches = self.batches(dataset)
+        dataloader = torch.utils.data.DataLoader(
+            dataset.with_format("numpy", columns=["utt_id", "input_features", "labels", "input_length"]),
+            batch_sampler=batches,
+            collate_fn=self._collate,
+            num_workers=self.num_workers,
+        )
+
+        for utt_ids, durations, batch in tqdm(dataloader, total=len(batches), desc="Transcribing"):
+            start = time.perf_counter()
+            gen_ids = self.generate(batch["input_features"], durations).cpu().numpy()
+            self.generate_seconds += time.perf_counter() - start
+            self.generated_tokens += count_new_tokens(gen_ids, tokenizer.prefix_tokens, tokenizer.eos_token_id)
+            label_ids = batch["labels"].numpy()
+            label_ids = np.where(label_ids == -100, tokenizer.pad_token_id, label_ids)
+
+            pred_texts = tokenizer.batch_decode(gen_ids, skip_special_tokens=True)
+            label_texts = tokenizer.batch_decode(label_ids, skip_special_tokens=True)
+            for utt_id, pred, ref in zip(utt_ids, pred_texts, label_texts):
+                yield {"utt_id": str(utt_id), "asr_pred": pred.strip(), "asr_ref": ref.strip()}
+
+
+def count_new_tokens(gen_ids, prompt_ids, eos_token_id):
+    """Generated tokens (up to and including EOS) in a batch of generate outputs, without the decoder prompt."""
+    prompt_ids = set(prompt_ids)
+    count = 0
+    for row in gen_ids:
+        start = 0
+        while start < len(row) and row[start] in prompt_ids:
+            start += 1
+        eos = np.flatnonzero(row[start:] == eos_token_id)
+        count += int(eos[0]) + 1 if len(eos) else len(row) - start
+    return count
+
+
+def write_predictions(results, path, append=False):
+    """
+    Write results to a JSONL file as they come (flushed per line).
+    With append=True new results go after the existing ones (a line torn by
+    a crash is dropped first). Returns the number written.
+    """
+    if append:
+        _drop_partial_line(path)
+    count = 0
+    with open(path, "a" if append else "w", encoding="utf-8") as f:
+        for row in results:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            count += 1
+    return count
+
+
+def _drop_partial_line(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def load_predictions(path):
+    """utt_id -> prediction row of a predictions JSONL file ({} if it does not exist yet)."""
+    predictions = {}
+    if not os.path.exists(path):
+        return predictions
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # torn by a crash, redone on resume
+            if line.strip():
+                row = json.loads(line)
+                predictions[row["utt_id"]] = row
+    return predictions
+
+
+def shard_indices(durations, num_shards):
+    """
+    Dataset indices of num_shards shards with about the same amount of audio:
+    clips are dealt round-robin, longest first. Every shard is sorted.
+    """
+    order = np.argsort(-np.asarray(durations, dtype=np.float64), kind="stable")
+    return [np.sort(order[i::num_shards]).tolist() for i in range(num_shards)]
+
+
+def merge_predictions(path, shard_paths):
+    """
+    Append the rows of per-shard predictions files to path, sorted by utt_id
+    (rows already in path win), then delete the shard files, so the merged
+    file does not depend on which worker finished first. Returns the number
+    of rows added.
+    """
+    if not shard_paths:
+        return 0
+    done = load_predictions(path)
+    rows = {}
+    for shard_path in shard_paths:
+        rows.update(load_predictions(shard_path))
+    count = write_predictions((rows[u] for u in sorted(rows) if u not in done), path, append=True)
+    for shard_path in shard_paths:
+        os.remove(shard_path)
+    return count
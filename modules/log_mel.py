@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+import numpy as np
+import torch
+
+
+def num_content_frames(num_samples, feature_extractor):
+    """
+    Mel frames that depend on the clip's samples. Every later frame only sees
+    the zero padding up to 30s and can be rebuilt from pad_value().
+    """
+    half_window = feature_extractor.n_fft // 2
+    frames = -(-(num_samples + half_window) // feature_extractor.hop_length)
+    return min(frames, feature_extractor.nb_max_frames)
+
+
+def pad_value(features):
+    """
+    Value of Whisper's log-mel on zero padding: log10(1e-10) = -10, clamped to
+    (max - 8) and scaled by (x + 4) / 4, i.e. max(-1.5, features.max() - 2).
+    """
+    return max(-1.5, float(features.max()) - 2.0)
+
+
+def pad_features(features, num_frames):
+    """Pad (n_mels, frames) log-mel features to num_frames exactly as WhisperFeatureExtractor would."""
+    missing = num_frames - features.shape[-1]
+    if missing <= 0:
+        return features
+    return np.pad(features, ((0, 0), (0, missing)), constant_values=pad_value(features))
+
+
+class BatchedLogMel:
+    """
+    Whisper log-mel spectrograms for many clips in one call.
+
+    Clips are bucketed by length (rounded up to bucket_seconds) and every
+    bucket runs as one batched torch.stft with a cached window and mel
+    filterbank. The output matches WhisperFeatureExtractor (torch path,
+    no dither / do_normalize): all frames past the bucket only see Whisper's
+    zero padding, and their value is filled in by pad_features().
+    """
+
+    def __init__(self, feature_extractor, device="cpu", bucket_seconds=1.0):
+        self.feature_extractor = feature_extractor
+        self.device = torch.device(device)
+        self.n_fft = feature_extractor.n_fft
+        self.hop_length = feature_extractor.hop_length
+        self.n_samples = feature_extractor.n_samples
+        self.nb_max_frames = feature_extractor.nb_max_frames
+        # bucket boundaries on hop boundaries so frames line up with the 30s computation
+        bucket = int(bucket_seconds * feature_extractor.sampling_rate)
+        self.bucket = max(self.hop_length, bucket - bucket % self.hop_length)
+
+        self.window = torch.hann_window(self.n_fft, device=self.device)
+        self.mel_filters = torch.from_numpy(feature_extractor.mel_filters).to(self.device, torch.float32).T
+
+    def _bucket_length(self, num_samples):
+        # past num_samples + n_fft the stft (incl. its reflect padding) only sees zeros
+        length = -(-(num_samples + self.n_fft) // self.bucket) * self.bucket
+        return min(length, self.n_samples)
+
+    def _log_mel(self, waveforms):
+        """(batch, samples) -> (batch, n_mels, samples // hop_length) Whisper log-mels."""
+        stft = torch.stft(
+            waveforms, self.n_fft, self.hop_length, window=self.window, return_complex=True
+        )
+        magnitudes = stft[..., :-1].abs() ** 2
+        mel_spec = self.mel_filters @ magnitudes
+        log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+        max_val = log_spec.amax(dim=(1, 2), keepdim=True)
+        log_spec = torch.maximum(log_spec, max_val - 8.0)
+        return (log_spec + 4.0) / 4.0
+
+    def __call__(self, waveforms, padded=True):
+        """
+        Return one float32 (n_mels, frames) array per waveform: padded to 30s
+        like the feature extractor, or only the clip's content frames
+        (see num_content_frames) with padded=False.
+        """
+        waveforms = [np.asarray(w, dtype=np.float32)[:self.n_samples] for w in waveforms]
+
+        buckets = defaultdict(list)
+        for i, waveform in enumerate(waveforms):
+            buckets[self._bucket_length(len(waveform))].append(i)
+
+        outputs = [None] * len(waveforms)
+        with torch.inference_mode():
+            for length, idx in buckets.items():
+                batch = torch.zeros(len(idx), length, dtype=torch.float32)
+                for row, i in enumerate(idx):
+                    batch[row, :len(waveforms[i])] = torch.from_numpy(waveforms[i])
+                log_spec = self._log_mel(batch.to(self.device)).cpu().numpy()
+
+                for row, i in enumerate(idx):
+                    n = num_content_frames(len(waveforms[i]), self.feature_extractor)
+                    features = log_spec[row, :, :n]
+                    outputs[i] = pad_features(features, self.nb_max_frames) if padded else features
+
+        return outputs
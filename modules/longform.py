@@ -0,0 +1,190 @@
+import time
+
+import numpy as np
+import torch
+
+from .log_mel import BatchedLogMel
+
+TIME_PRECISION = 0.02  # seconds per timestamp token (30s / 1500 encoder positions)
+
+
+def sliding_windows(num_samples, sampling_rate=16000, window_seconds=30.0, overlap_seconds=5.0):
+    """(start, end) sample ranges of overlapping windows covering num_samples (the last one may be shorter)."""
+    window = int(window_seconds * sampling_rate)
+    stride = window - int(overlap_seconds * sampling_rate)
+    if stride <= 0:
+        raise ValueError("overlap_seconds must be shorter than window_seconds")
+    windows = [(0, min(window, num_samples))]
+    while windows[-1][1] < num_samples:
+        start = windows[-1][0] + stride
+        windows.append((start, min(start + window, num_samples)))
+    return windows
+
+
+def parse_timestamped(token_ids, timestamp_begin, special_ids, window_duration):
+    """
+    Segments {"start", "end", "tokens"} (seconds relative to the window, text
+    token ids) of one generate output with timestamp tokens:
+    <|t0|> text <|t1|><|t1|> text <|t2|> ... Text after the last timestamp
+    (cut off by the window end) runs to window_duration. A timestamp going
+    back in time (a decoding loop) ends the window.
+    """
+    segments, tokens, start = [], [], 0.0
+    for token in token_ids:
+        token = int(token)
+        if token >= timestamp_begin:
+            seconds = (token - timestamp_begin) * TIME_PRECISION
+            if seconds < start:
+                return segments
+            if tokens:
+                segments.append({"start": start, "end": max(seconds, start), "tokens": tokens})
+                tokens = []
+            start = seconds
+        elif token not in special_ids:
+            tokens.append(token)
+    if tokens:
+        segments.append({"start": start, "end": max(window_duration, start), "tokens": tokens})
+    return segments
+
+
+def longest_common_run(a, b):
+    """(i, j, length) of the longest common contiguous token run of a and b (length 0 if none)."""
+    best = (0, 0, 0)
+    previous = [0] * (len(b) + 1)
+    for i in range(1, len(a) + 1):
+        current = [0] * (len(b) + 1)
+        for j in range(1, len(b) + 1):
+            if a[i - 1] == b[j - 1]:
+                current[j] = previous[j - 1] + 1
+                if current[j] > best[2]:
+                    best = (i - current[j], j - current[j], current[j])
+        previous = current
+    return best
+
+
+def _flatten(segments):
+    """Text tokens of segments with the index of the segment of each token."""
+    tokens, owners = [], []
+    for k, segment in enumerate(segments):
+        tokens.extend(segment["tokens"])
+        owners.extend([k] * len(segment["tokens"]))
+    return tokens, owners
+
+
+def merge_windows(windows, min_match_tokens=2):
+    """
+    Merge the segments of consecutive overlapping windows ((start, end,
+    segments) in seconds, segment times relative to the window) into one list
+    with absolute times. In every overlap the tokens of the previous window's
+    segments ending inside it are aligned with those of the next window's
+    segments starting inside it: on a common run of at least min_match_tokens
+    the two are spliced in the middle of the run (the segment around the
+    splice spans both windows). Without a match (silence, hallucination) the
+    overlap is cut in the middle by timestamp: previous segments starting
+    before the cut, next segments starting after it.
+    """
+    merged = []
+    previous_end = None
+    for window_start, window_end, segments in windows:
+        # (segments starting past the window's audio were decoded from padding)
+        segments = [
+            {"start": window_start + s["start"], "end": min(window_start + s["end"], window_end), "tokens": s["tokens"]}
+            for s in segments if window_start + s["start"] < window_end
+        ]
+        if previous_end is None or previous_end <= window_start:
+            merged.extend(segments)
+            previous_end = window_end
+            continue
+
+        tail_from = next((k for k, s in enumerate(merged) if s["end"] > window_start), len(merged))
+        head_to = next((k for k, s in enumerate(segments) if s["start"] >= previous_end), len(segments))
+        tail, head = merged[tail_from:], segments[:head_to]
+        tail_tokens, tail_owners = _flatten(tail)
+        head_tokens, head_owners = _flatten(head)
+        i, j, length = longest_common_run(tail_tokens, head_tokens)
+
+        if length >= min_match_tokens:
+            # splice in the middle of the common run
+            cut_tail, cut_head = i + length // 2, j + length // 2
+            k_tail, k_head = tail_owners[cut_tail], head_owners[cut_head]
+            first_tail = cut_tail - tail_owners.index(k_tail)
+            first_head = cut_head - head_owners.index(k_head)
+            joined = {
+                "start": tail[k_tail]["start"],
+                "end": head[k_head]["end"],
+                "tokens": tail[k_tail]["tokens"][:first_tail] + head[k_head]["tokens"][first_head:],
+            }
+            merged = merged[:tail_from] + tail[:k_tail] + [joined] + segments[k_head + 1:]
+        else:
+            cut = (window_start + previous_end) / 2
+            merged = [s for s in merged if s["start"] < cut]
+            if merged:
+                merged[-1]["end"] = min(merged[-1]["end"], cut)
+            merged += [s for s in segments if s["start"] >= cut]
+        previous_end = window_end
+    return merged
+
+
+class LongFormTranscriber:
+    """
+    Transcription of whole dialogue recordings (no turn timestamps needed).
+
+    The audio is split into overlapping windows of window_seconds (30s, the
+    encoder input) that start every window_seconds - overlap_seconds; all
+    windows of a dialogue go through model.generate with timestamp tokens,
+    batch_size at a time, and the per-window segments are merged with
+    merge_windows. Log-mel features of a batch come from BatchedLogMel.
+    """
+
+    def __init__(self, model, processor, device=None, batch_size=8, window_seconds=30.0, overlap_seconds=5.0,
+                 min_match_tokens=2, language=None, task=None, **generate_kwargs):
+        self.model = model.eval()
+        self.processor = processor
+        self.device = device or model.device
+        self.batch_size = batch_size
+        self.window_seconds = window_seconds
+        self.overlap_seconds = overlap_seconds
+        self.min_match_tokens = min_match_tokens
+        self.sampling_rate = processor.feature_extractor.sampling_rate
+        self.log_mel = BatchedLogMel(processor.feature_extractor)
+        self.generate_kwargs = {"return_timestamps": True, **generate_kwargs}
+        if language:
+            self.generate_kwargs["language"] = language
+        if task:
+            self.generate_kwargs["task"] = task
+
+        tokenizer = processor.tokenizer
+        self.timestamp_begin = model.generation_config.no_timestamps_token_id + 1
+        self.special_ids = set(tokenizer.all_special_ids)
+        self.windows = 0
+        self.generate_seconds = 0.0
+
+    def generate(self, waveforms):
+        """Timestamped token ids of a batch of <= 30s waveforms."""
+        features = np.stack(self.log_mel(waveforms))
+        input_features = torch.from_numpy(features).to(self.device, dtype=self.model.dtype)
+        with torch.inference_mode():
+            return self.model.generate(input_features=input_features, **self.generate_kwargs).cpu().numpy()
+
+    def transcribe(self, audio):
+        """Segments {"start", "end", "text"} (seconds) of a 16kHz mono waveform."""
+        ranges = sliding_windows(len(audio), self.sampling_rate, self.window_seconds, self.overlap_seconds)
+        windows = []
+        for first in range(0, len(ranges), self.batch_size):
+            batch = ranges[first:first + self.batch_size]
+            start = time.perf_counter()
+            gen_ids = self.generate([audio[s:e] for s, e in batch])
+            self.generate_seconds += time.perf_counter() - start
+            self.windows += len(batch)
+            for (s, e), ids in zip(batch, gen_ids):
+                duration = (e - s) / self.sampling_rate
+                segments = parse_timestamped(ids, self.timestamp_begin, self.special_ids, duration)
+                windows.append((s / self.sampling_rate, e / self.sampling_rate, segments))
+
+        tokenizer = self.processor.tokenizer
+        segments = []
+        for segment in merge_windows(windows, self.min_match_tokens):
+            text = tokenizer.decode(segment["tokens"], skip_special_tokens=True).strip()
+            if text:
+                segments.append({"start": round(segment["start"], 2), "end": round(segment["end"], 2), "text": text})
+        return segments
@@ -0,0 +1,281 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ARROW_BATCH_ROWS = 8192  # rows per Arrow record batch
+
+
+def is_jsonl(path):
+    return Path(path).suffix == ".jsonl"
+
+
+def is_arrow(path):
+    return Path(path).suffix == ".arrow"
+
+
+def iter_jsonl(path):
+    """Yield one dict per non-empty line of a line-delimited JSON file (e.g. a NeMo manifest)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_manifest(path, columns=None):
+    """Yield the rows of an HF-style manifest: Arrow, JSONL or a {"data": [...]} document."""
+    if is_arrow(path):
+        yield from ManifestReader(path).rows(columns)
+    elif is_jsonl(path):
+        yield from iter_jsonl(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)["data"]
+
+
+def load_manifest_dataset(path):
+    """
+    Load an HF-style manifest as a datasets.Dataset.
+    Arrow manifests are memory-mapped directly, without any parsing.
+    """
+    from datasets import Dataset, load_dataset
+
+    if is_arrow(path):
+        return Dataset.from_file(str(path))
+    if is_jsonl(path):
+        return load_dataset("json", data_files=str(path))["train"]
+    return load_dataset("json", data_files=str(path), field="data")["train"]
+
+
+def write_arrow(table, path):
+    """Write a pyarrow Table as an Arrow IPC stream (the format datasets memory-maps)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=ARROW_BATCH_ROWS):
+                writer.write_batch(batch)
+
+
+class ManifestReader:
+    """
+    Column access to an HF-style manifest.
+
+    .arrow manifests are memory-mapped: len() only reads the batch headers and
+    projecting a column (e.g. durations only) leaves all other columns on disk.
+    JSONL manifests are streamed row by row (take() seeks to line offsets
+    found in one pass); a {"data": [...]} document is parsed once and kept as
+    a list of rows. Neither builds an Arrow table, so rows may differ in
+    their keys and nested types.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.table = pa.ipc.open_stream(pa.memory_map(str(self.path))).read_all() if is_arrow(self.path) else None
+        self._line_offsets = None  # JSONL: byte offset of every row
+        self._data = None          # JSON document: list of rows
+
+    def _offsets(self):
+        if self._line_offsets is None:
+            offsets, offset = [], 0
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        offsets.append(offset)
+                    offset += len(line)
+            self._line_offsets = offsets
+        return self._line_offsets
+
+    def _document(self):
+        if self._data is None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)["data"]
+        return self._data
+
+    def _iter_rows(self):
+        return iter_jsonl(self.path) if is_jsonl(self.path) else iter(self._document())
+
+    def __len__(self):
+        if self.table is not None:
+            return self.table.num_rows
+        return len(self._offsets()) if is_jsonl(self.path) else len(self._document())
+
+    @property
+    def column_names(self):
+        if self.table is not None:
+            return self.table.column_names
+        names = {}
+        for row in self._iter_rows():
+            names.update(dict.fromkeys(row))
+        return list(names)
+
+    def _column(self, name):
+        # dotted names select struct fields, e.g. "audio.path"
+        field, *sub = name.split(".")
+        column = self.table.column(field)
+        for key in sub:
+            column = pc.struct_field(column, key)
+        return column
+
+    def column(self, name):
+        """Return one column as a numpy array."""
+        if self.table is not None:
+            return self._column(name).to_numpy()
+        values = []
+        for row in self._iter_rows():
+            for key in name.split("."):
+                row = row.get(key) if isinstance(row, dict) else None
+            values.append(row)
+        array = np.array(values)
+        # strings / mixed values stay python objects, as Arrow's to_numpy() gives them
+        return array if array.dtype.kind in "biuf" else np.array(values, dtype=object)
+
+    def rows(self, columns=None):
+        """Yield rows as dicts, optionally projected to a subset of columns."""
+        if self.table is None:
+            for row in self._iter_rows():
+                yield {c: row.get(c) for c in columns} if columns else row
+            return
+        table = self.table.select(columns) if columns else self.table
+        for batch in table.to_batches(max_chunksize=ARROW_BATCH_ROWS):
+            yield from batch.to_pylist()
+
+    def take(self, indices):
+        """Rows at the given positions, as a list of dicts."""
+        if self.table is not None:
+            return self.table.take(indices).to_pylist()
+        if not is_jsonl(self.path):
+            data = self._document()
+            return [data[i] for i in indices]
+        offsets = self._offsets()
+        with open(self.path, "rb") as f:
+            rows = []
+            for i in indices:
+                f.seek(offsets[i])
+                rows.append(json.loads(f.readline()))
+            return rows
+
+
+def _infer_schema(rows):
+    # every key of every row (Table.from_pylist only looks at the first row's keys)
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    return pa.Table.from_pydict({name: [row.get(name) for row in rows] for name in names}).schema
+
+
+class ManifestWriter:
+    """
+    Streams rows to an HF-style manifest without holding them in memory.
+    Paths ending in .jsonl get one row per line, anything else but .arrow is
+    written as a {"data": [...]} document (one row per line inside the list).
+
+    .arrow paths get an Arrow stream. With a schema from the caller, batches
+    are written as they fill up. Without one, rows are spilled to a JSONL
+    file next to the output while the schemas of all batches are unified
+    (new columns, columns that are null in the first rows), and the stream is
+    written from the spill file with the unified schema on close.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = Path(path)
+        self.jsonl = is_jsonl(self.path)
+        self.arrow = is_arrow(self.path)
+        self.count = 0
+        self._f = None
+        self._rows = []
+        self._schema = schema
+        self._infer = schema is None
+        self._spill_path = self.path.with_name(self.path.name + ".rows.jsonl")
+        self._arrow_writer = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.arrow and self._infer:
+            self._f = open(self._spill_path, "w", encoding="utf-8")
+            return self
+        if self.arrow:
+            self._f = pa.OSFile(str(self.path), "wb")
+            self._arrow_writer = pa.ipc.new_stream(self._f, self._schema)
+            return self
+        self._f = open(self.path, "w", encoding="utf-8")
+        if not self.jsonl:
+            self._f.write('{"data": [\n')
+        return self
+
+    def _flush_arrow(self):
+        if not self._rows:
+            return
+        if self._infer:
+            schema = _infer_schema(self._rows)
+            self._schema = schema if self._schema is None else pa.unify_schemas(
+                [self._schema, schema], promote_options="permissive")
+            for row in self._rows:
+                self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            extra = set().union(*self._rows) - set(self._schema.names)
+            if extra:
+                raise ValueError(f"Columns {sorted(extra)} are not in the manifest schema {self._schema.names}")
+            self._arrow_writer.write_table(pa.Table.from_pylist(self._rows, schema=self._schema))
+        self._rows = []
+
+    def write(self, row):
+        if self.arrow:
+            self._rows.append(row)
+            self.count += 1
+            if len(self._rows) >= ARROW_BATCH_ROWS:
+                self._flush_arrow()
+            return
+
+        line = json.dumps(row, ensure_ascii=False)
+        if not self.jsonl and self.count:
+            line = ",\n" + line
+        elif self.jsonl:
+            line += "\n"
+        self._f.write(line)
+        self.count += 1
+
+    def _write_spilled(self):
+        schema = self._schema if self._schema is not None else pa.schema([])
+        with pa.OSFile(str(self.path), "wb") as sink, pa.ipc.new_stream(sink, schema) as writer:
+            batch = []
+            for row in iter_jsonl(self._spill_path):
+                batch.append(row)
+                if len(batch) >= ARROW_BATCH_ROWS:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        self._spill_path.unlink()
+
+    def __exit__(self, *exc):
+        if self.arrow:
+            self._flush_arrow()
+            if self._arrow_writer is not None:
+                self._arrow_writer.close()
+        elif not self.jsonl:
+            self._f.write("\n]}\n")
+        self._f.close()
+        if self.arrow and self._infer:
+            if exc[0] is None:
+                self._write_spilled()
+            else:
+                self._spill_path.unlink(missing_ok=True)
+        return False
+
+
+def convert_manifest(input_path, output_path):
+    """Rewrite a manifest in the format given by the output suffix (.arrow / .jsonl / .json)."""
+    with ManifestWriter(output_path) as writer:
+        for row in iter_manifest(input_path):
+            writer.write(row)
+    return writer.count
+
+
+if __name__ == "__main__":
+    # python -m modules.manifest train_manifest_hf.json train_manifest_hf.arrow
+    n = convert_manifest(sys.argv[1], sys.argv[2])
+    print(f"{n} rows written to {sys.argv[2]}")
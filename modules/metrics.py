@@ -1,9 +1,22 @@
-import evaluate
-from transformers.models.whisper.english_normalizer import BasicTextNormalizer
+from .wer import ErrorRateAccumulator
 
-# Load metric + normalizer once
-wer_metric = evaluate.load("wer")
-normalizer = BasicTextNormalizer()
+# Normalizer built once, on first use (importing it pulls in transformers)
+_normalizer = None
+
+
+def get_normalizer():
+    global _normalizer
+    if _normalizer is None:
+        from transformers.models.whisper.english_normalizer import BasicTextNormalizer
+        _normalizer = BasicTextNormalizer()
+    return _normalizer
+
+
+def __getattr__(name):
+    # `from modules.metrics import normalizer` keeps working
+    if name == "normalizer":
+        return get_normalizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def compute_metrics(pred, processor):
@@ -12,27 +25,49 @@ def compute_metrics(pred, processor):
     label_ids = pred.label_ids
 
     # replace -100 with the pad_token_id so we can decode
+    # (predictions of different lengths are padded with -100 too)
     label_ids[label_ids == -100] = processor.tokenizer.pad_token_id
+    pred_ids[pred_ids == -100] = processor.tokenizer.pad_token_id
 
     # Decode predictions & labels
     pred_str = processor.batch_decode(pred_ids, skip_special_tokens=True)
     label_str = processor.batch_decode(label_ids, skip_special_tokens=True)
 
-    # --- Orthographic WER ---
-    wer_ortho = 100 * wer_metric.compute(predictions=pred_str, references=label_str)
+    return compute_wer(pred_str, label_str)
+
+
+class StreamingWER:
+    """
+    wer_ortho / wer of compute_metrics, accumulated batch by batch
+    (see modules/wer.py); update() only keeps counts, not the texts.
+    """
+
+    def __init__(self, keep_utterances=False):
+        self.ortho = ErrorRateAccumulator(keep_utterances=keep_utterances)
+        self.normalized = ErrorRateAccumulator(keep_utterances=keep_utterances)
+
+    def update(self, pred_str, label_str, ids=None):
+        self.ortho.update(pred_str, label_str, ids)
+
+        # --- Normalized WER ---
+        normalizer = get_normalizer()
+        pred_str_norm = [normalizer(p) for p in pred_str]
+        label_str_norm = [normalizer(l) for l in label_str]
 
-    # --- Normalized WER ---
-    pred_str_norm = [normalizer(p) for p in pred_str]
-    label_str_norm = [normalizer(l) for l in label_str]
+        # filter out empty references (avoid divide-by-zero)
+        keep = [i for i in range(len(label_str_norm)) if len(label_str_norm[i]) > 0]
+        self.normalized.update(
+            [pred_str_norm[i] for i in keep],
+            [label_str_norm[i] for i in keep],
+            None if ids is None else [ids[i] for i in keep],
+        )
 
-    # filter out empty references (avoid divide-by-zero)
-    pred_str_norm = [
-        pred_str_norm[i] for i in range(len(pred_str_norm)) if len(label_str_norm[i]) > 0
-    ]
-    label_str_norm = [
-        label_str_norm[i] for i in range(len(label_str_norm)) if len(label_str_norm[i]) > 0
-    ]
+    def compute(self):
+        return {"wer_ortho": 100 * self.ortho.error_rate, "wer": 100 * self.normalized.error_rate}
 
-    wer = 100 * wer_metric.compute(predictions=pred_str_norm, references=label_str_norm)
 
-    return {"wer_ortho": wer_ortho, "wer": wer}
+def compute_wer(pred_str, label_str):
+    """Orthographic and normalized WER (in %) of decoded predictions vs references."""
+    metric = StreamingWER()
+    metric.update(pred_str, label_str)
+    return metric.compute()
@@ -0,0 +1,146 @@
+import math
+import os
+import time
+from contextlib import contextmanager
+
+import torch
+from transformers import WhisperProcessor, WhisperForConditionalGeneration
+
+# files a saved WhisperProcessor leaves in a directory (Trainer checkpoints
+# saved with tokenizer=feature_extractor only have the first one)
+PROCESSOR_FILES = ("preprocessor_config.json", "tokenizer_config.json")
+
+# log-mel frames the Whisper encoder is trained on: 30s at 100 frames per second
+# (one encoder position per two frames, conv2 has stride 2)
+N_FRAMES = 3000
+FRAMES_PER_SECOND = 100
+
+# (model_name, torch_dtype, device, processor source, language, task) -> (model, processor, device)
+_cache = {}
+
+
+def has_processor(model_dir):
+    """True if model_dir holds a complete saved processor (feature extractor + tokenizer)."""
+    return os.path.isdir(model_dir) and all(
+        os.path.exists(os.path.join(model_dir, f)) for f in PROCESSOR_FILES
+    )
+
+
+def resolve_dtype(torch_dtype):
+    """"float16" / "fp16" / "bfloat16" / "bf16" / "float32" / "auto" / torch.dtype / None -> from_pretrained value."""
+    if torch_dtype is None or torch_dtype == "auto" or isinstance(torch_dtype, torch.dtype):
+        return torch_dtype
+    aliases = {"fp16": "float16", "half": "float16", "bf16": "bfloat16", "fp32": "float32"}
+    return getattr(torch, aliases.get(torch_dtype, torch_dtype))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is in KB on Linux); NaN if unknown."""
+    try:
+        import resource
+    except ImportError:  # Windows: peak working set, if psutil is installed
+        try:
+            import psutil
+        except ImportError:
+            return float("nan")
+        return getattr(psutil.Process().memory_info(), "peak_wset", float("nan")) / 2**20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_processor(model_name, language="english", task="transcribe", base_processor_name="openai/whisper-large-v2"):
+    """Processor saved next to the checkpoint if there is one, else the one of base_processor_name."""
+    processor_name = model_name if has_processor(model_name) else base_processor_name
+    return WhisperProcessor.from_pretrained(processor_name, language=language, task=task)
+
+
+def load_model(model_name: str = "openai/whisper-small",
+               language: str = "english",
+               task: str = "transcribe",
+               base_processor_name: str = "openai/whisper-large-v2",
+               torch_dtype=None,
+               device=None,
+               use_cache: bool = True,
+               ):
+    """
+    Load a Whisper model and its processor.
+
+    The processor saved next to the checkpoint is used if there is one,
+    otherwise the one of base_processor_name. Weights are loaded with
+    low_cpu_mem_usage (safetensors are memory-mapped) directly onto the
+    device, in torch_dtype ("float16" / "bfloat16" / "auto"; None keeps fp32).
+    Repeated calls with the same arguments return the already loaded model.
+    """
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    processor_name = model_name if has_processor(model_name) else base_processor_name
+    key = (model_name, str(torch_dtype), str(device), processor_name, language, task)
+    if use_cache and key in _cache:
+        return _cache[key]
+
+    start = time.perf_counter()
+
+    # Load processor (feature extractor + tokenizer)
+    processor = WhisperProcessor.from_pretrained(
+        processor_name, language=language, task=task
+    )
+
+    # Load model
+    model = WhisperForConditionalGeneration.from_pretrained(
+        model_name,
+        dtype=resolve_dtype(torch_dtype),
+        low_cpu_mem_usage=True,
+        device_map={"": device},
+    )
+
+    print(
+        f"Loaded {model_name} ({model.dtype}, processor from {processor_name}) on {device} "
+        f"in {time.perf_counter() - start:.1f}s, peak RSS {peak_rss_mb():.0f} MB"
+    )
+
+    if use_cache:
+        _cache[key] = (model, processor, device)
+    return model, processor, device
+
+
+def encoder_frames(duration, bucket_seconds=5.0, max_frames=N_FRAMES):
+    """Log-mel frames kept for a clip (or the longest clip of a batch): its duration rounded up to bucket_seconds, at most 30s."""
+    bucket = int(round(bucket_seconds * FRAMES_PER_SECOND))
+    bucket += bucket % 2  # the encoder halves the frames
+    return min(max(math.ceil(duration * FRAMES_PER_SECOND / bucket), 1) * bucket, max_frames)
+
+
+@contextmanager
+def variable_length_encoder(models, num_frames):
+    """
+    Run the Whisper encoder of each model on num_frames log-mel frames
+    instead of 30s: the expected input length (config.max_source_positions)
+    and the positional embeddings are cut to the first num_frames // 2
+    positions for the duration of the block, so trimmed input_features of a
+    short clip skip the padded silence. The weights are shared, not copied.
+    Models fine-tuned on 30s windows have only seen padded inputs, so the
+    transcripts can change (see benchmarks/bench_variable_encoder.py).
+    """
+    positions = num_frames // 2
+    saved = []
+    try:
+        for model in models:
+            encoder = model.get_encoder()
+            embed_positions = encoder.embed_positions
+            saved.append((encoder, embed_positions, encoder.config.max_source_positions))
+            if positions > embed_positions.num_embeddings:
+                raise ValueError(f"{num_frames} frames is longer than the encoder's {embed_positions.num_embeddings} positions")
+            encoder.embed_positions = torch.nn.Embedding(
+                positions, embed_positions.embedding_dim, _weight=embed_positions.weight[:positions], _freeze=True
+            )
+            encoder.config.max_source_positions = positions
+        yield
+    finally:
+        for encoder, embed_positions, max_source_positions in reversed(saved):
+            encoder.embed_positions = embed_positions
+            encoder.config.max_source_positions = max_source_positions
+
+
+    # Quick test
+if __name__ == "__main__":
+    model, processor, device = load_model()
+    print(f"Loaded model on {device}")
+    print("Processor vocab size:", len(processor.tokenizer))
@@ -0,0 +1,357 @@
+import os
+
+import numpy as np
+import torch
+from transformers import GenerationConfig, WhisperConfig, WhisperProcessor
+from transformers.cache_utils import EncoderDecoderCache
+
+from .model_loader import has_processor, load_model
+
+ENCODER_FILE = "encoder.onnx"                    # input_features -> encoder_hidden_states
+DECODER_FILE = "decoder.onnx"                    # prompt -> logits + self / cross k/v of every layer
+DECODER_WITH_PAST_FILE = "decoder_with_past.onnx"  # one token + cached k/v -> logits + new self k/v
+OPSET = 17
+
+
+class _Encoder(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+
+    def forward(self, input_features):
+        return self.encoder(input_features=input_features).last_hidden_state
+
+
+class _Decoder(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.proj_out = model.proj_out
+
+    def forward(self, input_ids, encoder_hidden_states):
+        # additive causal mask built from the traced prompt length (transformers'
+        # own mask creation bakes the example shapes into the graph)
+        positions = torch.arange(input_ids.shape[1], device=input_ids.device)
+        future = (positions[None, :] > positions[:, None]).to(encoder_hidden_states.dtype)
+        attention_mask = (future * torch.finfo(encoder_hidden_states.dtype).min)[None, None]
+        out = self.decoder(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            use_cache=True,
+        )
+        logits = self.proj_out(out.last_hidden_state)
+        # per layer: self key, self value, cross key, cross value
+        return (logits, *[t for layer in out.past_key_values.to_legacy_cache() for t in layer])
+
+
+class _DecoderWithPast(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.proj_out = model.proj_out
+
+    def forward(self, input_ids, encoder_hidden_states, *past):
+        cache = EncoderDecoderCache.from_legacy_cache(
+            [past[i:i + 4] for i in range(0, len(past), 4)]
+        )
+        # one new token attends to every cached position and itself: all-zero additive mask
+        past_key = past[0]
+        attention_mask = torch.zeros_like(past_key[:1, :1, :, :1]).transpose(2, 3)
+        attention_mask = torch.cat([attention_mask, attention_mask[..., :1]], dim=-1)
+        # cross-attention k/v come from the cache; encoder_hidden_states only marks the layers as cross-attention
+        out = self.decoder(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            past_key_values=cache,
+            use_cache=True,
+        )
+        logits = self.proj_out(out.last_hidden_state)
+        return (logits, *[t for layer in out.past_key_values.to_legacy_cache() for t in layer[:2]])
+
+
+def _kv_names(prefix, num_layers, cross=True):
+    kinds = ("key", "value", "cross_key", "cross_value") if cross else ("key", "value")
+    return [f"{prefix}.{i}.{kind}" for i in range(num_layers) for kind in kinds]
+
+
+def export_onnx(model_dir, onnx_dir, language="english", task="transcribe",
+                base_processor_name="openai/whisper-large-v2"):
+    """
+    Export a Whisper checkpoint (e.g. saved by finetuning.py) to ONNX as
+    encoder / decoder / decoder-with-past graphs, plus config, generation
+    config and processor, loadable with OnnxWhisper.from_pretrained(onnx_dir).
+    """
+    model, processor, _ = load_model(
+        model_name=model_dir,
+        language=language,
+        task=task,
+        base_processor_name=base_processor_name,
+        device="cpu",
+        use_cache=False,
+    )
+    model = model.float().eval()
+    model.config._attn_implementation = "eager"  # plain matmul attention traces cleanly
+    config = model.config
+    num_layers = config.decoder_layers
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    config.save_pretrained(onnx_dir)
+    model.generation_config.save_pretrained(onnx_dir)
+    processor.save_pretrained(onnx_dir)
+
+    batch, prompt_len = 2, 4
+    input_features = torch.zeros(batch, config.num_mel_bins, 2 * config.max_source_positions)
+    prompt = torch.full((batch, prompt_len), config.decoder_start_token_id, dtype=torch.long)
+
+    with torch.no_grad():
+        encoder_hidden_states = model.get_encoder()(input_features=input_features).last_hidden_state
+        decoder_outputs = _Decoder(model)(prompt, encoder_hidden_states)
+        past = decoder_outputs[1:]
+
+        torch.onnx.export(
+            _Encoder(model),
+            (input_features,),
+            os.path.join(onnx_dir, ENCODER_FILE),
+            input_names=["input_features"],
+            output_names=["encoder_hidden_states"],
+            dynamic_axes={"input_features": {0: "batch"}, "encoder_hidden_states": {0: "batch"}},
+            opset_version=OPSET,
+            dynamo=False,
+        )
+
+        present = _kv_names("present", num_layers)
+        torch.onnx.export(
+            _Decoder(model),
+            (prompt, encoder_hidden_states),
+            os.path.join(onnx_dir, DECODER_FILE),
+            input_names=["input_ids", "encoder_hidden_states"],
+            output_names=["logits", *present],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "prompt_length"},
+                "encoder_hidden_states": {0: "batch"},
+                "logits": {0: "batch", 1: "prompt_length"},
+                **{name: {0: "batch", 2: "prompt_length" if "cross" not in name else "encoder_length"}
+                   for name in present},
+            },
+            opset_version=OPSET,
+            dynamo=False,
+        )
+
+        past_names = _kv_names("past", num_layers)
+        present_self = _kv_names("present", num_layers, cross=False)
+        torch.onnx.export(
+            _DecoderWithPast(model),
+            (prompt[:, :1], encoder_hidden_states, *past),
+            os.path.join(onnx_dir, DECODER_WITH_PAST_FILE),
+            input_names=["input_ids", "encoder_hidden_states", *past_names],
+            output_names=["logits", *present_self],
+            dynamic_axes={
+                "input_ids": {0: "batch"},
+                "encoder_hidden_states": {0: "batch"},
+                "logits": {0: "batch"},
+                **{name: {0: "batch", 2: "past_length" if "cross" not in name else "encoder_length"}
+                   for name in past_names},
+                **{name: {0: "batch", 2: "past_length + 1"} for name in present_self},
+            },
+            opset_version=OPSET,
+            dynamo=False,
+        )
+
+    print(f"Exported {model_dir} → {onnx_dir}")
+    return onnx_dir
+
+
+class OnnxWhisper:
+    """
+    Whisper generation on ONNX Runtime (CPU provider) with KV-cache reuse:
+    the encoder runs once per batch, the decoder once on the prompt, then
+    decoder-with-past one token at a time on the cached self / cross k/v.
+
+    generate() mirrors WhisperForConditionalGeneration.generate for the
+    evaluation engine: greedy (num_beams=1) or beam search, suppress_tokens /
+    begin_suppress_tokens from the generation config, output = prompt + tokens.
+    A logits_processor (e.g. the per-row caps of
+    generation.row_caps_generate_kwargs) is called on the sequences and scores
+    of every step, as in transformers.
+    """
+
+    def __init__(self, onnx_dir, prompt_ids, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        def session(name):
+            return ort.InferenceSession(os.path.join(onnx_dir, name), options, providers=["CPUExecutionProvider"])
+
+        self.encoder = session(ENCODER_FILE)
+        self.decoder = session(DECODER_FILE)
+        self.decoder_with_past = session(DECODER_WITH_PAST_FILE)
+        self._with_past_inputs = {i.name for i in self.decoder_with_past.get_inputs()}
+
+        self.config = WhisperConfig.from_pretrained(onnx_dir)
+        self.generation_config = GenerationConfig.from_pretrained(onnx_dir)
+        self.prompt_ids = list(prompt_ids)
+        self.num_layers = self.config.decoder_layers
+        self.dtype = torch.float32
+        self.device = torch.device("cpu")
+
+    @classmethod
+    def from_pretrained(cls, onnx_dir, language="english", task="transcribe", num_threads=None):
+        """(model, processor) of an export_onnx directory; the prompt is the processor's prefix tokens."""
+        processor = WhisperProcessor.from_pretrained(onnx_dir, language=language, task=task)
+        return cls(onnx_dir, processor.tokenizer.prefix_tokens, num_threads=num_threads), processor
+
+    def eval(self):
+        return self
+
+    def _suppress(self, logits, step):
+        suppress = list(self.generation_config.suppress_tokens or [])
+        if step == 0:
+            suppress += list(self.generation_config.begin_suppress_tokens or [])
+        suppress = [t for t in suppress if t < logits.shape[-1]]
+        if suppress:
+            logits[:, suppress] = -np.inf
+        return logits
+
+    def _run_with_past(self, tokens, encoder_hidden_states, self_kv, cross_kv):
+        feed = {"input_ids": tokens[:, None].astype(np.int64)}
+        if "encoder_hidden_states" in self._with_past_inputs:
+            feed["encoder_hidden_states"] = encoder_hidden_states
+        for i in range(self.num_layers):
+            feed[f"past.{i}.key"], feed[f"past.{i}.value"] = self_kv[2 * i], self_kv[2 * i + 1]
+            feed[f"past.{i}.cross_key"], feed[f"past.{i}.cross_value"] = cross_kv[2 * i], cross_kv[2 * i + 1]
+        logits, *self_kv = self.decoder_with_past.run(None, feed)
+        return logits[:, -1].astype(np.float32), self_kv
+
+    def _start(self, input_features):
+        encoder_hidden_states = self.encoder.run(None, {"input_features": input_features})[0]
+        prompt = np.tile(np.asarray(self.prompt_ids, dtype=np.int64), (len(input_features), 1))
+        logits, *kv = self.decoder.run(None, {"input_ids": prompt, "encoder_hidden_states": encoder_hidden_states})
+        self_kv = [t for i in range(self.num_layers) for t in kv[4 * i:4 * i + 2]]
+        cross_kv = [t for i in range(self.num_layers) for t in kv[4 * i + 2:4 * i + 4]]
+        return prompt, encoder_hidden_states, logits[:, -1].astype(np.float32), self_kv, cross_kv
+
+    def _max_new_tokens(self, max_new_tokens):
+        limit = self.config.max_target_positions - len(self.prompt_ids)
+        return min(max_new_tokens or self.generation_config.max_length or limit, limit)
+
+    @staticmethod
+    def _process(logits_processor, prompt, tokens, scores):
+        if logits_processor is None:
+            return scores
+        input_ids = torch.from_numpy(np.concatenate([prompt, tokens], axis=1))
+        return logits_processor(input_ids, torch.from_numpy(scores)).numpy()
+
+    def generate(self, input_features, max_new_tokens=None, num_beams=1, length_penalty=1.0,
+                 logits_processor=None, **kwargs):
+        if kwargs:
+            raise TypeError(f"OnnxWhisper.generate does not support {sorted(kwargs)}")
+        input_features = np.asarray(input_features.cpu().float().numpy() if torch.is_tensor(input_features) else input_features,
+                                    dtype=np.float32)
+        max_new_tokens = self._max_new_tokens(max_new_tokens)
+        if num_beams > 1:
+            sequences = self._beam_search(input_features, max_new_tokens, num_beams, length_penalty, logits_processor)
+        else:
+            sequences = self._greedy(input_features, max_new_tokens, logits_processor)
+        return torch.from_numpy(sequences)
+
+    def _greedy(self, input_features, max_new_tokens, logits_processor=None):
+        eos, pad = self.generation_config.eos_token_id, self.config.pad_token_id
+        prompt, encoder_hidden_states, logits, self_kv, cross_kv = self._start(input_features)
+
+        tokens = []
+        finished = np.zeros(len(prompt), dtype=bool)
+        for step in range(max_new_tokens):
+            generated = np.stack(tokens, axis=1) if tokens else np.zeros((len(prompt), 0), dtype=np.int64)
+            logits = self._process(logits_processor, prompt, generated, self._suppress(logits, step))
+            next_tokens = np.argmax(logits, axis=-1)
+            next_tokens = np.where(finished, pad, next_tokens)
+            tokens.append(next_tokens)
+            finished |= next_tokens == eos
+            if finished.all() or step == max_new_tokens - 1:
+                break
+            logits, self_kv = self._run_with_past(next_tokens, encoder_hidden_states, self_kv, cross_kv)
+
+        return np.concatenate([prompt, np.stack(tokens, axis=1)], axis=1)
+
+    def _beam_search(self, input_features, max_new_tokens, num_beams, length_penalty, logits_processor=None):
+        eos, pad = self.generation_config.eos_token_id, self.config.pad_token_id
+        batch = len(input_features)
+        prompt, encoder_hidden_states, logits, self_kv, cross_kv = self._start(input_features)
+
+        # every beam starts from the same prompt; only the first beam is live at step 0
+        expand = np.repeat(np.arange(batch), num_beams)
+        encoder_hidden_states = encoder_hidden_states[expand]
+        self_kv = [t[expand] for t in self_kv]
+        cross_kv = [t[expand] for t in cross_kv]
+        logits = logits[expand]
+        scores = np.tile(np.r_[0.0, np.full(num_beams - 1, -np.inf)], batch)
+        tokens = np.zeros((batch * num_beams, 0), dtype=np.int64)
+        done = [[] for _ in range(batch)]  # (score, tokens) of finished hypotheses
+
+        for step in range(max_new_tokens):
+            logprobs = self._suppress(logits, step)
+            logprobs = logprobs - np.logaddexp.reduce(logprobs, axis=-1, keepdims=True)
+            logprobs = self._process(logits_processor, prompt[expand], tokens, logprobs)
+            candidates = (scores[:, None] + logprobs).reshape(batch, -1)
+            top = np.argsort(-candidates, axis=-1)[:, :2 * num_beams]
+
+            beam_idx, next_tokens, next_scores = [], [], []
+            for b in range(batch):
+                kept = 0
+                for flat in top[b]:
+                    beam, token = divmod(int(flat), logprobs.shape[-1])
+                    row = b * num_beams + beam
+                    score = candidates[b, flat]
+                    if token == eos:
+                        if len(done[b]) < num_beams:
+                            length = tokens.shape[1] + 1
+                            done[b].append((score / length ** length_penalty, np.r_[tokens[row], token]))
+                        continue
+                    beam_idx.append(row)
+                    next_tokens.append(token)
+                    next_scores.append(score)
+                    kept += 1
+                    if kept == num_beams:
+                        break
+
+            beam_idx = np.asarray(beam_idx)
+            tokens = np.concatenate([tokens[beam_idx], np.asarray(next_tokens)[:, None]], axis=1)
+            scores = np.asarray(next_scores)
+            if all(len(d) >= num_beams for d in done) or step == max_new_tokens - 1:
+                break
+            self_kv = [t[beam_idx] for t in self_kv]
+            logits, self_kv = self._run_with_past(tokens[:, -1], encoder_hidden_states, self_kv, cross_kv)
+
+        best = []
+        for b in range(batch):
+            hypotheses = done[b] or [
+                (scores[b * num_beams + k] / tokens.shape[1] ** length_penalty, tokens[b * num_beams + k])
+                for k in range(num_beams)
+            ]
+            best.append(max(hypotheses, key=lambda h: h[0])[1])
+
+        length = max(len(t) for t in best)
+        out = np.full((batch, prompt.shape[1] + length), pad, dtype=np.int64)
+        out[:, :prompt.shape[1]] = prompt
+        for b, t in enumerate(best):
+            out[b, prompt.shape[1]:prompt.shape[1] + len(t)] = t
+        return out
+
+
+def load_onnx_model(model_name, onnx_dir=None, language="english", task="transcribe",
+                    base_processor_name="openai/whisper-large-v2", num_threads=None):
+    """
+    load_model for the ONNX Runtime backend: reuses the export in onnx_dir
+    (default <model_name>-onnx) or exports model_name once. Returns (model, processor, "cpu").
+    """
+    onnx_dir = onnx_dir or f"{str(model_name).rstrip('/')}-onnx"
+    if not (os.path.exists(os.path.join(onnx_dir, DECODER_WITH_PAST_FILE)) and has_processor(onnx_dir)):
+        export_onnx(model_name, onnx_dir, language, task, base_processor_name)
+    model, processor = OnnxWhisper.from_pretrained(onnx_dir, language=language, task=task, num_threads=num_threads)
+    return model, processor, "cpu"
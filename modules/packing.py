@@ -0,0 +1,156 @@
+import json
+import os
+import re
+from pathlib import Path
+
+from .manifest import ManifestWriter, iter_manifest
+
+TURN_ID = re.compile(r"^(?P<dialogue>.+)_turn(?P<turn>\d+)$")
+TIMESTAMP_STEP = 0.02  # Whisper timestamp token resolution in seconds
+
+
+def turn_key(row):
+    """(dialogue id, turn number) of a manifest row, from its utt_id or segment file name."""
+    utt_id = row.get("utt_id") or Path(row["audio"]["path"]).stem
+    match = TURN_ID.match(utt_id)
+    if match is None:
+        return utt_id, 0
+    return match["dialogue"], int(match["turn"])
+
+
+def _segment(row):
+    return {
+        "path": row["audio"]["path"],
+        "start_frame": row.get("start_frame"),
+        "end_frame": row.get("end_frame"),
+    }
+
+
+def pack_turns(rows, max_duration=30.0, tokenizer=None, max_label_tokens=448):
+    """
+    Greedily pack consecutive turns of the same dialogue into windows shorter
+    than max_duration seconds; a gap in the turn numbers (e.g. a turn that was
+    filtered out) starts a new window. Turns of max_duration or more stay on their own
+    (and are filtered later like before).
+
+    Every packed row lists its audio segments, the joined transcript and the
+    start / end time of each turn inside the window. With a tokenizer, windows
+    are also kept under max_label_tokens (incl. timestamp and prefix tokens).
+    """
+    rows = sorted(rows, key=turn_key)
+
+    def num_tokens(text):
+        if tokenizer is None:
+            return 0
+        return len(tokenizer(" " + text, add_special_tokens=False).input_ids) + 2
+
+    prefix_tokens = len(tokenizer.prefix_tokens) + 1 if tokenizer is not None else 0
+
+    packed, window = [], None
+    for row in rows:
+        dialogue, turn = turn_key(row)
+        duration, tokens = row["duration"], num_tokens(row["text"])
+
+        if (window is None
+                or window["dialogue"] != dialogue
+                or turn != window["last_turn"] + 1
+                or window["duration"] + duration >= max_duration
+                or (tokenizer is not None and window["tokens"] + tokens > max_label_tokens)):
+            if window is not None:
+                packed.append(window)
+            window = {
+                "dialogue": dialogue,
+                "first_turn": turn,
+                "last_turn": turn,
+                "segments": [],
+                "texts": [],
+                "turn_times": [],
+                "duration": 0.0,
+                "tokens": prefix_tokens,
+            }
+
+        window["segments"].append(_segment(row))
+        window["texts"].append(row["text"])
+        window["turn_times"].append([window["duration"], window["duration"] + duration])
+        window["duration"] += duration
+        window["tokens"] += tokens
+        window["last_turn"] = turn
+
+    if window is not None:
+        packed.append(window)
+
+    return [
+        {
+            "utt_id": f"{w['dialogue']}_turns{w['first_turn']}-{w['last_turn']}",
+            "segments": w["segments"],
+            "text": " ".join(w["texts"]),
+            "texts": w["texts"],
+            "turn_times": w["turn_times"],
+            "duration": w["duration"],
+        }
+        for w in packed
+    ]
+
+
+def _pack_signature(manifest, max_duration, tokenizer, max_label_tokens):
+    stat = os.stat(manifest)
+    return {
+        "manifest": str(manifest.resolve()),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "max_duration": max_duration,
+        "tokenizer": getattr(tokenizer, "name_or_path", None),
+        "max_label_tokens": max_label_tokens if tokenizer is not None else None,
+    }
+
+
+def pack_manifest(manifest, max_duration=30.0, tokenizer=None, max_label_tokens=448):
+    """
+    Write the packed version of a manifest next to it (<name>_packed.jsonl)
+    and return its path. The source manifest and packing settings are
+    recorded in <name>_packed.meta.json; while they match, the packed file is
+    left untouched, so the caches keyed on it (feature store, datasets) stay valid.
+    """
+    manifest = Path(manifest)
+    out_path = manifest.with_name(f"{manifest.stem}_packed.jsonl")
+    meta_path = manifest.with_name(f"{manifest.stem}_packed.meta.json")
+    signature = _pack_signature(manifest, max_duration, tokenizer, max_label_tokens)
+
+    if out_path.exists() and meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == signature:
+                return out_path
+
+    packed = pack_turns(iter_manifest(manifest), max_duration, tokenizer, max_label_tokens)
+    tmp_path = out_path.with_name(out_path.name + ".tmp.jsonl")
+    with ManifestWriter(tmp_path) as writer:
+        for row in packed:
+            writer.write(row)
+    os.replace(tmp_path, out_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(signature, f, indent=2)
+
+    print(f"Packed {manifest.name}: {writer.count} windows → {out_path}")
+    return out_path
+
+
+def timestamp_token_id(tokenizer, seconds):
+    """Whisper timestamp tokens directly follow <|notimestamps|>, one per 20 ms."""
+    timestamp_begin = tokenizer.convert_tokens_to_ids("<|notimestamps|>") + 1
+    return timestamp_begin + int(round(seconds / TIMESTAMP_STEP))
+
+
+def packed_labels(tokenizer, texts, turn_times):
+    """
+    Label ids of a packed window with Whisper timestamp tokens:
+    <|sot|><|lang|><|task|> <|t0|> text 1<|t1|><|t1|> text 2<|t2|> ... <|eot|>
+    (the same prefix as the tokenizer, minus <|notimestamps|>).
+    """
+    no_timestamps = tokenizer.convert_tokens_to_ids("<|notimestamps|>")
+    labels = [t for t in tokenizer.prefix_tokens if t != no_timestamps]
+    for text, (start, end) in zip(texts, turn_times):
+        labels.append(timestamp_token_id(tokenizer, start))
+        labels.extend(tokenizer(" " + text.strip(), add_special_tokens=False).input_ids)
+        labels.append(timestamp_token_id(tokenizer, end))
+    labels.append(tokenizer.eos_token_id)
+    return labels
@@ -0,0 +1,59 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+
+def default_num_workers():
+    """Leave one core free for the parent process (manifest writing, tqdm)."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def _limit_threads():
+    # each worker already owns a whole file -> avoid oversubscribing cores
+    # with intra-op threads from torch / BLAS
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _apply_chunk(fn, chunk):
+    return [fn(item) for item in chunk]
+
+
+def chunked(items, chunksize):
+    """Split an iterable into lists of chunksize items (the last one may be shorter)."""
+    items = iter(items)
+    while chunk := list(islice(items, chunksize)):
+        yield chunk
+
+
+def ordered_imap(fn, items, num_workers=None, max_pending=None, chunksize=1):
+    """
+    Apply fn to every item of an iterable in a process pool and yield the
+    results in input order, as soon as they are ready.
+
+    Items are sent to the workers in chunks of chunksize and at most
+    max_pending chunks are in flight, so the input iterable is consumed
+    lazily and memory stays flat on arbitrarily large inputs.
+    With num_workers <= 1 everything runs in the current process.
+    """
+    num_workers = default_num_workers() if num_workers is None else num_workers
+
+    if num_workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    max_pending = max_pending or num_workers * 4
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_limit_threads) as pool:
+        pending = deque()
+        for chunk in chunked(items, chunksize):
+            pending.append(pool.submit(_apply_chunk, fn, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,64 @@
+import os
+
+import torch
+from transformers import GenerationConfig, WhisperConfig, WhisperForConditionalGeneration, WhisperProcessor
+
+from .model_loader import has_processor, load_model
+
+QUANTIZED_WEIGHTS = "model_int8.pt"  # state dict of the dynamically quantized model
+
+
+def quantize_dynamic_int8(model):
+    """
+    Dynamic int8 quantization of all nn.Linear layers (weights int8, activations
+    quantized on the fly) for CPU inference. The model must be fp32 on CPU.
+    """
+    model = model.to("cpu", dtype=torch.float32).eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(model, processor, quantized_dir):
+    """Config, generation config, processor and int8 state dict, reloadable with load_quantized."""
+    os.makedirs(quantized_dir, exist_ok=True)
+    model.config.save_pretrained(quantized_dir)
+    model.generation_config.save_pretrained(quantized_dir)
+    processor.save_pretrained(quantized_dir)
+    torch.save(model.state_dict(), os.path.join(quantized_dir, QUANTIZED_WEIGHTS))
+
+
+def load_quantized(quantized_dir):
+    """Rebuild the quantized module structure from the config and load the int8 weights."""
+    config = WhisperConfig.from_pretrained(quantized_dir)
+    model = quantize_dynamic_int8(WhisperForConditionalGeneration(config))
+    state_dict = torch.load(os.path.join(quantized_dir, QUANTIZED_WEIGHTS), map_location="cpu")
+    model.load_state_dict(state_dict)
+    model.generation_config = GenerationConfig.from_pretrained(quantized_dir)
+    return model
+
+
+def load_quantized_model(model_name, quantized_dir=None, language="english", task="transcribe",
+                         base_processor_name="openai/whisper-large-v2"):
+    """
+    load_model for the dynamic int8 CPU mode: reuses the quantized checkpoint in
+    quantized_dir (default <model_name>-int8) or converts model_name once and saves it there.
+    Returns (model, processor, "cpu").
+    """
+    quantized_dir = quantized_dir or f"{str(model_name).rstrip('/')}-int8"
+    if os.path.exists(os.path.join(quantized_dir, QUANTIZED_WEIGHTS)) and has_processor(quantized_dir):
+        processor = WhisperProcessor.from_pretrained(quantized_dir, language=language, task=task)
+        model = load_quantized(quantized_dir)
+        print(f"Loaded int8 model from {quantized_dir}")
+        return model, processor, "cpu"
+
+    model, processor, _ = load_model(
+        model_name=model_name,
+        language=language,
+        task=task,
+        base_processor_name=base_processor_name,
+        device="cpu",
+        use_cache=False,
+    )
+    model = quantize_dynamic_int8(model)
+    save_quantized(model, processor, quantized_dir)
+    print(f"Saved int8 model → {quantized_dir}")
+    return model, processor, "cpu"
@@ -0,0 +1,158 @@
+import numpy as np
+import torch
+
+
+class DurationBucketBatchSampler(torch.utils.data.Sampler):
+    """
+    Batches of clips with similar duration and transcript length.
+
+    Either a fixed batch_size, or a budget: max_tokens bounds
+    batch size * longest label and max_audio_seconds bounds
+    batch size * longest clip, so short turns get large batches and long
+    turns small ones (batch_size then only caps the batch size).
+
+    With shuffle=True the indices are shuffled every epoch, sorted within
+    windows of sort_window clips and the resulting batches are shuffled;
+    with shuffle=False all clips are sorted longest first (deterministic,
+    for evaluation). In budget mode the number of batches depends on the
+    shuffle, so len() differs between epochs; total_batches() gives the
+    count over several epochs.
+    """
+
+    def __init__(self, durations, label_lengths=None, batch_size=None,
+                 max_tokens=None, max_audio_seconds=None, shuffle=True,
+                 sort_window=None, drop_last=False, seed=42):
+        if batch_size is None and max_tokens is None and max_audio_seconds is None:
+            raise ValueError("Set batch_size, max_tokens or max_audio_seconds")
+        if max_tokens is not None and label_lengths is None:
+            raise ValueError("max_tokens needs label_lengths")
+
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.label_lengths = None if label_lengths is None else np.asarray(label_lengths, dtype=np.int64)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.max_audio_seconds = max_audio_seconds
+        self.shuffle = shuffle
+        self.sort_window = sort_window or 100 * (batch_size or 32)
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self._cache = (None, None)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _sort_key(self, indices):
+        # sort by duration, then by label length
+        if self.label_lengths is None:
+            return indices[np.argsort(-self.durations[indices], kind="stable")]
+        order = np.lexsort((-self.label_lengths[indices], -self.durations[indices]))
+        return indices[order]
+
+    def _fits(self, size, max_duration, max_label):
+        if self.batch_size is not None and size > self.batch_size:
+            return False
+        if self.max_audio_seconds is not None and size * max_duration > self.max_audio_seconds:
+            return False
+        if self.max_tokens is not None and size * max_label > self.max_tokens:
+            return False
+        return True
+
+    def _batches(self, sorted_indices):
+        batches, batch = [], []
+        max_duration, max_label = 0.0, 0
+        for i in sorted_indices:
+            duration = max(max_duration, self.durations[i])
+            label = max(max_label, self.label_lengths[i]) if self.label_lengths is not None else 0
+            # a single clip over budget still gets its own batch
+            if batch and not self._fits(len(batch) + 1, duration, label):
+                batches.append(batch)
+                batch = []
+                duration = self.durations[i]
+                label = self.label_lengths[i] if self.label_lengths is not None else 0
+            batch.append(int(i))
+            max_duration, max_label = duration, label
+        if batch and not (self.drop_last and self.batch_size and len(batch) < self.batch_size):
+            batches.append(batch)
+        return batches
+
+    def batches(self, epoch=None):
+        """All batches of one epoch."""
+        epoch = self.epoch if epoch is None else epoch
+        key = epoch if self.shuffle else 0
+        if self._cache[0] == key:
+            return self._cache[1]
+
+        indices = np.arange(len(self.durations))
+        if not self.shuffle:
+            batches = self._batches(self._sort_key(indices))
+        else:
+            rng = np.random.default_rng(self.seed + epoch)
+            indices = rng.permutation(indices)
+            batches = []
+            for start in range(0, len(indices), self.sort_window):
+                batches.extend(self._batches(self._sort_key(indices[start:start + self.sort_window])))
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        self._cache = (key, batches)
+        return batches
+
+    def __iter__(self):
+        batches = self.batches()
+        # the trainer does not always call set_epoch -> reshuffle on the next pass anyway
+        self.epoch += 1
+        yield from batches
+
+    def __len__(self):
+        return len(self.batches())
+
+    def total_batches(self, num_epochs):
+        """Number of batches in epochs 0 .. num_epochs - 1 (e.g. to derive max_steps)."""
+        if not self.shuffle:
+            return num_epochs * len(self)
+        return sum(len(self.batches(epoch)) for epoch in range(num_epochs))
+
+
+def dataset_lengths(dataset):
+    """
+    (durations in seconds, label lengths in tokens) of a prepared dataset:
+    an HF dataset from prepare_dataset, or any dataset with a lengths() method.
+    """
+    if hasattr(dataset, "lengths"):
+        return dataset.lengths()
+
+    import pyarrow.compute as pc
+
+    table = dataset.select_columns(["input_length", "labels"]).with_format("arrow")[:]
+    durations = table.column("input_length").to_numpy()
+    label_lengths = pc.list_value_length(table.column("labels")).to_numpy()
+    return durations, label_lengths
+
+
+def build_batch_sampler(dataset, batching_cfg, batch_size, shuffle):
+    """Batch sampler for a prepared dataset from the `batching:` config section (None if disabled)."""
+    if not batching_cfg or not batching_cfg.get("enabled", False):
+        return None
+    if isinstance(dataset, torch.utils.data.IterableDataset):
+        raise ValueError("Duration-bucketed batching needs a map-style dataset (data.preprocessing: map or store)")
+
+    max_tokens = batching_cfg.get("max_tokens")
+    max_audio_seconds = batching_cfg.get("max_audio_seconds")
+    if max_tokens or max_audio_seconds:
+        # budget mode: batch size follows the budget, capped. Whisper pads every clip to 30s,
+        # so memory grows with the number of clips, not with their seconds or tokens
+        batch_size = batching_cfg.get("max_batch_size")
+        if not batch_size:
+            raise ValueError("batching.max_tokens / max_audio_seconds need batching.max_batch_size")
+
+    durations, label_lengths = dataset_lengths(dataset)
+    return DurationBucketBatchSampler(
+        durations,
+        label_lengths,
+        batch_size=batch_size,
+        max_tokens=max_tokens,
+        max_audio_seconds=max_audio_seconds,
+        shuffle=shuffle,
+        sort_window=batching_cfg.get("sort_window"),
+        seed=batching_cfg.get("seed", 42),
+    )
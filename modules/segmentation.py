@@ -0,0 +1,206 @@
+import json
+import os
+from pathlib import Path
+
+import soundfile as sf
+import torchaudio
+from tqdm import tqdm
+
+from .audio import get_resampler
+from .parallel import ordered_imap
+
+DONE_DIR_NAME = ".done"  # per-dialogue completion markers, inside the segments dir
+
+
+def turn_spans(record):
+    """Return (turn_index, begin_ms, end_ms, text) for every turn with word timestamps."""
+    spans = []
+    for i, turn in enumerate(record.get("log", [])):
+        if "words" not in turn or len(turn["words"]) == 0:
+            continue
+        # start and end time from the first and last word
+        spans.append((
+            i,
+            turn["words"][0]["BeginTime"],
+            turn["words"][-1]["EndTime"],
+            turn["text"].strip(),
+        ))
+    return spans
+
+
+def _marker_path(segments_dir, utt_id):
+    return Path(segments_dir) / DONE_DIR_NAME / f"{utt_id}.json"
+
+
+def _load_completed(job):
+    """
+    Return the manifest entries of a previous run if every segment of this
+    dialogue is still on disk with the recorded size and duration, else None.
+    """
+    marker = _marker_path(job["segments_dir"], job["utt_id"])
+    if not marker.exists():
+        return None
+
+    with open(marker, "r", encoding="utf-8") as f:
+        done = json.load(f)
+
+    # timestamps changed since the last run -> segment again
+    if done.get("spans") != [list(s) for s in job["spans"]]:
+        return None
+
+    for seg in done["segments"]:
+        path = seg["entry"]["audio_filepath"]
+        if not os.path.exists(path) or os.path.getsize(path) != seg["size"]:
+            return None
+        info = sf.info(path)
+        if info.frames != seg["frames"] or info.samplerate != seg["sampling_rate"]:
+            return None
+
+    return [seg["entry"] for seg in done["segments"]]
+
+
+def segment_dialogue(job):
+    """
+    Worker: segment one dialogue WAV into per-turn WAVs.
+    Returns (manifest entries, reused) where reused is True when the
+    segments of a previous run were still valid.
+    """
+    entries = _load_completed(job)
+    if entries is not None:
+        return entries, True
+
+    segments_dir = Path(job["segments_dir"])
+    waveform, sr = torchaudio.load(job["audio_path"])
+
+    target_sr = job.get("target_sr")
+    if target_sr and sr != target_sr:
+        waveform = get_resampler(sr, target_sr)(waveform)
+        sr = target_sr
+
+    entries, segments = [], []
+    for i, begin_ms, end_ms, text in job["spans"]:
+        # convert times to audio sample indices
+        start_frame = int(begin_ms / 1000.0 * sr)
+        end_frame = int(end_ms / 1000.0 * sr)
+
+        chunk = waveform[:, start_frame:end_frame] # extract slice from waveform
+        duration = (end_frame - start_frame) / sr # each segment duration
+
+        if chunk.shape[1] == 0: # skip empty segments
+            continue
+
+        # If stereo → downmix to mono
+        if chunk.shape[0] > 1:
+            chunk = chunk.mean(dim=0, keepdim=True)
+
+        # save chunk as a new wav -> save using soudfile
+        out_path = segments_dir / f"{job['utt_id']}_turn{i+1}.wav"
+        sf.write(out_path, chunk.squeeze().numpy().astype("float32"), sr)
+
+        entry = {
+            "utt_id": out_path.stem,
+            "audio_filepath": str(out_path.resolve()),
+            "duration": duration,
+            "text": text
+        }
+        entries.append(entry)
+        segments.append({
+            "entry": entry,
+            "size": os.path.getsize(out_path),
+            "frames": chunk.shape[1],
+            "sampling_rate": sr,
+        })
+
+    # marker is written last -> a crash mid-dialogue leaves no marker behind
+    marker = _marker_path(segments_dir, job["utt_id"])
+    tmp = marker.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"spans": job["spans"], "segments": segments}, f, ensure_ascii=False)
+    os.replace(tmp, marker)
+
+    return entries, False
+
+
+def virtual_segment_dialogue(job):
+    """
+    Worker: build virtual segment entries for one dialogue.
+    Nothing is decoded or written, only the WAV header is read; each entry
+    points to (source wav, start_frame, end_frame) in the source sample rate.
+    """
+    info = sf.info(job["audio_path"])
+    sr = info.samplerate
+    audio_path = str(Path(job["audio_path"]).resolve())
+
+    entries = []
+    for i, begin_ms, end_ms, text in job["spans"]:
+        start_frame = int(begin_ms / 1000.0 * sr)
+        end_frame = min(int(end_ms / 1000.0 * sr), info.frames)
+
+        if end_frame <= start_frame: # skip empty segments
+            continue
+
+        entries.append({
+            "utt_id": f"{job['utt_id']}_turn{i+1}",
+            "audio_filepath": audio_path,
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "sampling_rate": sr,
+            "duration": (end_frame - start_frame) / sr,
+            "text": text
+        })
+
+    return entries, False
+
+
+def run_segmentation(text_json, audio_dir, segments_dir, output_manifest,
+                     target_sr=None, num_workers=None, virtual=False):
+    """
+    Segment every dialogue of a SpokenWOZ data.json into turn-level clips and
+    write a NeMo manifest.
+
+    Each worker process owns one dialogue; the manifest is written by the
+    parent in data.json order while results come in. Dialogues whose segments
+    from a previous run are still valid are not decoded again.
+    If target_sr is set, dialogues are resampled before segmentation.
+
+    With virtual=True no audio is written: entries reference the dialogue WAV
+    with sample offsets and are sliced (and resampled) at load time.
+    """
+    audio_dir, segments_dir = Path(audio_dir), Path(segments_dir)
+    output_manifest = Path(output_manifest)
+
+    with open(text_json, "r", encoding="utf-8") as f:
+        text_data = json.load(f)
+
+    if not virtual:
+        (segments_dir / DONE_DIR_NAME).mkdir(parents=True, exist_ok=True)
+    output_manifest.parent.mkdir(parents=True, exist_ok=True)
+
+    def jobs():
+        for utt_id, record in text_data.items():
+            audio_path = audio_dir / f"{utt_id}.wav"
+            if not audio_path.exists():
+                continue
+            yield {
+                "utt_id": utt_id,
+                "audio_path": str(audio_path),
+                "spans": turn_spans(record),
+                "segments_dir": str(segments_dir),
+                "target_sr": target_sr,
+            }
+
+    n_entries, n_reused = 0, 0
+    tmp_manifest = output_manifest.with_suffix(output_manifest.suffix + ".tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        worker = virtual_segment_dialogue if virtual else segment_dialogue
+        results = ordered_imap(worker, jobs(), num_workers=num_workers)
+        for entries, reused in tqdm(results, total=len(text_data)):
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            n_entries += len(entries)
+            n_reused += reused
+    os.replace(tmp_manifest, output_manifest)
+
+    print(f"{n_entries} entries written to {output_manifest}")
+    print(f"Dialogues reused from previous run: {n_reused}")
+    return n_entries
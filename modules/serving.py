@@ -0,0 +1,237 @@
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from .audio import get_resampler, read_segment
+from .log_mel import BatchedLogMel
+
+
+class MicroBatcher:
+    """
+    Request queue of a single model worker. A batch starts with the oldest
+    waiting request and takes every request that arrives until it holds
+    max_batch_size of them or max_latency_ms have passed since the first one
+    was taken; run_batch(items) then runs on a dedicated thread (one batch at
+    a time) and returns one result per item.
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_latency_ms=10.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        self.batch_sizes = []
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # requests that were already waiting join without delay
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.batch_sizes.append(len(batch))
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch, [item for item, _ in batch])
+            except Exception as e:  # fail the batch's requests, keep serving
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class TranscriptionService:
+    """
+    Transcription of single clips for online use: features are computed on
+    a thread pool (feature_workers), clips are micro-batched by a
+    MicroBatcher and decoded by engine.generate (inference.BatchedInference,
+    so length caps, pruned decoding and the variable-length encoder apply).
+    Results are rows in the shape of t5_eval_input_from_asr.json:
+    {"text", "dialog_act"}.
+
+    audio_filepath requests may only read files under audio_root (relative
+    paths are resolved against it); without an audio_root they are refused.
+    """
+
+    def __init__(self, engine, max_batch_size=16, max_latency_ms=10.0, feature_workers=4, audio_root=None):
+        self.engine = engine
+        self.audio_root = os.path.realpath(audio_root) if audio_root else None
+        self.processor = engine.processor
+        self.sampling_rate = self.processor.feature_extractor.sampling_rate
+        self.log_mel = BatchedLogMel(self.processor.feature_extractor)
+        self.feature_executor = ThreadPoolExecutor(max_workers=feature_workers, thread_name_prefix="features")
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size=max_batch_size, max_latency_ms=max_latency_ms)
+
+    def start(self):
+        self.batcher.start()
+
+    async def stop(self):
+        await self.batcher.stop()
+        self.feature_executor.shutdown(wait=True)
+
+    def _audio_path(self, path):
+        if self.audio_root is None:
+            raise PermissionError("audio_filepath requests are disabled (no serve.audio_root)")
+        resolved = os.path.realpath(os.path.join(self.audio_root, path))
+        if os.path.commonpath([resolved, self.audio_root]) != self.audio_root:
+            raise PermissionError(f"{path} is outside the audio root")
+        return resolved
+
+    def _features(self, request):
+        if "audio_bytes" in request:
+            audio, sr = sf.read(io.BytesIO(request["audio_bytes"]), dtype="float32", always_2d=True)
+            audio = audio.mean(axis=1)
+            if sr != self.sampling_rate:
+                waveform = torch.from_numpy(np.ascontiguousarray(audio)).unsqueeze(0)
+                audio = get_resampler(sr, self.sampling_rate)(waveform).squeeze(0).numpy()
+        else:
+            audio, _ = read_segment(self._audio_path(request["audio_filepath"]), request.get("start_frame"),
+                                    request.get("end_frame"), target_sr=self.sampling_rate)
+        return self.log_mel([audio])[0], len(audio) / self.sampling_rate
+
+    def _run_batch(self, items):
+        input_features = torch.from_numpy(np.stack([features for features, _ in items]))
+        gen_ids = self.engine.generate(input_features, np.array([duration for _, duration in items]))
+        texts = self.processor.tokenizer.batch_decode(gen_ids.cpu().numpy(), skip_special_tokens=True)
+        return [text.strip() for text in texts]
+
+    async def transcribe(self, request):
+        """request: {"audio_bytes"} (any soundfile format) or {"audio_filepath"[, "start_frame", "end_frame"]}, optional "dialog_act"."""
+        loop = asyncio.get_running_loop()
+        item = await loop.run_in_executor(self.feature_executor, self._features, request)
+        text = await self.batcher.submit(item)
+        return {"text": text, "dialog_act": request.get("dialog_act")}
+
+    def stats(self):
+        sizes = self.batcher.batch_sizes
+        return {
+            "batches": len(sizes),
+            "requests": int(sum(sizes)),
+            "mean_batch_size": float(np.mean(sizes)) if sizes else 0.0,
+            "queued": self.batcher.queue.qsize(),
+        }
+
+
+async def _read_request(reader, max_body_bytes=None):
+    """
+    (method, path, headers, body) of one HTTP/1.1 request, None on EOF.
+    body is None when Content-Length is over max_body_bytes (not read).
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError(f"Content-Length {length}")
+    if max_body_bytes is not None and length > max_body_bytes:
+        return method, path, headers, None
+    body = await reader.readexactly(length)
+    return method, path, headers, body
+
+
+def _response(status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    reason = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large",
+              500: "Internal Server Error"}[status]
+    head = f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode("latin-1") + body
+
+
+async def serve(service, host="127.0.0.1", port=8000, max_body_bytes=25 * 2**20):
+    """
+    Minimal HTTP/1.1 server (stdlib asyncio, keep-alive) around a TranscriptionService:
+    POST /transcribe with audio bytes (Content-Type audio/*), or JSON
+    {"audio_filepath", "dialog_act"}; a JSON list transcribes several clips.
+    GET /health and GET /stats. Returns the asyncio server (already listening).
+    Requests with a body over max_body_bytes get 413 without the body being
+    read, and the connection is closed.
+    """
+
+    async def transcribe(headers, body):
+        if headers.get("content-type", "").startswith("audio/"):
+            return await service.transcribe({"audio_bytes": body})
+        request = json.loads(body)
+        if isinstance(request, list):
+            return list(await asyncio.gather(*(service.transcribe(r) for r in request)))
+        return await service.transcribe(request)
+
+    async def handle(reader, writer):
+        try:
+            while (request := await _read_request(reader, max_body_bytes)) is not None:
+                method, path, headers, body = request
+                if body is None:
+                    writer.write(_response(413, {"error": f"request body over {max_body_bytes} bytes"}))
+                    await writer.drain()
+                    break
+                try:
+                    if method == "POST" and path == "/transcribe":
+                        response = _response(200, await transcribe(headers, body))
+                    elif method == "GET" and path == "/health":
+                        response = _response(200, {"status": "ok"})
+                    elif method == "GET" and path == "/stats":
+                        response = _response(200, service.stats())
+                    else:
+                        response = _response(404, {"error": f"{method} {path}"})
+                except PermissionError as e:  # audio_filepath outside the audio root
+                    response = _response(403, {"error": str(e)})
+                except (ValueError, KeyError, OSError, sf.LibsndfileError) as e:  # bad request / audio
+                    response = _response(400, {"error": str(e)})
+                except Exception as e:
+                    response = _response(500, {"error": str(e)})
+                writer.write(response)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass  # client went away or sent a malformed request line
+        finally:
+            writer.close()
+
+    service.start()
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,108 @@
+import numpy as np
+import torch
+
+from .audio import load_example_audio
+from .log_mel import num_content_frames
+from .manifest import ManifestReader
+from .packing import packed_labels
+
+
+class StreamingSpeechDataset(torch.utils.data.IterableDataset):
+    """
+    Decodes, resamples and computes log-mel features on the fly inside the
+    DataLoader workers, so training starts without a preprocessing pass or an
+    on-disk feature cache.
+
+    The duration filter runs on the manifest "duration" column. Each epoch,
+    blocks of block_size consecutive manifest rows (neighbouring turns of a
+    dialogue, cheap to read together) are shuffled and dealt to the workers,
+    which mix them further through a shuffle buffer of manifest rows.
+    Features are yielded unpadded and padded to 30s in the data collator.
+    """
+
+    def __init__(self, manifest, processor, max_input_length=30.0,
+                 shuffle=True, shuffle_buffer=1000, block_size=64, seed=42, timestamps=False):
+        self.manifest = str(manifest)
+        self.processor = processor
+        self.timestamps = timestamps
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.block_size = block_size
+        self.seed = seed
+        self.epoch = 0
+
+        durations = ManifestReader(self.manifest).column("duration")
+        self.rows = np.flatnonzero(durations < max_input_length)
+        self._reader = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __getstate__(self):
+        # every worker memory-maps / parses the manifest itself
+        state = self.__dict__.copy()
+        state["_reader"] = None
+        return state
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = ManifestReader(self.manifest)
+        return self._reader
+
+    def _worker_rows(self):
+        """Manifest rows of this worker for the current epoch."""
+        blocks = [
+            self.rows[i:i + self.block_size] for i in range(0, len(self.rows), self.block_size)
+        ]
+        if self.shuffle:
+            order = np.random.default_rng(self.seed + self.epoch).permutation(len(blocks))
+            blocks = [blocks[i] for i in order]
+
+        worker = torch.utils.data.get_worker_info()
+        if worker is not None:
+            blocks = blocks[worker.id::worker.num_workers]
+
+        for block in blocks:
+            yield from self.reader.take(block)
+
+    def _shuffled(self, rows):
+        if not self.shuffle:
+            yield from rows
+            return
+
+        worker = torch.utils.data.get_worker_info()
+        worker_id = worker.id if worker is not None else 0
+        rng = np.random.default_rng((self.seed, self.epoch, worker_id))
+
+        buffer = []
+        for row in rows:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(row)
+                continue
+            i = rng.integers(len(buffer))
+            yield buffer[i]
+            buffer[i] = row
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _prepare(self, row):
+        feature_extractor = self.processor.feature_extractor
+        array, sampling_rate = load_example_audio(row, feature_extractor.sampling_rate)
+        processed = self.processor(audio=array, sampling_rate=sampling_rate, text=row["text"])
+        n = num_content_frames(len(array), feature_extractor)
+        labels = processed["labels"]
+        if self.timestamps:
+            labels = packed_labels(self.processor.tokenizer, row["texts"], row["turn_times"])
+        return {
+            "input_features": processed["input_features"][0][:, :n],
+            "labels": labels,
+            "input_length": len(array) / sampling_rate,
+        }
+
+    def __iter__(self):
+        for row in self._shuffled(self._worker_rows()):
+            yield self._prepare(row)
@@ -0,0 +1,100 @@
+import time
+
+import torch
+from transformers import TrainerCallback
+
+from .model_loader import peak_rss_mb
+
+
+class ThroughputCallback(TrainerCallback):
+    """
+    Training throughput, logged with the loss (TensorBoard: train/throughput/*)
+    at every logging step, averaged over the steps since the previous log:
+
+    - step time split into data wait (fetching the batches of a step, timed
+      by BucketedSeq2SeqTrainer.get_batch_samples) and compute
+      (on_step_begin -> on_step_end: forward, backward, optimizer step)
+    - samples/sec and audio seconds/sec (needs input_length in the batch,
+      see DataCollatorSpeechSeq2SeqWithPadding.return_input_length)
+    - padding efficiency: real / padded log-mel frames and label tokens
+    - peak GPU memory since the previous log and peak RSS
+
+    Counters stay on the device until a log, so nothing is synchronized per
+    step unless synchronize=True (exact CUDA compute time, but the CPU can no
+    longer prepare the next batch while the GPU finishes the step).
+    """
+
+    def __init__(self, frames_per_second=100, synchronize=False):
+        self.frames_per_second = frames_per_second  # Whisper log-mel: 16kHz / hop 160
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self._reset()
+        self._step_start = None
+
+    def _reset(self):
+        self.steps = 0
+        self.data_wait = 0.0
+        self.compute = 0.0
+        self.samples = 0
+        self.padded_frames = 0
+        self.padded_tokens = 0
+        self.audio_seconds = 0.0
+        self.real_tokens = 0
+        self.has_durations = False
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._reset()
+
+    def record_batches(self, batches, seconds):
+        """Called with the batches of one optimizer step and the time spent fetching them."""
+        self.data_wait += seconds
+        for batch in batches:
+            labels = batch["labels"]
+            if "input_features" in batch:
+                samples, frames = batch["input_features"].shape[0], batch["input_features"].shape[-1]
+            else:  # cached encoder outputs: one encoder position per 2 log-mel frames
+                samples, frames = batch["encoder_hidden_states"].shape[0], 2 * batch["encoder_hidden_states"].shape[1]
+            self.samples += samples
+            self.padded_frames += samples * frames
+            self.padded_tokens += labels.numel()
+            self.real_tokens = self.real_tokens + (labels != -100).sum()
+            if "input_length" in batch:
+                self.has_durations = True
+                self.audio_seconds = self.audio_seconds + batch["input_length"].sum()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self._step_start = time.perf_counter()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self._step_start is None:
+            return
+        if self.synchronize:
+            torch.cuda.synchronize()
+        self.compute += time.perf_counter() - self._step_start
+        self.steps += 1
+        self._step_start = None
+
+    def metrics(self):
+        """Metrics since the previous call (empty if no step ran)."""
+        if self.steps == 0:
+            return {}
+        elapsed = self.data_wait + self.compute
+        metrics = {
+            "throughput/step_time_s": elapsed / self.steps,
+            "throughput/data_wait_s": self.data_wait / self.steps,
+            "throughput/compute_s": self.compute / self.steps,
+            "throughput/data_wait_fraction": self.data_wait / elapsed,
+            "throughput/samples_per_sec": self.samples / elapsed,
+            "throughput/token_efficiency": float(self.real_tokens) / max(self.padded_tokens, 1),
+            "throughput/peak_rss_mb": peak_rss_mb(),
+        }
+        if self.has_durations:
+            audio_seconds = float(self.audio_seconds)
+            real_frames = min(audio_seconds * self.frames_per_second, self.padded_frames)
+            metrics["throughput/audio_sec_per_sec"] = audio_seconds / elapsed
+            metrics["throughput/frame_efficiency"] = real_frames / max(self.padded_frames, 1)
+        if torch.cuda.is_available():
+            metrics["throughput/peak_gpu_mem_mb"] = torch.cuda.max_memory_allocated() / 2 ** 20
+        self._reset()
+        return metrics
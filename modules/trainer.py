@@ -0,0 +1,156 @@
+import time
+
+from torch.utils.data import DataLoader
+from transformers import Seq2SeqTrainer
+from transformers.modeling_outputs import BaseModelOutput
+
+from .generation import pruned_greedy_generate, row_caps_generate_kwargs
+
+
+class BucketedSeq2SeqTrainer(Seq2SeqTrainer):
+    """
+    Seq2SeqTrainer that draws batches from custom batch samplers
+    (e.g. DurationBucketBatchSampler) instead of fixed-size random batches.
+    Without samplers it behaves exactly like Seq2SeqTrainer.
+
+    For evaluation with predict_with_generate, length_cap
+    (generation.GenerationLengthCap) gives every clip its own max_new_tokens
+    from the input_length the collator passes along, and prune_finished
+    decodes greedily from prompt_ids, dropping finished clips from the batch.
+
+    Batches with encoder_hidden_states (encoder_cache.EncoderCacheDataset,
+    decoder-only training) skip the encoder: the cached states are passed to
+    the model and to generation as encoder_outputs. With offload_encoder,
+    the encoder is then kept on the CPU instead of the training device
+    (single-process training only: DDP needs all parameters on one device).
+    """
+
+    def __init__(self, *args, train_batch_sampler=None, eval_batch_sampler=None,
+                 length_cap=None, prune_finished=False, prompt_ids=None, offload_encoder=False, **kwargs):
+        self.offload_encoder = offload_encoder  # read by _move_model_to_device during __init__
+        super().__init__(*args, **kwargs)
+        if self._offloads_encoder():
+            # batches are moved by _prepare_inputs; accelerate would move the whole model back
+            self.accelerator.device_placement = False
+        self.train_batch_sampler = train_batch_sampler
+        self.eval_batch_sampler = eval_batch_sampler
+        self.length_cap = length_cap
+        self.prune_finished = prune_finished
+        self.prompt_ids = prompt_ids
+        if prune_finished and prompt_ids is None:
+            raise ValueError("prune_finished needs the decoder prompt_ids")
+
+    def _offloads_encoder(self):
+        return self.offload_encoder and self.args.world_size == 1
+
+    def _move_model_to_device(self, model, device):
+        if not self._offloads_encoder():
+            return super()._move_model_to_device(model, device)
+        # everything but the encoder: detach it while the model is moved. Registered
+        # again after the decoder, so model.device (the device of the first parameter,
+        # where generate creates its tensors) is the training device.
+        encoder = model.model._modules.pop("encoder")
+        try:
+            super()._move_model_to_device(model, device)
+        finally:
+            model.model.encoder = encoder.to("cpu")
+
+    def _throughput_callbacks(self):
+        return [cb for cb in self.callback_handler.callbacks if hasattr(cb, "record_batches")]
+
+    def get_batch_samples(self, epoch_iterator, num_batches, device):
+        # data wait time and batch statistics for ThroughputCallback
+        start = time.perf_counter()
+        batch_samples, num_items_in_batch = super().get_batch_samples(epoch_iterator, num_batches, device)
+        for callback in self._throughput_callbacks():
+            callback.record_batches(batch_samples, time.perf_counter() - start)
+        return batch_samples, num_items_in_batch
+
+    def log(self, logs, *args, **kwargs):
+        # training logs carry the throughput since the previous log
+        if "loss" in logs:
+            for callback in self._throughput_callbacks():
+                logs.update(callback.metrics())
+        super().log(logs, *args, **kwargs)
+
+    def _set_signature_columns_if_needed(self):
+        # keep the durations and cached encoder states when unused columns are removed
+        super()._set_signature_columns_if_needed()
+        for column in ("input_length", "encoder_hidden_states"):
+            if column not in self._signature_columns:
+                self._signature_columns.append(column)
+
+    def _cached_encoder_outputs(self, inputs):
+        states = inputs.pop("encoder_hidden_states", None)
+        if states is not None:
+            # fp16 on disk -> the decoder's dtype (fp32 master weights under fp16 autocast)
+            inputs["encoder_outputs"] = BaseModelOutput(last_hidden_state=states.to(self.model.dtype))
+        return inputs
+
+    def compute_loss(self, model, inputs, *args, **kwargs):
+        inputs.pop("input_length", None)
+        inputs = self._cached_encoder_outputs(inputs)
+        return super().compute_loss(model, inputs, *args, **kwargs)
+
+    def prediction_step(self, model, inputs, prediction_loss_only, ignore_keys=None, **gen_kwargs):
+        durations = inputs.pop("input_length", None)
+        if "encoder_hidden_states" in inputs:
+            inputs = self._cached_encoder_outputs(self._prepare_inputs(inputs))
+        if not self.args.predict_with_generate or prediction_loss_only:
+            return super().prediction_step(model, inputs, prediction_loss_only, ignore_keys=ignore_keys, **gen_kwargs)
+
+        gen_kwargs = gen_kwargs or self._gen_kwargs.copy()
+        caps = None
+        if self.length_cap is not None and durations is not None:
+            caps = self.length_cap.caps(durations.cpu().numpy())
+            gen_kwargs.pop("max_length", None)
+            gen_kwargs.update(row_caps_generate_kwargs(caps, self.model.generation_config.eos_token_id))
+
+        if not self.prune_finished:
+            return super().prediction_step(model, inputs, prediction_loss_only, ignore_keys=ignore_keys, **gen_kwargs)
+
+        # loss as usual, tokens from the pruned greedy decoder (padded like Seq2SeqTrainer does)
+        loss, _, _ = super().prediction_step(model, inputs, prediction_loss_only=True, ignore_keys=ignore_keys)
+        inputs = self._prepare_inputs(inputs)
+        if caps is None:
+            caps = (gen_kwargs.get("max_new_tokens") or gen_kwargs.get("max_length")
+                    or self.model.generation_config.max_length) - len(self.prompt_ids)
+        if "encoder_outputs" in inputs:
+            generated_tokens = pruned_greedy_generate(self.model, None, self.prompt_ids, caps,
+                                                      encoder_hidden_states=inputs["encoder_outputs"][0])
+        else:
+            generated_tokens = pruned_greedy_generate(self.model, inputs["input_features"], self.prompt_ids, caps)
+        max_length = self.model.generation_config.max_length
+        if generated_tokens.shape[-1] < max_length:
+            generated_tokens = self._pad_tensors_to_max_len(generated_tokens, max_length)
+        labels = inputs.get("labels")
+        if labels is not None and labels.shape[-1] < max_length:
+            labels = self._pad_tensors_to_max_len(labels, max_length)
+        return loss, generated_tokens, labels
+
+    def _batch_sampler_dataloader(self, dataset, batch_sampler):
+        dataloader = DataLoader(
+            dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+            persistent_workers=self.args.dataloader_persistent_workers and self.args.dataloader_num_workers > 0,
+        )
+        return self.accelerator.prepare(dataloader)
+
+    def get_train_dataloader(self):
+        if self.train_batch_sampler is None:
+            return super().get_train_dataloader()
+        return self._batch_sampler_dataloader(self.train_dataset, self.train_batch_sampler)
+
+    def get_eval_dataloader(self, eval_dataset=None):
+        if self.eval_batch_sampler is None:
+            return super().get_eval_dataloader(eval_dataset)
+        eval_dataset = self.eval_dataset if eval_dataset is None else eval_dataset
+        return self._batch_sampler_dataloader(eval_dataset, self.eval_batch_sampler)
+
+    def get_test_dataloader(self, test_dataset):
+        if self.eval_batch_sampler is None:
+            return super().get_test_dataloader(test_dataset)
+        return self._batch_sampler_dataloader(test_dataset, self.eval_batch_sampler)
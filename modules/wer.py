@@ -0,0 +1,174 @@
+import numpy as np
+
+PAD_REF, PAD_HYP = -1, -2  # padding ids, never equal to a word id or to each other
+
+
+def words(text):
+    """Word tokens the same way jiwer splits them (any whitespace, no empty words)."""
+    return text.split()
+
+
+def chars(text):
+    """Character tokens for CER (repeated whitespace collapsed, like jiwer.cer)."""
+    return list(" ".join(text.split()))
+
+
+def _pad(sequences, length, pad):
+    out = np.full((len(sequences), max(length, 1)), pad, dtype=np.int64)
+    for b, seq in enumerate(sequences):
+        out[b, :len(seq)] = seq
+    return out
+
+
+def batch_edit_counts(refs, hyps):
+    """
+    Levenshtein alignment of a batch of integer-encoded (reference, hypothesis)
+    pairs. Returns an int64 array (batch, 3) of substitutions, deletions and
+    insertions on a minimal-edit path.
+
+    The DP runs one reference position at a time for the whole batch; within a
+    row the insertion chain D[i, j] = min_k (C[k] + j - k) is a running minimum,
+    so each row is a handful of vectorized NumPy operations.
+    """
+    batch = len(refs)
+    n = np.array([len(r) for r in refs], dtype=np.int64)
+    m = np.array([len(h) for h in hyps], dtype=np.int64)
+    if batch == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    R = _pad(refs, int(n.max()), PAD_REF)
+    H = _pad(hyps, int(m.max()), PAD_HYP)
+    cols = np.arange(H.shape[1] + 1)
+    rows_b = np.arange(batch)
+
+    # only distance and substitutions are tracked, as one key dist * big + sub:
+    # minimizing it prefers, among minimal-edit paths, the one with the fewest
+    # substitutions (= most hits). On any path to (i, j) deletions - insertions
+    # = i - j, which gives the other two counts at the end.
+    big = R.shape[1] + H.shape[1] + 1
+    cost = big + 1  # substitution: one edit, one substitution
+    key = np.broadcast_to(cols * big, (batch, len(cols))).copy()  # row 0: only insertions
+
+    final = np.where(n == 0, m * big, 0)
+    for i in range(1, R.shape[1] + 1):
+        # C[j]: deletion from D[i-1, j] or match / substitution from D[i-1, j-1]
+        c = key + big
+        diag = key[:, :-1] + cost * (R[:, i - 1, None] != H)
+        np.minimum(c[:, 1:], diag, out=c[:, 1:])
+
+        # D[i, j] = min_k<=j C[k] + (j - k) insertions: a running minimum
+        key = np.minimum.accumulate(c - cols * big, axis=1) + cols * big
+
+        done = n == i
+        if done.any():
+            final[done] = key[rows_b, m][done]
+
+    dist, sub = np.divmod(final, big)
+    rest = dist - sub
+    deletions = (rest + n - m) // 2
+    insertions = (rest - n + m) // 2
+    return np.stack([sub, deletions, insertions], axis=-1)
+
+
+def alignment(ref, hyp):
+    """
+    Edit operations of one (reference, hypothesis) token pair, as a list of
+    (op, ref_token, hyp_token) with op in "equal", "substitute", "delete", "insert".
+    """
+    n, m = len(ref), len(hyp)
+    D = np.zeros((n + 1, m + 1), dtype=np.int64)
+    D[0, :] = np.arange(m + 1)
+    D[:, 0] = np.arange(n + 1)
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            D[i, j] = min(D[i - 1, j - 1] + (ref[i - 1] != hyp[j - 1]), D[i - 1, j] + 1, D[i, j - 1] + 1)
+
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and D[i, j] == D[i - 1, j - 1] + (ref[i - 1] != hyp[j - 1]):
+            ops.append(("equal" if ref[i - 1] == hyp[j - 1] else "substitute", ref[i - 1], hyp[j - 1]))
+            i, j = i - 1, j - 1
+        elif i > 0 and D[i, j] == D[i - 1, j] + 1:
+            ops.append(("delete", ref[i - 1], None))
+            i -= 1
+        else:
+            ops.append(("insert", None, hyp[j - 1]))
+            j -= 1
+    return ops[::-1]
+
+
+class ErrorRateAccumulator:
+    """
+    Corpus WER (or CER with tokenize=chars) accumulated batch by batch:
+    update() aligns a batch and adds its substitution / deletion / insertion /
+    hit counts, so the full prediction and reference lists never need to be
+    held in memory. Same error rates as evaluate.load("wer") / jiwer, offline
+    (when several minimal-edit paths exist, the split into substitutions /
+    deletions / insertions is the one with the most hits).
+
+    With keep_utterances=True the per-utterance counts are kept in .utterances.
+    """
+
+    def __init__(self, tokenize=words, batch_size=256, keep_utterances=False):
+        self.tokenize = tokenize
+        self.batch_size = batch_size
+        self.keep_utterances = keep_utterances
+        self.vocab = {}
+        self.substitutions = self.deletions = self.insertions = self.hits = 0
+        self.utterances = []
+
+    def _encode(self, text):
+        return [self.vocab.setdefault(token, len(self.vocab)) for token in self.tokenize(text)]
+
+    def update(self, predictions, references, ids=None):
+        refs = [self._encode(r) for r in references]
+        hyps = [self._encode(p) for p in predictions]
+        if len(refs) != len(hyps):
+            raise ValueError(f"{len(hyps)} predictions vs {len(refs)} references")
+
+        # sort by length so every DP batch pads little
+        order = sorted(range(len(refs)), key=lambda b: (len(refs[b]), len(hyps[b])))
+        counts = np.zeros((len(refs), 3), dtype=np.int64)
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            counts[chunk] = batch_edit_counts([refs[b] for b in chunk], [hyps[b] for b in chunk])
+
+        ref_lengths = np.array([len(r) for r in refs], dtype=np.int64)
+        hits = ref_lengths - counts[:, 0] - counts[:, 1]
+        self.substitutions += int(counts[:, 0].sum())
+        self.deletions += int(counts[:, 1].sum())
+        self.insertions += int(counts[:, 2].sum())
+        self.hits += int(hits.sum())
+
+        if self.keep_utterances:
+            for b, (s, d, i) in enumerate(counts.tolist()):
+                self.utterances.append({
+                    "id": None if ids is None else ids[b],
+                    "substitutions": s,
+                    "deletions": d,
+                    "insertions": i,
+                    "hits": int(hits[b]),
+                })
+        return counts
+
+    @property
+    def errors(self):
+        return self.substitutions + self.deletions + self.insertions
+
+    @property
+    def num_reference_tokens(self):
+        return self.substitutions + self.deletions + self.hits
+
+    @property
+    def error_rate(self):
+        total = self.num_reference_tokens
+        return self.errors / total if total else 0.0
+
+    def counts(self):
+        return {
+            "substitutions": self.substitutions,
+            "deletions": self.deletions,
+            "insertions": self.insertions,
+            "hits": self.hits,
+        }
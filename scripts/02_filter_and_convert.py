@@ -1,18 +1,31 @@
-import json
+import os
+import sys
 import soundfile as sf
 import torchaudio
+from functools import partial
 from pathlib import Path
 from tqdm import tqdm
-import shutil
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules.audio import get_resampler
+from modules.manifest import ManifestWriter, iter_jsonl
+from modules.parallel import default_num_workers, ordered_imap
 
 """Convert NeMo manifest to HuggingFace style JSON.
-Resample audio to 16khz"""
+Resample audio to 16khz.
+Input lines are streamed through a worker pool and the output is written as
+results come in (same order as the input), so memory stays flat."""
 
 # --- Config ---
 ROOT_DIR = Path("data/SpokenWOZ")
 INPUT_MANIFEST = ROOT_DIR / "root_manifest.json"
-OUTPUT_MANIFEST = ROOT_DIR / "root_manifest_hf.json"
+OUTPUT_MANIFEST = ROOT_DIR / "root_manifest_hf.arrow"  # memory-mapped; .jsonl / .json -> JSON rows
 OUTPUT_AUDIO_DIR = ROOT_DIR / "audio_16k"
+NUM_WORKERS = default_num_workers()
+CHUNKSIZE = 64  # manifest lines sent to a worker at once
 
 TARGET_SR = 16000
 LANG = "en"
@@ -23,7 +36,7 @@ def ensure_dir(path: Path):
     path.mkdir(parents=True, exist_ok=True)
 
 
-def process_audio(audio_path: Path):
+def process_audio(audio_path: Path, output_dir: Path = OUTPUT_AUDIO_DIR, target_sr: int = TARGET_SR):
     """Return path, sr, duration. Resample only if needed."""
     # read header only (faster than full load)
     info = sf.info(audio_path)
@@ -32,69 +45,81 @@ def process_audio(audio_path: Path):
     duration = info.frames / sr
 
     # if already 16k mono, no need to resample
-    if sr == TARGET_SR and channels == 1:
+    if sr == target_sr and channels == 1:
         return audio_path, sr, duration
 
-    # else: resample and save to OUTPUT_AUDIO_DIR
+    # else: resample and save to output_dir
     waveform, sr_loaded = torchaudio.load(audio_path)
 
     # downmix stereo → mono if needed
     if waveform.shape[0] > 1:
         waveform = waveform.mean(dim=0, keepdim=True)
 
-    if sr_loaded != TARGET_SR:
-        waveform = torchaudio.functional.resample(waveform, sr_loaded, TARGET_SR)
+    if sr_loaded != target_sr:
+        # kernel is cached per (orig_sr, target_sr) in every worker
+        waveform = get_resampler(sr_loaded, target_sr)(waveform)
 
-    out_path = OUTPUT_AUDIO_DIR / audio_path.name
+    out_path = output_dir / audio_path.name
     audio_np = waveform.squeeze().numpy().astype("float32")
-    sf.write(out_path, audio_np, TARGET_SR)
+    sf.write(out_path, audio_np, target_sr)
+
+    duration = audio_np.shape[0] / target_sr
+    return out_path, target_sr, duration
+
+
+def convert_entry(entry, output_dir: Path = OUTPUT_AUDIO_DIR, target_sr: int = TARGET_SR):
+    """Worker: turn one NeMo entry into an HF entry. Returns (hf_entry, resampled)."""
+    audio_path = Path(entry["audio_filepath"])
+    text = entry["text"]
+
+    if entry.get("start_frame") is not None:
+        # virtual segment -> sliced and resampled at load time
+        out_path, sr, duration = audio_path, entry["sampling_rate"], entry["duration"]
+    else:
+        out_path, sr, duration = process_audio(audio_path, output_dir, target_sr)
 
-    duration = audio_np.shape[0] / TARGET_SR
-    return out_path, TARGET_SR, duration
+    hf_entry = {
+        "file": str(out_path),
+        "audio": {
+            "path": str(out_path),
+            "sampling_rate": sr
+        },
+        "language": LANG,
+        "text": text,
+        "duration": duration,
+        "subset": SUBSET
+    }
+    for key in ("utt_id", "start_frame", "end_frame"):
+        if key in entry:
+            hf_entry[key] = entry[key]
+
+    return hf_entry, out_path != audio_path
 
 
 def main():
     ensure_dir(OUTPUT_AUDIO_DIR)
 
-    # load NeMo manifest
-    with open(INPUT_MANIFEST, "r", encoding="utf-8") as f:
-        nemo_entries = [json.loads(line) for line in f]
-
-    hf_data = []
     resampled_count = 0
     reused_count = 0
 
-    for entry in tqdm(nemo_entries, desc="Processing"):
-        audio_path = Path(entry["audio_filepath"])
-        text = entry["text"]
-
-        out_path, sr, duration = process_audio(audio_path)
-
-        if out_path != audio_path:
-            resampled_count += 1
-        else:
-            reused_count += 1
-
-        hf_entry = {
-            "file": str(out_path),
-            "audio": {
-                "path": str(out_path),
-                "sampling_rate": sr
-            },
-            "language": LANG,
-            "text": text,
-            "duration": duration,
-            "subset": SUBSET
-        }
-        hf_data.append(hf_entry)
-
-    # wrap in dict for HuggingFace style
-    output = {"data": hf_data}
-
-    with open(OUTPUT_MANIFEST, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
-
-    print(f"{len(hf_data)} samples written to {OUTPUT_MANIFEST}")
+    # stream NeMo manifest lines through the pool
+    results = ordered_imap(
+        partial(convert_entry, output_dir=OUTPUT_AUDIO_DIR, target_sr=TARGET_SR),
+        iter_jsonl(INPUT_MANIFEST),
+        num_workers=NUM_WORKERS,
+        chunksize=CHUNKSIZE,
+    )
+
+    with ManifestWriter(OUTPUT_MANIFEST) as writer:
+        for hf_entry, resampled in tqdm(results, desc="Processing"):
+            writer.write(hf_entry)
+
+            if resampled:
+                resampled_count += 1
+            else:
+                reused_count += 1
+
+    print(f"{writer.count} samples written to {OUTPUT_MANIFEST}")
     print(f"Resampled: {resampled_count}, Reused (already 16kHz mono): {reused_count}")
 
 
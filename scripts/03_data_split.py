@@ -1,41 +1,46 @@
-from datasets import load_dataset
+import os
+import sys
 from pathlib import Path
-import json
 
-def split_manifest_hf(input_json="data/SpokenWOZ/root_manifest_hf.json",
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules.manifest import ManifestWriter, is_arrow, load_manifest_dataset, write_arrow
+
+def split_manifest_hf(input_json="data/SpokenWOZ/root_manifest_hf.arrow",
                       test_size=0.1, seed=42):
-    # Load dataset
-    dataset = load_dataset("json", data_files=input_json, field="data")["train"]
+    # Load dataset (.arrow manifests are memory-mapped, not parsed)
+    dataset = load_manifest_dataset(input_json)
 
     # Split
     splits = dataset.train_test_split(test_size=test_size, seed=seed)
 
-    # Save into the same folder as input_json
+    # Save into the same folder as input_json, in the same format
     input_path = Path(input_json)
     save_dir = input_path.parent
 
-    train_out = save_dir / "train_manifest_hf.json"
-    dev_out = save_dir / "dev_manifest_hf.json"
-
-    # Convert datasets to list of dicts
-    train_data = splits["train"].to_list()
-    dev_data = splits["test"].to_list()
-
-    # Wrap with "data": [ ]
-    with open(train_out, "w", encoding="utf-8") as f:
-        json.dump({"data": train_data}, f, ensure_ascii=False, indent=2)
+    train_out = save_dir / f"train_manifest_hf{input_path.suffix}"
+    dev_out = save_dir / f"dev_manifest_hf{input_path.suffix}"
 
-    with open(dev_out, "w", encoding="utf-8") as f:
-        json.dump({"data": dev_data}, f, ensure_ascii=False, indent=2)
+    for split, out in (("train", train_out), ("test", dev_out)):
+        if is_arrow(out):
+            # columnar copy of the selected rows, no python objects
+            write_arrow(splits[split].with_format("arrow")[:], out)
+            continue
+        # JSON: stream the rows instead of building one big list
+        with ManifestWriter(out) as writer:
+            for row in splits[split]:
+                writer.write(row)
 
-    print(f"Train: {len(train_data)} → {train_out}")
-    print(f"Dev: {len(dev_data)} → {dev_out}")
+    print(f"Train: {len(splits['train'])} → {train_out}")
+    print(f"Dev: {len(splits['test'])} → {dev_out}")
 
     return splits
 
 if __name__ == "__main__":
-    split_manifest_hf("data/SpokenWOZ/root_manifest_hf.json", test_size=0.1, seed=42)
+    split_manifest_hf("data/SpokenWOZ/root_manifest_hf.arrow", test_size=0.1, seed=42)
 
 # Total: 167386
-# Train: 150647 
-# Dev: 16739
\ No newline at end of file
+# Train: 150647
+# Dev: 16739
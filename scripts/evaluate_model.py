@@ -1,10 +1,11 @@
 import os
 import sys
+import time
 import yaml
 import json
-import numpy as np  
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from transformers import Seq2SeqTrainer, Seq2SeqTrainingArguments
 
 # make sure modules/ is importable
 current_dir = os.path.dirname(__file__)
@@ -14,14 +15,200 @@ sys.path.append(parent_dir)
 from modules import (
     load_model,
     load_and_prepare_testset,
-    DataCollatorSpeechSeq2SeqWithPadding,
-    compute_metrics,
 )
+from modules.generation import build_length_cap
+from modules.inference import BatchedInference, load_predictions, merge_predictions, shard_indices, write_predictions
+from modules.model_loader import load_processor
+from modules.manifest import ManifestReader
+from modules.metrics import StreamingWER, normalizer
+from modules.wer import alignment
 
 # ---- Config Path ----
 DATA_DIR = Path("/data")      
-EVAL_DIR = DATA_DIR / "evaluation" / "whisper-large-v2-2"  # change manually before each run
-EVAL_DIR.mkdir(parents=True, exist_ok=True)
+EVAL_ROOT = DATA_DIR / "evaluation"  # one run directory per eval.run_name (default: model dir name)
+
+
+def get_run_dir(cfg, model_dir, test_manifest):
+    """
+    Per-run output directory. Re-running with the same run_name resumes it,
+    as long as model, test manifest and decoding settings are the same.
+    """
+    eval_cfg = cfg["eval"]
+    generation_cfg = cfg.get("generation", {})
+    run_dir = EVAL_ROOT / eval_cfg.get("run_name", Path(model_dir).name)
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    # non-default settings only, so runs recorded before a setting existed still match
+    run = {"model_dir": str(model_dir), "test_manifest": str(test_manifest)}
+    if eval_cfg.get("quantization", "none") != "none":
+        run["quantization"] = eval_cfg["quantization"]
+    if eval_cfg.get("backend", "pytorch") != "pytorch":
+        run["backend"] = eval_cfg["backend"]
+    if eval_cfg.get("torch_dtype"):
+        run["torch_dtype"] = eval_cfg["torch_dtype"]
+    if eval_cfg.get("encoder_bucket_seconds"):
+        run["encoder_bucket_seconds"] = eval_cfg["encoder_bucket_seconds"]
+    if eval_cfg.get("assistant_model"):
+        run["assistant_model"] = eval_cfg["assistant_model"]
+        run["num_assistant_tokens"] = eval_cfg.get("num_assistant_tokens")
+    if generation_cfg.get("duration_caps", False):
+        run["duration_caps"] = {
+            key: generation_cfg.get(key, default)
+            for key, default in (("tokens_per_second", None), ("quantile", 0.999), ("margin", 1.25),
+                                 ("min_new_tokens", 10))
+        }
+        run["duration_caps"]["generation_max_length"] = cfg.get("train", {}).get("generation_max_length", 225)
+    if generation_cfg.get("prune_finished", False):
+        run["prune_finished"] = True
+    run_json = run_dir / "run.json"
+    if run_json.exists():
+        with run_json.open("r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous != run:
+            raise ValueError(f"{run_dir} belongs to another run ({previous}); set a new eval.run_name")
+    else:
+        with run_json.open("w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    return run_dir
+
+
+def load_eval_model(cfg, model_dir, device=None, num_threads=None):
+    """
+    Model, processor and device of eval.backend / eval.quantization
+    (onnx -> ONNX Runtime on CPU, dynamic_int8 -> int8 linear layers on CPU).
+    """
+    model_cfg = cfg["model"]
+    eval_cfg = cfg["eval"]
+    backend = eval_cfg.get("backend", "pytorch")
+    quantization = eval_cfg.get("quantization", "none")
+    if backend == "onnx":
+        if quantization != "none":
+            raise ValueError("eval.quantization is only supported with eval.backend: pytorch")
+        from modules.onnx_backend import load_onnx_model
+        return load_onnx_model(
+            model_dir,
+            onnx_dir=eval_cfg.get("onnx_dir"),
+            language=model_cfg.get("language", "english"),
+            task=model_cfg.get("task", "transcribe"),
+            num_threads=eval_cfg.get("onnx_threads") or num_threads,
+        )
+    elif backend != "pytorch":
+        raise ValueError(f"Unknown eval.backend: {backend}")
+    elif quantization == "dynamic_int8":
+        from modules.quantization import load_quantized_model
+        return load_quantized_model(
+            model_dir,
+            quantized_dir=eval_cfg.get("quantized_dir"),
+            language=model_cfg.get("language", "english"),
+            task=model_cfg.get("task", "transcribe"),
+        )
+    elif quantization == "none":
+        return load_model(
+            model_name=model_dir,
+            language=model_cfg.get("language", "english"),
+            task=model_cfg.get("task", "transcribe"),
+            torch_dtype=eval_cfg.get("torch_dtype"),
+            device=device,
+        )
+    else:
+        raise ValueError(f"Unknown eval.quantization: {quantization}")
+
+
+def build_engine(cfg, model, processor, device, length_cap=None, **generate_kwargs):
+    """BatchedInference with the eval.* / generation.* settings."""
+    eval_cfg = cfg["eval"]
+    return BatchedInference(
+        model,
+        processor,
+        device=device,
+        batch_size=eval_cfg.get("per_device_eval_batch_size", 16),
+        num_workers=eval_cfg.get("dataloader_num_workers", 0),
+        length_cap=length_cap,
+        prune_finished=cfg.get("generation", {}).get("prune_finished", False),
+        encoder_bucket_seconds=eval_cfg.get("encoder_bucket_seconds"),
+        **generate_kwargs,
+    )
+
+
+def get_audio_path(it):
+    return (it.get("audio") or {}).get("path") or it.get("file")
+
+
+def asr_rows(results, items_by_id):
+    """Engine results -> rows of asr_text_vs_ref_and_intent.jsonl."""
+    for r in results:
+        it = items_by_id.get(r["utt_id"], {})
+        yield {
+            "utt_id": r["utt_id"],
+            "audio_filepath": get_audio_path(it),
+            "asr_pred": r["asr_pred"], # whisper predicted text
+            "asr_ref": r["asr_ref"], # ground truth transcription
+            "intent_ref": it.get("dialog_act"),
+        }
+
+
+def transcribe_shard(job):
+    """
+    Worker process of eval.num_processes: transcribes one shard of the test
+    set on CPU with its own model copy and job["num_threads"] torch threads,
+    appending to the shard's own JSONL. Returns its decoding counters.
+    """
+    import torch
+
+    torch.set_num_threads(job["num_threads"])
+    cfg = job["cfg"]
+    model, processor, device = load_eval_model(cfg, job["model_dir"], device="cpu", num_threads=job["num_threads"])
+    engine = build_engine(cfg, model, processor, device, job["length_cap"])
+    n_written = write_predictions(asr_rows(engine(job["dataset"]), job["items_by_id"]), job["path"], append=True)
+    return {
+        "utterances": n_written,
+        "generated_tokens": engine.generated_tokens,
+        "generate_seconds": engine.generate_seconds,
+    }
+
+
+def run_shards(cfg, model_dir, test_ds, items_by_id, length_cap, results_path, num_processes):
+    """
+    eval.num_processes > 1: the remaining clips are dealt to num_processes
+    worker processes (balanced by duration, see shard_indices), each writing
+    <results>.shard<i>.jsonl; the shards are then merged into results_path,
+    sorted by utt_id. Returns the decoding stats of all workers.
+    """
+    eval_cfg = cfg["eval"]
+    num_threads = eval_cfg.get("num_threads_per_process") or max(1, (os.cpu_count() or 1) // num_processes)
+    utt_ids = test_ds["utt_id"]
+    jobs = []
+    for i, indices in enumerate(shard_indices(test_ds["input_length"], num_processes)):
+        if not indices:
+            continue
+        jobs.append({
+            "cfg": cfg,
+            "model_dir": model_dir,
+            "dataset": test_ds.select(indices),
+            "items_by_id": {utt_ids[j]: items_by_id.get(utt_ids[j], {}) for j in indices},
+            "length_cap": length_cap,
+            "num_threads": num_threads,
+            "path": str(results_path.with_suffix(f".shard{i}.jsonl")),
+        })
+
+    print(f"Transcribing {len(test_ds)} clips in {num_processes} processes x {num_threads} threads")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(len(jobs), mp_context=multiprocessing.get_context("spawn")) as pool:
+        stats = list(pool.map(transcribe_shard, jobs))
+    wall_seconds = time.perf_counter() - start
+    merge_predictions(results_path, [job["path"] for job in jobs])
+
+    generated_tokens = sum(s["generated_tokens"] for s in stats)
+    return {
+        "utterances": sum(s["utterances"] for s in stats),
+        "generated_tokens": generated_tokens,
+        "generate_seconds": sum(s["generate_seconds"] for s in stats),
+        "processes": num_processes,
+        "threads_per_process": num_threads,
+        "wall_seconds": wall_seconds,
+        "tokens_per_second": generated_tokens / max(wall_seconds, 1e-9),
+    }
+
 
 def main():
     # 1) config
@@ -30,84 +217,157 @@ def main():
     model_cfg = cfg["model"]
     eval_cfg  = cfg["eval"]
 
-    # 2) load model
-    model, processor, device = load_model(
-        model_name=eval_cfg.get("model_dir", cfg["train"]["output_dir"]),
-        language=model_cfg.get("language", "english"),
-        task=model_cfg.get("task", "transcribe"),
-    )
-
-    # 3) load dataset 
+    # 2) per-run directory; utterances already in its results file are skipped
+    model_dir = eval_cfg.get("model_dir", cfg["train"]["output_dir"])
     test_manifest = eval_cfg["test_manifest"]   
-    test_ds = load_and_prepare_testset(test_manifest, processor)
-
-    # 3b) also load the same JSON to retrieve refs & intents later
-    with open(test_manifest, "r", encoding="utf-8") as f:
-        items = json.load(f)["data"]   
-
-    # 4) collator / args / trainer
-    data_collator = DataCollatorSpeechSeq2SeqWithPadding(processor=processor)
-    training_args = Seq2SeqTrainingArguments(
-        output_dir=eval_cfg.get("output_dir", "eval_results"),
-        per_device_eval_batch_size=eval_cfg.get("per_device_eval_batch_size", 16),
-        predict_with_generate=True,
-        eval_accumulation_steps=16,
-    )
-    trainer = Seq2SeqTrainer(
-        model=model,
-        args=training_args,
-        eval_dataset=test_ds,
-        data_collator=data_collator,
-        tokenizer=processor.feature_extractor,
-        compute_metrics=lambda pred: compute_metrics(pred, processor),
-    )
+    run_dir = get_run_dir(cfg, model_dir, test_manifest)
+    results_path = run_dir / "asr_text_vs_ref_and_intent.jsonl"
+    # shards of an interrupted eval.num_processes run are merged first
+    merge_predictions(results_path, sorted(run_dir.glob("asr_text_vs_ref_and_intent.shard*.jsonl")))
+    done = load_predictions(results_path)
+    if done:
+        print(f"Resuming {run_dir}: {len(done)} utterances already done")
 
-    # 5) evaluate
-    preds = trainer.predict(test_ds)
-    results = preds.metrics
-    print("Evaluation results:", results)
+    # 3) load model (eval.backend / eval.quantization); with eval.num_processes > 1
+    # only the processor, every worker process loads its own model copy
+    backend = eval_cfg.get("backend", "pytorch")
+    quantization = eval_cfg.get("quantization", "none")
+    num_processes = eval_cfg.get("num_processes", 1)
+    model = None
+    if num_processes > 1:
+        if eval_cfg.get("assistant_model"):
+            raise ValueError("eval.assistant_model needs eval.num_processes: 1")
+        if backend != "pytorch" or quantization != "none":
+            # export / quantize once here instead of racing in the workers
+            _, processor, _ = load_eval_model(cfg, model_dir)
+        else:
+            processor = load_processor(
+                model_dir,
+                language=model_cfg.get("language", "english"),
+                task=model_cfg.get("task", "transcribe"),
+            )
+        device = "cpu"
+    else:
+        model, processor, device = load_eval_model(cfg, model_dir)
 
-    # 6) predict and decode
-    gen_ids, label_ids = preds.predictions, preds.label_ids
-    label_ids = np.where(label_ids == -100, processor.tokenizer.pad_token_id, label_ids)
+    # 3b) optional draft model for assisted (speculative) greedy decoding:
+    # the model verifies the draft's tokens in one pass, output is unchanged
+    generate_kwargs = {}
+    assisted_stats = None
+    if eval_cfg.get("assistant_model"):
+        if backend != "pytorch" or quantization != "none":
+            raise ValueError("eval.assistant_model needs eval.backend: pytorch without quantization")
+        from modules.assisted import AssistedDecodingStats, load_assistant_model
+        assistant = load_assistant_model(
+            eval_cfg["assistant_model"], model, num_assistant_tokens=eval_cfg.get("num_assistant_tokens")
+        )
+        generate_kwargs = {"assistant_model": assistant, "num_beams": 1, "do_sample": False}
+        assisted_stats = AssistedDecodingStats(model, assistant)
 
-    pred_texts  = processor.tokenizer.batch_decode(gen_ids,   skip_special_tokens=True) # whisper text predictions
-    label_texts = processor.tokenizer.batch_decode(label_ids, skip_special_tokens=True) # ground truth texts 
-    pred_texts  = [p.strip() for p in pred_texts]
-    label_texts = [y.strip() for y in label_texts]
+    # 3c) per-utterance generation caps from the clip duration (generation.duration_caps)
+    # and greedy decoding that drops finished clips from the batch (generation.prune_finished)
+    generation_cfg = cfg.get("generation", {})
+    length_cap = build_length_cap(
+        generation_cfg,
+        processor.tokenizer,
+        model_dir=model_dir,
+        train_manifest=cfg.get("data", {}).get("train_manifest"),
+        max_new_tokens=cfg.get("train", {}).get("generation_max_length", 225) - len(processor.tokenizer.prefix_tokens),
+    )
+    if length_cap is not None:
+        print(f"Generation caps: {length_cap}")
 
-    # 7) align with original items 
-    # keeps everything same length -> to attach audio path  and intent 
-    n = min(len(pred_texts), len(label_texts), len(items))
-    pred_texts, label_texts, items = pred_texts[:n], label_texts[:n], items[:n]
+    # 3d) variable-length encoder mode: log-mel features trimmed to the batch's
+    # length bucket instead of 30s (eval.encoder_bucket_seconds, PyTorch only)
+    encoder_bucket_seconds = eval_cfg.get("encoder_bucket_seconds")
+    if encoder_bucket_seconds and backend != "pytorch":
+        raise ValueError("eval.encoder_bucket_seconds needs eval.backend: pytorch")
 
-    # audio path getter
-    def get_audio_path(it):
-        return (it.get("audio") or {}).get("path") or it.get("file")
+    # 4) load dataset (remaining utterances only)
+    test_ds = load_and_prepare_testset(test_manifest, processor, skip_ids=done.keys())
 
-    # utt_id getter
+    # 4b) also read the manifest columns needed later (paths, ids, intents);
+    # .arrow manifests are memory-mapped, so this is a column projection
+    reader = ManifestReader(test_manifest)
+    keep = [c for c in ("utt_id", "audio", "file", "dialog_act") if c in reader.column_names]
+    items = list(reader.rows(keep))
+
+    # utt_id getter (virtual segments share their dialogue's audio path)
     def get_utt_id(it):
+        if it.get("utt_id"):
+            return it["utt_id"]
         p = get_audio_path(it)
         return Path(p).stem if p else None
-    
-    # 8) write outputs
-    asr_rows = []
-    t5_rows  = []
-
-    for p, y, it in zip(pred_texts, label_texts, items):
-        asr_rows.append({
-            "utt_id": get_utt_id(it),
-            "audio_filepath": get_audio_path(it),
-            "asr_pred": p, # whisper predicted text
-            "asr_ref": y, # ground truth transcription
-            "intent_ref": it.get("dialog_act"),
-        })
 
-    for p, it in zip(pred_texts, items):
-        t5_rows.append({
-            "text": f"{p}",   
-            "dialog_act": it.get("dialog_act"),
-        })
+    items_by_id = {get_utt_id(it): it for it in items}
+
+    # 5) batched inference, longest clips first; every result is appended
+    # to the results JSONL as soon as its batch is done
+    # (eval.num_processes > 1: one shard of the clips per CPU worker process)
+    start = time.perf_counter()
+    n_new = len(test_ds)
+    if len(test_ds) and num_processes > 1:
+        decoding = run_shards(cfg, model_dir, test_ds, items_by_id, length_cap, results_path, num_processes)
+        print(f"Saved {decoding['utterances']} new results → {results_path}")
+    elif len(test_ds):
+        engine = build_engine(cfg, model, processor, device, length_cap, **generate_kwargs)
+        n_written = write_predictions(asr_rows(engine(test_ds), items_by_id), results_path, append=True)
+        print(f"Saved {n_written} new results → {results_path}")
+
+        # decoding speed of this session (utterances resumed from an earlier one not included)
+        decoding = {
+            "utterances": n_written,
+            "generated_tokens": engine.generated_tokens,
+            "generate_seconds": engine.generate_seconds,
+            "tokens_per_second": engine.generated_tokens / max(engine.generate_seconds, 1e-9),
+        }
+        if assisted_stats is not None:
+            decoding["assistant_model"] = eval_cfg["assistant_model"]
+            decoding.update(assisted_stats.summary(engine.generated_tokens))
+            print(
+                f"Assisted decoding: {decoding['acceptance_rate']:.1%} of draft tokens accepted, "
+                f"{decoding['decoder_pass_speedup']:.2f} tokens per model decoder pass"
+            )
+    runtime = time.perf_counter() - start
+    if assisted_stats is not None:
+        assisted_stats.close()  # remove its forward hooks from both models
+
+    if len(test_ds):
+        decoding_path = run_dir / "decoding_stats.json"
+        with decoding_path.open("w", encoding="utf-8") as f:
+            json.dump(decoding, f, indent=2)
+        print(f"Saved → {decoding_path}")
+
+    # 6) merge: all results of this run, in manifest order
+    # (clips filtered out by prepare_dataset have no result)
+    predictions = load_predictions(results_path)
+    rows = [predictions[u] for u in map(get_utt_id, items) if u in predictions]
+    t5_rows = [{"text": f"{r['asr_pred']}", "dialog_act": r["intent_ref"]} for r in rows]
+    print(f"{len(rows)} / {len(items)} manifest entries transcribed")
+
+    # 7) evaluate on the merged results
+    wer_metric = StreamingWER()
+    for start in range(0, len(rows), 1024):
+        chunk = rows[start:start + 1024]
+        wer_metric.update([r["asr_pred"] for r in chunk], [r["asr_ref"] for r in chunk])
+    # same keys as Trainer.evaluate (no eval_loss: inference only generates, there
+    # is no teacher-forced pass); runtime and speed cover this session's clips only
+    results = {f"eval_{k}": v for k, v in wer_metric.compute().items()}
+    results.update({
+        "eval_runtime": round(runtime, 4),
+        "eval_samples": len(rows),
+        "eval_samples_per_second": round(n_new / runtime, 3) if n_new else 0.0,
+    })
+    print("Evaluation results:", results)
+
+    # 7b) optional per-utterance alignments (normalized words)
+    if eval_cfg.get("save_alignments", False):
+        alignments_path = run_dir / "alignments.jsonl"
+        with alignments_path.open("w", encoding="utf-8") as f:
+            for r in rows:
+                ops = alignment(normalizer(r["asr_ref"]).split(), normalizer(r["asr_pred"]).split())
+                f.write(json.dumps({"utt_id": r["utt_id"], "ops": ops}, ensure_ascii=False) + "\n")
+        print(f"Saved → {alignments_path}")
 
     # write in json files
     def write_json(path, rows):
@@ -116,17 +376,17 @@ def main():
 
 
     # Output 1: whisper pred vs ground truth text + ground truth intent
-    asr_json = EVAL_DIR / "asr_text_vs_ref_and_intent.json"
-    write_json(asr_json, asr_rows)
+    asr_json = run_dir / "asr_text_vs_ref_and_intent.json"
+    write_json(asr_json, rows)
     print(f"Saved → {asr_json}")
 
     # Output 2 (input to T5): predicted text -> intent
-    t5_json = EVAL_DIR / "t5_eval_input_from_asr.json"
+    t5_json = run_dir / "t5_eval_input_from_asr.json"
     write_json(t5_json, t5_rows)
     print(f"Saved → {t5_json}")
 
     # Output 3: evaluation metrics results
-    metrics_path = EVAL_DIR / "eval_results.json"
+    metrics_path = run_dir / "eval_results.json"
     with metrics_path.open("w", encoding="utf-8") as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
     print(f"Saved → {metrics_path}")
@@ -1,28 +1,26 @@
 import os
 import sys
 import yaml
-import json
-from pathlib import Path
 
 current_dir = os.path.dirname(__file__)
 parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(parent_dir)
 
-from transformers import Seq2SeqTrainer, Seq2SeqTrainingArguments
+from transformers import Seq2SeqTrainingArguments
 
 from modules import (
     compute_metrics,
     load_and_prepare_datasets,
     DataCollatorSpeechSeq2SeqWithPadding,
-    load_model
+    load_model,
+    BucketedSeq2SeqTrainer,
+    build_batch_sampler,
 )
+from modules.generation import build_length_cap
 
-# get length of training data
-train_manifest = Path("/data/processed_data/train_manifest_HF.json")
-with open(train_manifest, "r", encoding="utf-8") as f:
-    train_data = json.load(f)["data"]
-
-train_data_len = len(train_data) 
+# default manifests, overridden by data.train_manifest / data.dev_manifest in the config
+TRAIN_MANIFEST = "/data/processed_data/train_manifest_hf.arrow"
+DEV_MANIFEST = "/data/processed_data/dev_manifest_hf.arrow"
 
 def main():
     # --- 1. Load config ---
@@ -31,37 +29,106 @@ def main():
 
     model_cfg = cfg["model"]
     train_cfg = cfg["train"]
-    
+    data_cfg = cfg.get("data", {})
+
+    train_manifest = data_cfg.get("train_manifest", TRAIN_MANIFEST)
+    dev_manifest = data_cfg.get("dev_manifest", DEV_MANIFEST)
+
     # --- 2. Load model + processor ---
     model, processor, device = load_model(
         model_name=model_cfg["name"],
         language=model_cfg.get("language", "english"),
         task=model_cfg.get("task", "transcribe"),
+        use_cache=False,  # training mutates the model: never share it through load_model's cache
     )
 
     model.config.use_cache = False
 
     # --- 3. Load and prepare datasets ---
     train_ds, dev_ds = load_and_prepare_datasets(
-        "/data/processed_data/train_manifest_HF.json",
-        "/data/processed_data/dev_manifest_HF.json",
-        processor
+        train_manifest,
+        dev_manifest,
+        processor,
+        mode=data_cfg.get("preprocessing", "map"),
+        feature_store_dir=data_cfg.get("feature_store_dir"),
+        pack_turns=data_cfg.get("pack_turns", False),
+        pack_timestamps=data_cfg.get("pack_timestamps", False),
+        pack_max_duration=data_cfg.get("pack_max_duration", 30.0),
     )
 
-    # --- 4. data collator ---
-    data_collator = DataCollatorSpeechSeq2SeqWithPadding(processor=processor)
+    # decoder-only: frozen encoder, run once over train / dev; training reads its cached outputs
+    decoder_only_cfg = cfg.get("decoder_only", {})
+    decoder_only = decoder_only_cfg.get("enabled", False)
+    if decoder_only:
+        from modules.encoder_cache import encoder_hash, load_encoder_cache_dataset
+
+        model.freeze_encoder()
+        cache_kwargs = dict(
+            cache_root=decoder_only_cfg["cache_dir"],
+            batch_size=decoder_only_cfg.get("batch_size", train_cfg.get("per_device_eval_batch_size", 16)),
+            shard_size=decoder_only_cfg.get("shard_size", 1024),
+            num_workers=train_cfg.get("dataloader_num_workers", 0),
+            weights_hash=encoder_hash(model),  # hashed once for both caches
+            extra={  # the packing settings change the cached clips and labels
+                "pack_turns": data_cfg.get("pack_turns", False),
+                "pack_timestamps": data_cfg.get("pack_timestamps", False),
+                "pack_max_duration": data_cfg.get("pack_max_duration", 30.0),
+            },
+        )
+        train_ds = load_encoder_cache_dataset(train_ds, train_manifest, model, processor, **cache_kwargs)
+        dev_ds = load_encoder_cache_dataset(dev_ds, dev_manifest, model, processor, **cache_kwargs)
+        print(f"Encoder cache: {train_ds.cache.dir}, {dev_ds.cache.dir}")
+        # not needed on the device any more: the Trainer keeps it on the CPU (offload_encoder)
+        model.get_encoder().to("cpu")
+
+    # --- 4. generation length caps (fitted on the training manifest) + data collator ---
+    generation_cfg = cfg.get("generation", {})
+    length_cap = build_length_cap(
+        generation_cfg,
+        processor.tokenizer,
+        train_manifest=train_manifest,
+        max_new_tokens=train_cfg.get("generation_max_length", 225) - len(processor.tokenizer.prefix_tokens),
+    )
+    if length_cap is not None:
+        length_cap.save(train_cfg["output_dir"])  # reused by evaluate_model.py
+        print(f"Generation caps: {length_cap}")
+
+    # training throughput to TensorBoard (data wait / compute, samples and audio seconds per second,
+    # padding efficiency, peak memory)
+    throughput_cfg = cfg.get("throughput", {})
+    callbacks = []
+    if throughput_cfg.get("enabled", False):
+        from modules.throughput import ThroughputCallback
+        callbacks.append(ThroughputCallback(synchronize=throughput_cfg.get("synchronize", False)))
+
+    data_collator = DataCollatorSpeechSeq2SeqWithPadding(
+        processor=processor, return_input_length=length_cap is not None or bool(callbacks)
+    )
 
     # --- 5. Training args from YAML ---
     epochs = train_cfg.get("num_train_epochs", 5)
     batch_size = train_cfg.get("per_device_train_batch_size", 16)
     gradient_accumulation_steps = train_cfg.get("gradient_accumulation_steps", 1)
-    max_steps = train_data_len * (epochs + 1 ) // (batch_size * gradient_accumulation_steps)
+
+    # duration-bucketed batches (None -> fixed-size random batches)
+    batching_cfg = cfg.get("batching", {})
+    train_batch_sampler = build_batch_sampler(train_ds, batching_cfg, batch_size, shuffle=True)
+    eval_batch_sampler = build_batch_sampler(
+        dev_ds, batching_cfg, train_cfg.get("per_device_eval_batch_size", 16), shuffle=False
+    )
+
+    if train_batch_sampler is not None:
+        # in budget mode the number of batches differs from one epoch's shuffle to the next
+        max_steps = train_batch_sampler.total_batches(epochs + 1) // gradient_accumulation_steps
+    else:
+        # rows of the prepared set: packed windows with data.pack_turns, clips over 30s dropped
+        max_steps = len(train_ds) * (epochs + 1 ) // (batch_size * gradient_accumulation_steps)
     train_cfg["max_steps"] = max_steps
 
     training_args = Seq2SeqTrainingArguments(**train_cfg)
 
     # --- 6. Trainer ---
-    trainer = Seq2SeqTrainer(
+    trainer = BucketedSeq2SeqTrainer(
         model=model,
         args=training_args,
         train_dataset=train_ds,
@@ -69,6 +136,13 @@ def main():
         data_collator=data_collator,
         tokenizer=processor.feature_extractor,
         compute_metrics=lambda pred: compute_metrics(pred, processor),
+        train_batch_sampler=train_batch_sampler,
+        eval_batch_sampler=eval_batch_sampler,
+        length_cap=length_cap,
+        prune_finished=generation_cfg.get("prune_finished", False),
+        prompt_ids=processor.tokenizer.prefix_tokens,
+        offload_encoder=decoder_only,
+        callbacks=callbacks,
     )
 
     # --- 7. Train ---
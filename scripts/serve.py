@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+import yaml
+
+# make sure modules/ is importable
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules import load_model
+from modules.generation import build_length_cap
+from modules.inference import BatchedInference
+from modules.serving import TranscriptionService, serve
+
+
+async def run(service, host, port, max_body_bytes):
+    server = await serve(service, host, port, max_body_bytes=max_body_bytes)
+    print(f"Serving on http://{host}:{port} (POST /transcribe, GET /health, GET /stats)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    """Transcription service for the downstream intent classifier:
+    rows in the {"text", "dialog_act"} shape of t5_eval_input_from_asr.json."""
+    with open("configs/config.yaml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    model_cfg = cfg["model"]
+    serve_cfg = cfg.get("serve", {})
+    model_dir = serve_cfg.get("model_dir", cfg.get("eval", {}).get("model_dir", cfg["train"]["output_dir"]))
+
+    model, processor, device = load_model(
+        model_name=model_dir,
+        language=model_cfg.get("language", "english"),
+        task=model_cfg.get("task", "transcribe"),
+        torch_dtype=serve_cfg.get("torch_dtype"),
+    )
+    generation_cfg = cfg.get("generation", {})
+    length_cap = build_length_cap(
+        generation_cfg,
+        processor.tokenizer,
+        model_dir=model_dir,
+        max_new_tokens=cfg.get("train", {}).get("generation_max_length", 225) - len(processor.tokenizer.prefix_tokens),
+    )
+    engine = BatchedInference(
+        model,
+        processor,
+        device=device,
+        length_cap=length_cap,
+        prune_finished=generation_cfg.get("prune_finished", False),
+        encoder_bucket_seconds=cfg.get("eval", {}).get("encoder_bucket_seconds"),
+    )
+    service = TranscriptionService(
+        engine,
+        max_batch_size=serve_cfg.get("max_batch_size", 16),
+        max_latency_ms=serve_cfg.get("max_latency_ms", 10),
+        feature_workers=serve_cfg.get("feature_workers", 4),
+        audio_root=serve_cfg.get("audio_root"),
+    )
+    max_body_bytes = int(serve_cfg.get("max_request_mb", 25) * 2**20)
+    try:
+        asyncio.run(run(service, serve_cfg.get("host", "127.0.0.1"), serve_cfg.get("port", 8000), max_body_bytes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
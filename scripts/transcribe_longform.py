@@ -0,0 +1,107 @@
+import os
+import sys
+import yaml
+import json
+from pathlib import Path
+
+# make sure modules/ is importable
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules import load_model
+from modules.audio import read_segment
+from modules.inference import write_predictions
+from modules.longform import LongFormTranscriber
+from modules.metrics import compute_wer
+
+# ---- Config Path ----
+DATA_DIR = Path("/data")
+EVAL_ROOT = DATA_DIR / "evaluation"  # one run directory per longform.run_name (default: <model dir name>-longform)
+
+
+def dialogue_rows(utt_id, audio_path, segments):
+    """Rows in the format of evaluate_model.py's results (no reference / intent), one per segment."""
+    for n, segment in enumerate(segments, start=1):
+        yield {
+            "utt_id": f"{utt_id}_seg{n}",
+            "audio_filepath": str(audio_path),
+            "start": segment["start"],
+            "end": segment["end"],
+            "asr_pred": segment["text"],
+            "asr_ref": None,
+            "intent_ref": None,
+        }
+
+
+def main():
+    """Transcribe whole dialogue recordings (no turn timestamps) with
+    overlapping 30s windows; writes turn-like segments per dialogue."""
+    # 1) config
+    with open("configs/config.yaml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    model_cfg = cfg["model"]
+    longform_cfg = cfg["longform"]
+
+    model_dir = longform_cfg.get("model_dir", cfg.get("eval", {}).get("model_dir", cfg["train"]["output_dir"]))
+    audio_files = sorted(Path(longform_cfg["audio_dir"]).glob("*.wav"))
+    run_dir = EVAL_ROOT / longform_cfg.get("run_name", f"{Path(model_dir).name}-longform")
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    # 2) model
+    model, processor, device = load_model(
+        model_name=model_dir,
+        language=model_cfg.get("language", "english"),
+        task=model_cfg.get("task", "transcribe"),
+        torch_dtype=longform_cfg.get("torch_dtype"),
+    )
+    transcriber = LongFormTranscriber(
+        model,
+        processor,
+        device=device,
+        batch_size=longform_cfg.get("batch_size", 8),
+        window_seconds=longform_cfg.get("window_seconds", 30.0),
+        overlap_seconds=longform_cfg.get("overlap_seconds", 5.0),
+        language=model_cfg.get("language", "english"),
+        task=model_cfg.get("task", "transcribe"),
+        max_new_tokens=longform_cfg.get("max_new_tokens", 220),
+    )
+
+    # 3) transcribe dialogue by dialogue; all windows of a dialogue are batched
+    transcripts = {}
+
+    def rows():
+        for audio_path in audio_files:
+            audio, _ = read_segment(str(audio_path), target_sr=transcriber.sampling_rate)
+            segments = transcriber.transcribe(audio)
+            transcripts[audio_path.stem] = " ".join(s["text"] for s in segments)
+            yield from dialogue_rows(audio_path.stem, audio_path, segments)
+
+    results_path = run_dir / "longform_segments.jsonl"
+    n_written = write_predictions(rows(), results_path)
+    print(f"Saved {n_written} segments of {len(audio_files)} dialogues ({transcriber.windows} windows, "
+          f"{transcriber.generate_seconds:.1f}s in generate) → {results_path}")
+
+    # 4) optional dialogue-level WER against the turns of a SpokenWOZ-style data.json
+    if longform_cfg.get("text_json"):
+        with open(longform_cfg["text_json"], "r", encoding="utf-8") as f:
+            data = json.load(f)
+        ids = [u for u in transcripts if u in data]
+        refs = [" ".join(t["text"].strip() for t in data[u].get("log", []) if t.get("text")) for u in ids]
+        results = compute_wer([transcripts[u] for u in ids], refs)
+        print(f"Dialogue-level WER over {len(ids)} dialogues:", results)
+        with (run_dir / "eval_results.json").open("w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    # 5) input to T5, as written by evaluate_model.py
+    with open(results_path, "r", encoding="utf-8") as f:
+        segments = [json.loads(line) for line in f if line.strip()]
+    t5_json = run_dir / "t5_eval_input_from_asr.json"
+    with open(t5_json, "w", encoding="utf-8") as f:
+        json.dump([{"text": r["asr_pred"], "dialog_act": r["intent_ref"]} for r in segments], f,
+                  indent=2, ensure_ascii=False)
+    print(f"Saved → {t5_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,47 @@
-import json
+import os
+import sys
 from pathlib import Path
 from tqdm import tqdm
 
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+
+from modules.manifest import ManifestWriter, iter_jsonl
+
 # --- Config ---
 ROOT_DIR = Path("data/SpokenWOZ")
 INPUT_MANIFEST = ROOT_DIR / "test_root_manifest.json"       
-OUTPUT_MANIFEST = ROOT_DIR / "test_root_manifest_hf.json"
+OUTPUT_MANIFEST = ROOT_DIR / "test_root_manifest_hf.arrow"  # memory-mapped; .jsonl / .json -> JSON rows
 LANG = "en"
 SUBSET = "spokenwoz"
 
 def main():
-    # load NeMo manifest (line-delimited JSON)
-    with open(INPUT_MANIFEST, "r", encoding="utf-8") as f:
-        nemo_entries = [json.loads(line) for line in f]
-
-    hf_data = []
-
-    for entry in tqdm(nemo_entries, desc="Converting"):
-        audio_path = Path(entry["audio_filepath"])
-        text = entry["text"]
-        duration = entry["duration"]
-
-        hf_entry = {
-            "file": str(audio_path),
-            "audio": {
-                "path": str(audio_path),
-                "sampling_rate": 16000   # already resampled earlier
-            },
-            "language": LANG,
-            "text": text,
-            "duration": duration,
-            "subset": SUBSET
-        }
-        hf_data.append(hf_entry)
-
-    # wrap in dict for HuggingFace style
-    output = {"data": hf_data}
-
-    with open(OUTPUT_MANIFEST, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
-
-    print(f"{len(hf_data)} samples written to {OUTPUT_MANIFEST}")
+    # stream NeMo manifest (line-delimited JSON) straight into the HF manifest
+    with ManifestWriter(OUTPUT_MANIFEST) as writer:
+        for entry in tqdm(iter_jsonl(INPUT_MANIFEST), desc="Converting"):
+            audio_path = Path(entry["audio_filepath"])
+            text = entry["text"]
+            duration = entry["duration"]
+
+            hf_entry = {
+                "file": str(audio_path),
+                "audio": {
+                    "path": str(audio_path),
+                    # already resampled earlier (virtual segments keep the source rate)
+                    "sampling_rate": entry.get("sampling_rate", 16000)
+                },
+                "language": LANG,
+                "text": text,
+                "duration": duration,
+                "subset": SUBSET
+            }
+            for key in ("utt_id", "start_frame", "end_frame"):
+                if key in entry:
+                    hf_entry[key] = entry[key]
+            writer.write(hf_entry)
+
+    print(f"{writer.count} samples written to {OUTPUT_MANIFEST}")
 
 if __name__ == "__main__":
     main()
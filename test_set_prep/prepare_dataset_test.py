@@ -7,6 +7,6 @@ sys.path.append(parent_dir)
 from modules import load_and_prepare_testset
 
 processor = WhisperProcessor.from_pretrained("models/whisper-spokenwoz")
-test_ds = load_and_prepare_testset("data/SpokenWOZ/test_root_manifest_hf.json", processor)
+test_ds = load_and_prepare_testset("data/SpokenWOZ/test_root_manifest_hf.arrow", processor)
 
 print(test_ds)
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""Lazy imports: `import modules` and the light submodules of
+benchmarks/bench_import_time.py must not import torch / transformers /
+datasets / evaluate. Checked on sys.modules of a fresh interpreter rather than
+on import times, which depend on the machine's load; bench_import_time.py keeps
+the timing budgets."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(parent_dir)
+sys.path.append(os.path.join(parent_dir, "benchmarks"))
+
+from bench_import_time import BUDGETS
+
+
+def imported_packages(module):
+    """Top-level packages in sys.modules after a fresh `import module`."""
+    code = f"import json, sys, {module}; print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=parent_dir, capture_output=True, text=True, check=True)
+    return set(json.loads(result.stdout))
+
+
+@pytest.mark.parametrize("module", list(BUDGETS))
+def test_no_heavy_imports(module):
+    _, forbidden = BUDGETS[module]
+    assert not sorted(set(forbidden) & imported_packages(module)), f"{module} imports heavy dependencies"
+
+
+def test_submodules_are_not_shadowed():
+    # exports and submodules have different names, so both import forms work
+    code = ("import modules.model_loader as m, modules.dataset_preparation as d; "
+            "from modules import load_model, prepare_dataset; "
+            "assert m.__name__ == 'modules.model_loader' and d.__name__ == 'modules.dataset_preparation'; "
+            "assert callable(load_model) and callable(prepare_dataset); "
+            "import modules; assert modules.load_model is m.load_model")
+    subprocess.run([sys.executable, "-c", code], cwd=parent_dir, check=True)